@@ -1,5 +1,5 @@
 """
-ASGI config for Blockhouse project.
+ASGI config for StockDanalysis project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
@@ -11,6 +11,6 @@ import os
 
 from django.core.asgi import get_asgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Blockhouse.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'StockDanalysis.settings')
 
 application = get_asgi_application()
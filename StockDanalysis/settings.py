@@ -11,8 +11,10 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
 from pathlib import Path
+from django.core.exceptions import ImproperlyConfigured
 
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -99,6 +101,174 @@ DATABASES = {
     }
 }
 
+# 'none' opens a connection per request, 'persistent' keeps one per worker thread for
+# POSTGRES_CONN_MAX_AGE seconds, and 'pool' shares a psycopg connection pool between threads.
+# Django connects with psycopg 3 from requirements.txt in every mode, it is preferred over
+# psycopg2 whenever both are installed.
+POSTGRES_POOL_MODE = os.getenv('POSTGRES_POOL_MODE', 'none')
+
+if POSTGRES_POOL_MODE == 'persistent':
+    DATABASES['default']['CONN_MAX_AGE'] = int(os.getenv('POSTGRES_CONN_MAX_AGE', 600))
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+elif POSTGRES_POOL_MODE == 'pool':
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': int(os.getenv('POSTGRES_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.getenv('POSTGRES_POOL_MAX_SIZE', 10)),
+            # Seconds a request waits for a free connection before failing
+            'timeout': float(os.getenv('POSTGRES_POOL_TIMEOUT_SECONDS', 10)),
+            'name': 'default'
+        }
+    }
+elif POSTGRES_POOL_MODE != 'none':
+    raise ImproperlyConfigured(f"POSTGRES_POOL_MODE must be 'none', 'persistent' or 'pool', not '{POSTGRES_POOL_MODE}'")
+
+
+# Alpha Vantage API
+
+ALPHA_VANTAGE_BASE_URL = os.getenv('ALPHA_VANTAGE_BASE_URL', 'https://www.alphavantage.co/query')
+
+# Limits of the API key. Calls over them wait in a queue, interactive ones first.
+ALPHA_VANTAGE_REQUESTS_PER_MINUTE = int(os.getenv('ALPHA_VANTAGE_REQUESTS_PER_MINUTE', 5))
+ALPHA_VANTAGE_REQUESTS_PER_DAY = int(os.getenv('ALPHA_VANTAGE_REQUESTS_PER_DAY', 25))
+
+# Directory the calls made with the API key are counted in when RESPONSE_CACHE_BACKEND is
+# 'file', so every server process and management command of a host shares the limits above.
+# With 'locmem' every process counts its own calls and gets the whole of the limits.
+ALPHA_VANTAGE_QUOTA_DIR = os.getenv('ALPHA_VANTAGE_QUOTA_DIR', os.path.join(tempfile.gettempdir(), 'stockdanalysis_rate_limits'))
+
+# Seconds a call waits in the queue before failing with the rate limit error
+ALPHA_VANTAGE_QUEUE_TIMEOUT_SECONDS = float(os.getenv('ALPHA_VANTAGE_QUEUE_TIMEOUT_SECONDS', 30))
+
+ALPHA_VANTAGE_CONNECT_TIMEOUT_SECONDS = float(os.getenv('ALPHA_VANTAGE_CONNECT_TIMEOUT_SECONDS', 5))
+ALPHA_VANTAGE_READ_TIMEOUT_SECONDS = float(os.getenv('ALPHA_VANTAGE_READ_TIMEOUT_SECONDS', 30))
+
+# Retries of failed and rate limited calls, with exponential backoff from the base delay
+ALPHA_VANTAGE_MAX_RETRIES = int(os.getenv('ALPHA_VANTAGE_MAX_RETRIES', 3))
+ALPHA_VANTAGE_BACKOFF_SECONDS = float(os.getenv('ALPHA_VANTAGE_BACKOFF_SECONDS', 2))
+
+# Connections kept alive to the API
+ALPHA_VANTAGE_POOL_SIZE = int(os.getenv('ALPHA_VANTAGE_POOL_SIZE', 10))
+
+
+# Stock data storage
+
+# Days of daily bars kept per symbol. Older bars are skipped when storing data, whole yearly
+# partitions past it can be dropped with `manage.py partition_stock_data --drop-expired`,
+# and backtests run over this horizon by default.
+STOCK_DATA_RETENTION_DAYS = int(os.getenv('STOCK_DATA_RETENTION_DAYS', 2*365))
+
+# Directory of the Parquet store, one file per symbol. Ingestion writes every symbol to it
+# after storing it in the PostgresDB when set.
+STOCK_DATA_PARQUET_DIR = os.getenv('STOCK_DATA_PARQUET_DIR')
+
+# Store that stock data reads and the price cache go through, 'postgres' or 'parquet'
+STOCK_DATA_BACKEND = os.getenv('STOCK_DATA_BACKEND', 'postgres')
+
+if STOCK_DATA_BACKEND not in ('postgres', 'parquet'):
+    raise ImproperlyConfigured(f"STOCK_DATA_BACKEND must be 'postgres' or 'parquet', not '{STOCK_DATA_BACKEND}'")
+if STOCK_DATA_BACKEND == 'parquet' and not STOCK_DATA_PARQUET_DIR:
+    raise ImproperlyConfigured("STOCK_DATA_BACKEND 'parquet' requires STOCK_DATA_PARQUET_DIR")
+
+
+# Stock data caching
+
+# Minutes after the market close before a symbol's daily bar is fetched again
+STOCK_DATA_FRESHNESS_GRACE_MINUTES = int(os.getenv('STOCK_DATA_FRESHNESS_GRACE_MINUTES', 30))
+
+# Minutes before a symbol whose next daily bar is overdue is checked again, so holidays and
+# late bars don't cost an Alpha Vantage call on every request
+STOCK_DATA_FRESHNESS_RETRY_MINUTES = int(os.getenv('STOCK_DATA_FRESHNESS_RETRY_MINUTES', 15))
+
+# Number of symbols whose price history is kept in memory as NumPy arrays
+PRICE_CACHE_MAX_SYMBOLS = int(os.getenv('PRICE_CACHE_MAX_SYMBOLS', 256))
+
+# Moving average windows kept up to date for every symbol in the indicator store. Other
+# windows are computed the first time a backtest asks for them.
+INDICATOR_STORE_EAGER_WINDOWS = [
+    int(window) for window in os.getenv('INDICATOR_STORE_EAGER_WINDOWS', '5,10,20,50,100,200').split(',')
+]
+
+# Rows read from the database at a time when streaming stock data
+STOCK_DATA_STREAM_CHUNK_SIZE = int(os.getenv('STOCK_DATA_STREAM_CHUNK_SIZE', 2000))
+
+# Directory fitted prediction models are persisted to so restarted workers don't refit them.
+# Models are only kept in memory when unset.
+MODEL_REGISTRY_DIR = os.getenv('MODEL_REGISTRY_DIR')
+
+# Number of fitted models kept in memory, the least recently used are dropped first
+MODEL_REGISTRY_MAX_MODELS = int(os.getenv('MODEL_REGISTRY_MAX_MODELS', 256))
+
+
+# Response caching
+
+# Store of the cached stock data, prediction and backtest responses and of the symbol data
+# versions keying them. 'file' shares them between the server processes and management
+# commands of a host, so ingestion anywhere retires them. 'locmem' keeps them in each process
+# and is only correct with a single process that does all the ingestion.
+RESPONSE_CACHE_BACKEND = os.getenv('RESPONSE_CACHE_BACKEND', 'file')
+
+# Directory of the 'file' response cache
+RESPONSE_CACHE_DIR = os.getenv('RESPONSE_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'stockdanalysis_responses'))
+
+# Seconds a cached response is kept. Ingestion replaces the responses of a symbol before then.
+RESPONSE_CACHE_TIMEOUT_SECONDS = int(os.getenv('RESPONSE_CACHE_TIMEOUT_SECONDS', 24*60*60))
+
+# Number of responses kept before the oldest are culled
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', 1000))
+
+_RESPONSE_CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'responses'),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache', RESPONSE_CACHE_DIR)
+}
+if RESPONSE_CACHE_BACKEND not in _RESPONSE_CACHE_BACKENDS:
+    raise ImproperlyConfigured(f"RESPONSE_CACHE_BACKEND must be 'locmem' or 'file', not '{RESPONSE_CACHE_BACKEND}'")
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'
+    },
+    'responses': {
+        'BACKEND': _RESPONSE_CACHE_BACKENDS[RESPONSE_CACHE_BACKEND][0],
+        'LOCATION': _RESPONSE_CACHE_BACKENDS[RESPONSE_CACHE_BACKEND][1],
+        'TIMEOUT': RESPONSE_CACHE_TIMEOUT_SECONDS,
+        'OPTIONS': { 'MAX_ENTRIES': RESPONSE_CACHE_MAX_ENTRIES }
+    },
+    # Kept apart from the responses so clearing them doesn't reset the Alpha Vantage quota
+    'rate_limits': {
+        'BACKEND': _RESPONSE_CACHE_BACKENDS[RESPONSE_CACHE_BACKEND][0],
+        'LOCATION': ALPHA_VANTAGE_QUOTA_DIR if RESPONSE_CACHE_BACKEND == 'file' else 'rate_limits'
+    }
+}
+
+
+# Backtesting
+
+# Worker processes used to evaluate backtest parameter sweeps and batches
+BACKTEST_WORKERS = int(os.getenv('BACKTEST_WORKERS', os.cpu_count() or 1))
+
+# How the worker processes are started, 'spawn' or 'forkserver'. Forking the server itself
+# would copy the locks and database connections its other threads hold.
+BACKTEST_WORKER_START_METHOD = os.getenv('BACKTEST_WORKER_START_METHOD', 'spawn')
+
+if BACKTEST_WORKER_START_METHOD not in ('spawn', 'forkserver'):
+    raise ImproperlyConfigured(f"BACKTEST_WORKER_START_METHOD must be 'spawn' or 'forkserver', not '{BACKTEST_WORKER_START_METHOD}'")
+
+# Sweeps with fewer parameter combinations than this run in the request thread
+BACKTEST_SWEEP_PARALLEL_MIN_CELLS = int(os.getenv('BACKTEST_SWEEP_PARALLEL_MIN_CELLS', 400))
+
+
+# Prediction reports
+
+# Threads rendering prediction report PDFs in the background
+REPORT_WORKERS = int(os.getenv('REPORT_WORKERS', 2))
+
+# Number of rendered report PDFs kept in memory
+REPORT_CACHE_MAX_ENTRIES = int(os.getenv('REPORT_CACHE_MAX_ENTRIES', 64))
+
+# Number of report jobs whose status is kept
+REPORT_JOBS_MAX_ENTRIES = int(os.getenv('REPORT_JOBS_MAX_ENTRIES', 1024))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -1,8 +1,12 @@
 import os
+import json
+import time
 import requests
 import pandas as pd
+import pyarrow as pa
 import matplotlib.pyplot as plt
 
+from collections import OrderedDict
 from dotenv import load_dotenv
 
 
@@ -11,18 +15,61 @@ load_dotenv()
 HOST = os.getenv('DJANGO_HOST')
 PORT = os.getenv('DJANGO_PORT')
 
+ARROW_STREAM_CONTENT_TYPE = 'application/vnd.apache.arrow.stream'
+ARROW_HEADERS = { 'Accept': ARROW_STREAM_CONTENT_TYPE }
+
+# Last responses kept to revalidate with the server's ETags
+CONDITIONAL_CACHE_SIZE = 32
+_conditional_responses = OrderedDict()
+
+
+def conditional_get(url, params=None, headers=None):
+    """GETs a URL, sending the ETag of the last response to the same request in
+    `If-None-Match`. When the server answers 304 Not Modified, the stored response is returned
+    instead of downloading the body again."""
+    key = (url, tuple(sorted((params or {}).items())), tuple(sorted((headers or {}).items())))
+    stored = _conditional_responses.get(key)
+    
+    request_headers = dict(headers or {})
+    if stored is not None:
+        request_headers['If-None-Match'] = stored.headers['ETag']
+    response = requests.get(url, params=params, headers=request_headers)
+    
+    if response.status_code == 304 and stored is not None:
+        _conditional_responses.move_to_end(key)
+        return stored
+    
+    if response.status_code == 200 and 'ETag' in response.headers:
+        _conditional_responses[key] = response
+        _conditional_responses.move_to_end(key)
+        while len(_conditional_responses) > CONDITIONAL_CACHE_SIZE:
+            _conditional_responses.popitem(last=False)
+    return response
+
+
+def read_arrow_table(response):
+    """Decodes an Arrow IPC stream response into a table. Error responses are JSON."""
+    if not response.headers.get('Content-Type', '').startswith(ARROW_STREAM_CONTENT_TYPE):
+        raise Exception(response.json().get('Error Message', 'Unexpected response from server.'))
+    
+    return pa.ipc.open_stream(response.content).read_all()
+
+
+def read_arrow_dataframe(response):
+    """Decodes an Arrow IPC stream response into a DataFrame. Error responses are JSON."""
+    return read_arrow_table(response).to_pandas(split_blocks=True, self_destruct=True)
+
 
 def get_stock_data(stock_symbol):
     try:
         query_params = { 'symbol': stock_symbol }
         url = f'http://{HOST}:{PORT}/api/get_stock_data/'
-        response = requests.get(url, params=query_params)
+        response = conditional_get(url, params=query_params, headers=ARROW_HEADERS)
         
         if response.status_code != 200:
             raise Exception(response.json()['Error Message'])
         
-        data = response.json()
-        df = pd.DataFrame(data)
+        df = read_arrow_dataframe(response)
         df = df.drop(columns=['id'])
         
         return df
@@ -41,18 +88,18 @@ def simulate_investment(stock_symbol, initial_investment, buy_day_range, sell_da
             'sell_day_range': sell_day_range
         }
         url = f'http://{HOST}:{PORT}/api/backtest_moving_average/'
-        response = requests.get(url, params=query_params)
-        investment_log_data = response.json()
+        response = conditional_get(url, params=query_params, headers=ARROW_HEADERS)
         
-        df = pd.DataFrame(investment_log_data)
-        total_return = df['return'].iloc[-1]
-        num_trades = df['action'].isin(['Buy', 'Sell']).sum()
+        # The metrics computed by the server travel in the schema metadata of the log
+        table = read_arrow_table(response)
+        metrics = json.loads(table.schema.metadata[b'metrics'])
+        
+        df = table.to_pandas(split_blocks=True, self_destruct=True)
+        df.insert(0, 'symbol', stock_symbol)
         
         simulation_data = {
             'dataframe': df,
-            'num_trades': num_trades,
-            'total_return': total_return,
-            'max_drawdown': 0
+            **metrics
         }
         return simulation_data
     
@@ -60,37 +107,103 @@ def simulate_investment(stock_symbol, initial_investment, buy_day_range, sell_da
         raise Exception('Network Error. Unable to connect to server.')
 
 
-def predict_future_stock_prices(symbol, num_days=30, model_type='Linear Regression'):
+def simulate_investment_summary(stock_symbol, initial_investment, buy_day_range, sell_day_range):
+    """Fetches only the metrics of a backtest, without its daily log."""
     try:
         query_params = {
-            'symbol': symbol,
-            'num_days': num_days,
-            'model_type': model_type
+            'symbol': stock_symbol, 
+            'initial_investment': initial_investment, 
+            'buy_day_range': buy_day_range, 
+            'sell_day_range': sell_day_range,
+            'detail': 'summary'
         }
+        url = f'http://{HOST}:{PORT}/api/backtest_moving_average/'
+        response = conditional_get(url, params=query_params)
         
-        url = f'http://{HOST}:{PORT}/api/predict_future_prices/linear_regression/'
+        if response.status_code != 200:
+            raise Exception(response.json()['Error Message'])
+        
+        return response.json()['metrics']
+    
+    except requests.RequestException as e:
+        raise Exception('Network Error. Unable to connect to server.')
+
+
+def simulate_investment_sweep(stock_symbol, initial_investment, buy_day_max=200, sell_day_max=200, day_step=1):
+    try:
+        query_params = {
+            'symbol': stock_symbol,
+            'initial_investment': initial_investment,
+            'buy_day_max': buy_day_max,
+            'sell_day_max': sell_day_max,
+            'day_step': day_step
+        }
+        url = f'http://{HOST}:{PORT}/api/backtest_moving_average/sweep/'
         response = requests.get(url, params=query_params)
         
-        data = response.json()
+        if response.status_code != 200:
+            raise Exception(response.json()['Error Message'])
         
-        requested_predictions = data['requested_predicted_data']
-        all_predicted_data = data['all_predicted_data']
-        all_actual_data = data['all_actual_data']
+        sweep_data = response.json()
         
-        requested_predictions_df = pd.DataFrame(requested_predictions)
-        requested_predictions_df = requested_predictions_df.drop(columns=['id'])
+        # Rows are buy day ranges and columns are sell day ranges
+        heatmaps = {
+            metric: pd.DataFrame(
+                sweep_data[metric],
+                index=sweep_data['buy_day_ranges'],
+                columns=sweep_data['sell_day_ranges']
+            )
+            for metric in ('total_return', 'num_trades', 'max_drawdown')
+        }
+        return heatmaps
+    
+    except requests.RequestException as e:
+        raise Exception('Network Error. Unable to connect to server.')
+
+
+def simulate_investment_batch(stock_symbols, initial_investment, buy_day_range, sell_day_range):
+    """Yields the backtest result of every symbol as soon as the server finishes it."""
+    try:
+        query_params = {
+            'symbols': ','.join(stock_symbols),
+            'initial_investment': initial_investment,
+            'buy_day_range': buy_day_range,
+            'sell_day_range': sell_day_range
+        }
+        url = f'http://{HOST}:{PORT}/api/backtest_moving_average/batch/'
+        with requests.get(url, params=query_params, stream=True) as response:
+            if response.status_code != 200:
+                raise Exception(response.json()['Error Message'])
+            
+            for line in response.iter_lines():
+                if line:
+                    yield json.loads(line)
+    
+    except requests.RequestException as e:
+        raise Exception('Network Error. Unable to connect to server.')
+
+
+def predict_future_stock_prices(symbol, num_days=30, model_type='Linear Regression'):
+    try:
+        query_params = {
+            'symbol': symbol,
+            'num_days': num_days,
+            'model_type': model_type
+        }
         
-        all_predictions_df = pd.DataFrame(all_predicted_data)
-        all_predictions_df = all_predictions_df.drop(columns=['id'])
+        url = f'http://{HOST}:{PORT}/api/predict_future_prices/linear_regression/'
+        response = conditional_get(url, params=query_params, headers=ARROW_HEADERS)
         
-        all_actual_df = pd.DataFrame(all_actual_data)
-        all_actual_df = all_actual_df.drop(columns=['id'])
+        # The three sections arrive as one table with a `section` column
+        df = read_arrow_dataframe(response)
+        df = df.drop(columns=['id'])
         
-        dataframes = {
-            'requested_predicted_data': requested_predictions_df,
-            'all_predicted_data': all_predictions_df,
-            'all_actual_data': all_actual_df
-        }
+        dataframes = {}
+        for section in ('requested_predicted_data', 'all_predicted_data', 'all_actual_data'):
+            section_df = df[df['section'] == section].drop(columns=['section']).reset_index(drop=True)
+            if section == 'all_actual_data':
+                section_df = section_df.drop(columns=['model_type'])
+            dataframes[section] = section_df
         
         return dataframes
     
@@ -136,7 +249,7 @@ def create_prediction_plot_figure(prediction_dataframes, prediction_plot_choice)
     return fig
 
 
-def download_pdf(symbol, num_days=30, model_type='Linear Regression'):
+def download_pdf(symbol, num_days=30, model_type='Linear Regression', poll_interval=0.5, timeout=120):
     try:
         query_params = {
             'symbol': symbol,
@@ -144,9 +257,25 @@ def download_pdf(symbol, num_days=30, model_type='Linear Regression'):
             'model_type': model_type
         }
         
-        url = f'http://{HOST}:{PORT}/api/generate_prediction_report/'
+        # Reports are rendered in the background. Submit the job, then poll until it finishes
+        url = f'http://{HOST}:{PORT}/api/prediction_report/jobs/'
         response = requests.get(url, params=query_params)
+        job = response.json()
+        if response.status_code not in (200, 202):
+            raise Exception(job['Error Message'])
+        
+        status_url = f"http://{HOST}:{PORT}/api/prediction_report/jobs/{job['job_id']}/"
+        deadline = time.monotonic() + timeout
+        while job['status'] in ('queued', 'running'):
+            if time.monotonic() > deadline:
+                raise Exception('Timed out waiting for the PDF report.')
+            time.sleep(poll_interval)
+            job = requests.get(status_url).json()
+        
+        if job['status'] != 'done':
+            raise Exception(job.get('Error Message', 'Unable to generate the PDF report.'))
         
+        response = requests.get(f'{status_url}download/')
         return response.content
     
     except requests.RequestException as e:
@@ -97,7 +97,7 @@ if st.session_state.stock_data is not None:
             st.write(st.session_state.simulation_dataframe)
             st.write(f'Total Return: {st.session_state.simulation_total_return}')
             st.write(f'Number of Trades Performed: {st.session_state.simulation_num_trades}')
-            st.write(f'Max Drawdown: {st.session_state.simulation_max_drawdown}')
+            st.write(f'Max Drawdown: {st.session_state.simulation_max_drawdown:.2%}')
             
     ############## End Left Side ########################
     
@@ -0,0 +1,91 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from stock_analyzer.models.stock_data import StockData
+from stock_analyzer.models.prediction_data import PredictionData
+
+import statistics
+import time
+
+
+ROWS_PER_SYMBOL = 1000
+MODEL_TYPE = 'Linear Regression'
+
+
+class Command(BaseCommand):
+    help = ('Measures the latency of the hot StockData / PredictionData queries with and without '
+            'the (symbol, date) unique indexes. Runs inside a transaction that is rolled back.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[10_000, 100_000, 1_000_000],
+                            help='Table sizes (rows) to benchmark')
+        parser.add_argument('--repeat', type=int, default=50,
+                            help='Number of times each query is timed')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('This benchmark requires the PostgreSQL backend.')
+        
+        self.stdout.write(f"{'rows':>10} {'query':<16} {'before (ms)':>12} {'after (ms)':>12}")
+        for size in options['sizes']:
+            with transaction.atomic():
+                num_symbols = max(size // ROWS_PER_SYMBOL, 1)
+                self.populate(num_symbols)
+                
+                after = self.time_queries(num_symbols, options['repeat'])
+                self.drop_constraints()
+                before = self.time_queries(num_symbols, options['repeat'])
+                
+                for query_name in after:
+                    self.stdout.write(
+                        f'{size:>10} {query_name:<16} {before[query_name]:>12.3f} {after[query_name]:>12.3f}'
+                    )
+                transaction.set_rollback(True)
+
+    def populate(self, num_symbols):
+        with connection.cursor() as cursor:
+            for model, extra_column, extra_value in ((StockData, '', ''),
+                                                     (PredictionData, ', model_type', ', %s')):
+                params = [num_symbols - 1, ROWS_PER_SYMBOL - 1]
+                if extra_value:
+                    params.insert(0, MODEL_TYPE)
+                cursor.execute(f"""
+                    INSERT INTO {model._meta.db_table}
+                        (symbol, date, open, high, low, close, volume{extra_column})
+                    SELECT 'BENCH' || lpad(s::text, 5, '0'), DATE '2000-01-01' + d,
+                           random() * 100, random() * 100, random() * 100, random() * 100,
+                           (random() * 1000000)::int{extra_value}
+                    FROM generate_series(0, %s) AS s, generate_series(0, %s) AS d
+                """, params)
+                cursor.execute(f'ANALYZE {model._meta.db_table}')
+
+    def drop_constraints(self):
+        with connection.schema_editor() as schema_editor:
+            for model in (StockData, PredictionData):
+                for constraint in model._meta.constraints:
+                    schema_editor.remove_constraint(model, constraint)
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {StockData._meta.db_table}')
+            cursor.execute(f'ANALYZE {PredictionData._meta.db_table}')
+
+    def time_queries(self, num_symbols, repeat):
+        queries = {
+            'latest_date': lambda symbol: StockData.objects.filter(
+                symbol=symbol).order_by('-date').first(),
+            'date_range': lambda symbol: list(StockData.objects.filter(
+                symbol=symbol, date__range=('2001-01-01', '2001-12-31')
+            ).order_by('date').values_list('date', 'open', 'close')),
+            'predictions': lambda symbol: list(PredictionData.objects.filter(
+                symbol=symbol, model_type=MODEL_TYPE).order_by('date').values_list('date', 'close')),
+        }
+        
+        timings = {}
+        for query_name, query in queries.items():
+            samples = []
+            for i in range(repeat):
+                symbol = f'BENCH{i % num_symbols:05d}'
+                start = time.perf_counter()
+                query(symbol)
+                samples.append((time.perf_counter() - start) * 1000)
+            timings[query_name] = statistics.median(samples)
+        return timings
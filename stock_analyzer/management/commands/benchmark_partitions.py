@@ -0,0 +1,118 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from stock_analyzer.views.postgres_api import partitions
+from stock_analyzer.management.commands.benchmark_wire_format import time_call
+
+from datetime import date
+import json
+
+
+FIRST_YEAR = 2000
+UNPARTITIONED_TABLE = 'benchmark_stockdata_unpartitioned'
+
+
+class Command(BaseCommand):
+    help = ('Measures the latency of date range scans on the yearly partitioned stock data table '
+            'against the same rows in an unpartitioned table. Runs inside a transaction that is '
+            'rolled back.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=50_000_000,
+                            help='Number of rows to benchmark with')
+        parser.add_argument('--years', type=int, default=20,
+                            help='Number of years of daily bars per symbol')
+        parser.add_argument('--repeat', type=int, default=20,
+                            help='Number of times each query is timed')
+
+    def handle(self, *args, **options):
+        if not partitions.is_partitioned():
+            raise CommandError('This benchmark requires the partitioned PostgreSQL stock data table.')
+
+        num_days = (date(FIRST_YEAR + options['years'], 1, 1) - date(FIRST_YEAR, 1, 1)).days
+        num_symbols = max(options['rows'] // num_days, 1)
+
+        with transaction.atomic():
+            partitions.ensure_partitions(range(FIRST_YEAR, FIRST_YEAR + options['years']))
+            populate(num_symbols, num_days)
+            self.stdout.write(f'{num_symbols * num_days} rows, {num_symbols} symbols over {options["years"]} years')
+
+            last_year = FIRST_YEAR + options['years'] - 1
+            queries = {
+                'symbol_one_year': (
+                    'SELECT date, open, close FROM {table} WHERE symbol = %s '
+                    'AND date BETWEEN %s AND %s ORDER BY date',
+                    lambda i: [symbol_name(i % num_symbols), date(last_year, 1, 1), date(last_year, 12, 31)]
+                ),
+                'symbol_two_years': (
+                    'SELECT date, open, close FROM {table} WHERE symbol = %s '
+                    'AND date BETWEEN %s AND %s ORDER BY date',
+                    lambda i: [symbol_name(i % num_symbols), date(last_year - 1, 1, 1), date(last_year, 12, 31)]
+                ),
+                'all_symbols_month': (
+                    'SELECT symbol, AVG(close) FROM {table} WHERE date BETWEEN %s AND %s GROUP BY symbol',
+                    lambda i: [date(last_year, 6, 1), date(last_year, 6, 30)]
+                )
+            }
+
+            self.stdout.write(f"{'query':<20} {'unpartitioned (ms)':>19} {'partitioned (ms)':>17} {'partitions':>11}")
+            for query_name, (sql, params) in queries.items():
+                timings = {}
+                for table in (UNPARTITIONED_TABLE, partitions.TABLE):
+                    timings[table] = time_query(sql.format(table=table), params, options['repeat'])
+                scanned = scanned_partitions(sql.format(table=partitions.TABLE), params(0))
+                self.stdout.write(
+                    f'{query_name:<20} {timings[UNPARTITIONED_TABLE]:>19.3f} '
+                    f'{timings[partitions.TABLE]:>17.3f} {scanned:>11}'
+                )
+            transaction.set_rollback(True)
+
+
+def symbol_name(i):
+    return f'BENCH{i:05d}'
+
+
+def populate(num_symbols, num_days):
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            INSERT INTO {partitions.TABLE} (symbol, date, open, high, low, close, volume)
+            SELECT 'BENCH' || lpad(s::text, 5, '0'), DATE '{FIRST_YEAR}-01-01' + d,
+                   random() * 100, random() * 100, random() * 100, random() * 100,
+                   (random() * 1000000)::int
+            FROM generate_series(0, %s) AS s, generate_series(0, %s) AS d
+        """, [num_symbols - 1, num_days - 1])
+        # The same rows and indexes in a plain table
+        cursor.execute(f'CREATE TABLE {UNPARTITIONED_TABLE} (LIKE {partitions.TABLE} INCLUDING ALL)')
+        cursor.execute(f'INSERT INTO {UNPARTITIONED_TABLE} SELECT * FROM {partitions.TABLE}')
+        cursor.execute(f'ANALYZE {partitions.TABLE}')
+        cursor.execute(f'ANALYZE {UNPARTITIONED_TABLE}')
+
+
+def time_query(sql, params, repeat):
+    counter = iter(range(repeat))
+
+    def run():
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params(next(counter)))
+            cursor.fetchall()
+    return time_call(run, repeat)
+
+
+def scanned_partitions(sql, params):
+    """Returns the number of partitions left in the plan of a query after pruning."""
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        (plan,) = cursor.fetchone()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return len(plan_relations(plan) - {partitions.TABLE})
+
+
+def plan_relations(plan):
+    if isinstance(plan, list):
+        return set().union(*map(plan_relations, plan))
+    relations = { plan['Relation Name'] } if 'Relation Name' in plan else set()
+    for child in (plan.get('Plan'), *plan.get('Plans', ())):
+        if child is not None:
+            relations |= plan_relations(child)
+    return relations
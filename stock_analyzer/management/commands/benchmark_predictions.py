@@ -0,0 +1,75 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from stock_analyzer.models.prediction_data import PredictionData
+from stock_analyzer.views.postgres_api import prediction_data_query
+
+from datetime import date, timedelta
+import numpy as np
+import time
+
+
+MODEL_TYPE = 'Linear Regression'
+
+
+class Command(BaseCommand):
+    help = ('Compares the per-row and bulk implementations of save_predictions for several '
+            'prediction horizons across many symbols. Runs inside a transaction that is rolled back.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--symbols', type=int, default=100,
+                            help='Number of symbols to store predictions for')
+        parser.add_argument('--horizons', nargs='+', type=int, default=[30, 365],
+                            help='Numbers of predicted days')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'horizon':>8} {'symbols':>8} {'path':<8} {'cold (s)':>10} {'warm (s)':>10}")
+        for horizon in options['horizons']:
+            predictions = {
+                field: np.random.default_rng(0).uniform(1, 1000, horizon)
+                for field in ('open', 'high', 'low', 'close', 'volume')
+            }
+            for path, save in (('per-row', legacy_save_predictions),
+                               ('bulk', prediction_data_query.save_predictions)):
+                with transaction.atomic():
+                    # Cold inserts every prediction, warm finds them all already stored
+                    cold = self.time_saves(save, options['symbols'], horizon, predictions)
+                    warm = self.time_saves(save, options['symbols'], horizon, predictions)
+                    transaction.set_rollback(True)
+                self.stdout.write(f"{horizon:>8} {options['symbols']:>8} {path:<8} {cold:>10.3f} {warm:>10.3f}")
+
+    def time_saves(self, save, num_symbols, horizon, predictions):
+        start = time.perf_counter()
+        for i in range(num_symbols):
+            save(
+                symbol=f'BENCH{i:05d}',
+                model_type=MODEL_TYPE,
+                predict_num_days=horizon,
+                most_recent_date=date(2024, 1, 1),
+                predictions=predictions
+            )
+        return time.perf_counter() - start
+
+
+def legacy_save_predictions(symbol, model_type, predict_num_days, most_recent_date, predictions):
+    """The original implementation, one existence query and one insert per predicted day"""
+    for i in range(predict_num_days):
+        prediction_date = most_recent_date + timedelta(days=i + 1)
+        if PredictionData.objects.filter(symbol=symbol, model_type=model_type, date=prediction_date).exists():
+            continue
+        PredictionData(
+            symbol=symbol,
+            date=prediction_date,
+            open=predictions['open'][i],
+            high=predictions['high'][i],
+            low=predictions['low'][i],
+            close=predictions['close'][i],
+            volume=predictions['volume'][i],
+            model_type=model_type
+        ).save()
+    
+    start_date = most_recent_date + timedelta(days=1)
+    end_date = start_date + timedelta(days=predict_num_days)
+    return list(PredictionData.objects.filter(
+        symbol=symbol, date__range=(start_date, end_date)
+    ).order_by('date').values())
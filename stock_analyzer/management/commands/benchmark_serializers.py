@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from stock_analyzer.models.stock_data import StockData
+from stock_analyzer.serializers.stock_data import StockDataSerializer
+from stock_analyzer.serializers.stock_data import StockDataValuesSerializer
+from stock_analyzer.management.commands.benchmark_wire_format import synthetic_stock_data
+from stock_analyzer.management.commands.benchmark_wire_format import time_call
+
+
+class Command(BaseCommand):
+    help = ('Compares the time the DRF ModelSerializer and the values_list serializer take to '
+            'serialize stock data on the read paths, using synthetic rows.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', nargs='+', type=int, default=[1_000, 10_000],
+                            help='Numbers of rows to serialize')
+        parser.add_argument('--repeat', type=int, default=20,
+                            help='Number of times each serializer is timed')
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{'rows':>7} {'serializer':<12} {'total (ms)':>11} {'per 1k rows (ms)':>17} {'speedup':>8}"
+        )
+        fields = StockDataValuesSerializer.fields
+        for num_rows in options['rows']:
+            columns = synthetic_stock_data(num_rows)
+            rows = list(zip(*(columns[field] for field in fields)))
+            # The ModelSerializer is given the model instances the ORM builds for it
+            instances = [StockData(**dict(zip(fields, row))) for row in rows]
+            
+            serializers = {
+                'drf': lambda: StockDataSerializer(instances, many=True).data,
+                'values_list': lambda: StockDataValuesSerializer(rows).data
+            }
+            if serializers['drf']() != serializers['values_list']():
+                raise CommandError('The serializers disagree')
+            
+            baseline_ms = None
+            for serializer_name, serialize in serializers.items():
+                total_ms = time_call(serialize, options['repeat'])
+                baseline_ms = baseline_ms or total_ms
+                self.stdout.write(
+                    f"{num_rows:>7} {serializer_name:<12} {total_ms:>11.3f} "
+                    f"{total_ms * 1000 / num_rows:>17.3f} {baseline_ms / total_ms:>7.1f}x"
+                )
@@ -0,0 +1,94 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from stock_analyzer.models.stock_data import StockData
+from stock_analyzer.views.postgres_api import partitions
+from stock_analyzer.views.storage.backends import PostgresBackend
+from stock_analyzer.views.storage.parquet_backend import ParquetBackend
+from stock_analyzer.management.commands.benchmark_wire_format import time_call
+
+from datetime import date
+import tempfile
+import numpy as np
+
+
+FIRST_YEAR = 2000
+
+
+class Command(BaseCommand):
+    help = ('Compares the time the PostgresDB and the Parquet store take to load the full history '
+            'of symbols, as the price cache does, and to read date ranges. Synthetic rows are '
+            'inserted in a transaction that is rolled back and written to a temporary Parquet store.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--years', nargs='+', type=int, default=[1, 5, 20],
+                            help='Years of daily bars per symbol')
+        parser.add_argument('--symbols', type=int, default=50,
+                            help='Number of symbols loaded together by the batch query')
+        parser.add_argument('--repeat', type=int, default=10,
+                            help='Number of times each read is timed')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('This benchmark requires the PostgreSQL backend.')
+
+        self.stdout.write(f"{'years':>6} {'query':<22} {'postgres (ms)':>14} {'parquet (ms)':>13} {'speedup':>8}")
+        for years in options['years']:
+            with transaction.atomic(), tempfile.TemporaryDirectory() as directory:
+                symbols = [f'BENCH{i:05d}' for i in range(options['symbols'])]
+                last_day = date(FIRST_YEAR + years, 1, 1)
+                partitions.ensure_partitions(range(FIRST_YEAR, FIRST_YEAR + years))
+                populate(len(symbols), (last_day - date(FIRST_YEAR, 1, 1)).days)
+
+                postgres = PostgresBackend()
+                parquet = ParquetBackend(directory, source=postgres)
+                for symbol in symbols:
+                    parquet.write(symbol, postgres.read_columns(symbol))
+
+                last_year = (date(last_day.year - 1, 1, 1), last_day)
+                reads = {
+                    'full_history': lambda backend: backend.read_series(symbols[:1]),
+                    'full_history_columns': lambda backend: backend.read_columns(symbols[0]),
+                    'last_year_columns': lambda backend: backend.read_columns(symbols[0], *last_year),
+                    f'batch_{len(symbols)}_symbols': lambda backend: backend.read_series(symbols)
+                }
+                for read_name, read in reads.items():
+                    check_equal(read(postgres), read(parquet), read_name)
+                    postgres_ms = time_call(lambda: read(postgres), options['repeat'])
+                    parquet_ms = time_call(lambda: read(parquet), options['repeat'])
+                    self.stdout.write(
+                        f'{years:>6} {read_name:<22} {postgres_ms:>14.3f} {parquet_ms:>13.3f} '
+                        f'{postgres_ms / parquet_ms:>7.1f}x'
+                    )
+                transaction.set_rollback(True)
+
+
+def populate(num_symbols, num_days):
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            INSERT INTO {StockData._meta.db_table} (symbol, date, open, high, low, close, volume)
+            SELECT 'BENCH' || lpad(s::text, 5, '0'), DATE '{FIRST_YEAR}-01-01' + d,
+                   random() * 100, random() * 100, random() * 100, random() * 100,
+                   (random() * 1000000)::int
+            FROM generate_series(0, %s) AS s, generate_series(0, %s) AS d
+        """, [num_symbols - 1, num_days - 1])
+        cursor.execute(f'ANALYZE {StockData._meta.db_table}')
+
+
+def check_equal(expected, result, read_name):
+    expected, result = flatten(expected), flatten(result)
+    if expected.keys() != result.keys() or not all(
+        np.array_equal(np.asarray(expected[key]), np.asarray(result[key])) for key in expected
+    ):
+        raise CommandError(f'The backends disagree on {read_name}')
+
+
+def flatten(data):
+    """Flattens the columns of every symbol returned by `read_series` into one dict."""
+    flat = {}
+    for key, value in data.items():
+        if isinstance(value, dict):
+            flat.update({ (key, field): column for field, column in value.items() })
+        else:
+            flat[key] = value
+    return flat
@@ -0,0 +1,116 @@
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from stock_analyzer.views.backtest_strategies import moving_average
+from stock_analyzer.views.backtest_strategies import strategy
+from stock_analyzer.management.commands.benchmark_wire_format import time_call
+
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+
+
+class Command(BaseCommand):
+    help = ('Compares the row by row moving average backtest with the same strategy on the strategy '
+            'framework, and times other framework strategies, using synthetic prices.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', nargs='+', type=int, default=[500, 2520],
+                            help='Numbers of simulated days')
+        parser.add_argument('--buy-day-range', type=int, default=20)
+        parser.add_argument('--sell-day-range', type=int, default=50)
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Number of times each backtest is timed')
+
+    def handle(self, *args, **options):
+        buy_day_range = options['buy_day_range']
+        sell_day_range = options['sell_day_range']
+        ma_strategy = moving_average.moving_average_strategy(buy_day_range, sell_day_range)
+        
+        self.stdout.write(f"{'days':>6} {'backtest':<40} {'time (ms)':>10} {'speedup':>8}")
+        for num_days in options['days']:
+            rng = np.random.default_rng(0)
+            dates = np.array([date(2000, 1, 3) + timedelta(days=i) for i in range(num_days)])
+            price = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, num_days)))
+            
+            df = pd.DataFrame({ 'date': dates, 'price': price })
+            df['buy_moving_average'] = df['price'].rolling(window=buy_day_range).mean()
+            df['sell_moving_average'] = df['price'].rolling(window=sell_day_range).mean()
+            
+            backtests = {
+                'row by row loop': lambda: legacy_moving_average_backtest(df, 10_000),
+                # As served, with the averages of the indicator store standing in for the SMA nodes
+                'framework, precomputed averages': lambda: moving_average.run_moving_average_backtest(
+                    df, 10_000, buy_day_range, sell_day_range
+                ),
+                f'framework, {ma_strategy.name}': lambda: ma_strategy.run_backtest(dates, { 'price': price }, 10_000)
+            }
+            
+            expected = backtests['row by row loop']()
+            for name, backtest in list(backtests.items())[1:]:
+                log = backtest()
+                rows = [dict(zip(log, values)) for values in zip(*log.values())]
+                if rows != expected:
+                    raise CommandError(f'{name} disagrees with the row by row loop')
+            
+            for other_strategy in (strategy.sma_crossover(buy_day_range, sell_day_range),
+                                   strategy.rsi_threshold(),
+                                   strategy.bollinger_breakout()):
+                backtests[f'framework, {other_strategy.name}'] = (
+                    lambda other_strategy=other_strategy: other_strategy.run_backtest(dates, { 'price': price }, 10_000)
+                )
+            
+            baseline_ms = None
+            for name, backtest in backtests.items():
+                elapsed_ms = time_call(backtest, options['repeat'])
+                baseline_ms = baseline_ms or elapsed_ms
+                self.stdout.write(f"{num_days:>6} {name:<40} {elapsed_ms:>10.3f} {baseline_ms / elapsed_ms:>7.1f}x")
+
+
+def legacy_moving_average_backtest(stock_dataframe, initial_investment):
+    """The original row by row implementation of the moving average strategy"""
+    cash = initial_investment
+    stock_holdings = 0
+    total_value = initial_investment
+    log_data = []
+    
+    for i in range(len(stock_dataframe)):
+        current_price = stock_dataframe.iloc[i]['price']
+        buy_threshold = stock_dataframe.iloc[i]['buy_moving_average']
+        sell_threshold = stock_dataframe.iloc[i]['sell_moving_average']
+        action = 'Hold'
+        
+        if current_price < buy_threshold and cash > 0:
+            stock_holdings = cash / current_price
+            cash = 0
+            action = 'Buy'
+        elif current_price > sell_threshold and stock_holdings > 0:
+            cash = stock_holdings * current_price
+            stock_holdings = 0
+            action = 'Sell'
+        
+        total_value = cash + (stock_holdings * current_price if stock_holdings > 0 else 0)
+        log_data.append({
+            'date': stock_dataframe.iloc[i]['date'],
+            'action': action,
+            'price': current_price,
+            'cash': cash,
+            'stock_holdings': stock_holdings,
+            'total_value': total_value,
+            'return': total_value - initial_investment
+        })
+    
+    if stock_holdings > 0:
+        final_price = stock_dataframe.iloc[-1]['price']
+        cash = stock_holdings * final_price
+        log_data.append({
+            'date': stock_dataframe.iloc[-1]['date'],
+            'action': 'Sell',
+            'price': final_price,
+            'cash': cash,
+            'stock_holdings': 0,
+            'total_value': cash,
+            'return': total_value - initial_investment
+        })
+    
+    return log_data
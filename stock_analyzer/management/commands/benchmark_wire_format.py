@@ -0,0 +1,78 @@
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+
+from stock_analyzer.views.wire_format import arrow_ipc
+
+from datetime import date, timedelta
+import json
+import statistics
+import time
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+
+TRADING_DAYS_PER_YEAR = 252
+
+
+class Command(BaseCommand):
+    help = ('Compares the payload size and encode/decode time of the JSON and Arrow IPC formats '
+            'of get_stock_data for several history lengths, using synthetic data.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--years', nargs='+', type=int, default=[2, 20],
+                            help='History lengths in years')
+        parser.add_argument('--repeat', type=int, default=20,
+                            help='Number of times each encode and decode is timed')
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{'years':>6} {'rows':>7} {'format':<7} {'bytes':>10} {'encode (ms)':>12} {'decode (ms)':>12}"
+        )
+        for years in options['years']:
+            columns = synthetic_stock_data(years * TRADING_DAYS_PER_YEAR)
+            rows = [dict(zip(columns, values)) for values in zip(*columns.values())]
+            
+            formats = {
+                'json': (
+                    lambda: json.dumps(rows, cls=DjangoJSONEncoder).encode(),
+                    lambda payload: pd.DataFrame(json.loads(payload))
+                ),
+                'arrow': (
+                    lambda: arrow_ipc.to_response(
+                        arrow_ipc.columns_to_table(columns, arrow_ipc.STOCK_DATA_SCHEMA)
+                    ).content,
+                    lambda payload: pa.ipc.open_stream(payload).read_all().to_pandas(split_blocks=True)
+                )
+            }
+            for format_name, (encode, decode) in formats.items():
+                payload = encode()
+                encode_ms = time_call(encode, options['repeat'])
+                decode_ms = time_call(lambda: decode(payload), options['repeat'])
+                self.stdout.write(
+                    f"{years:>6} {len(rows):>7} {format_name:<7} {len(payload):>10} {encode_ms:>12.3f} {decode_ms:>12.3f}"
+                )
+
+
+def synthetic_stock_data(num_rows):
+    rng = np.random.default_rng(0)
+    prices = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, num_rows)))
+    return {
+        'id': list(range(1, num_rows + 1)),
+        'symbol': ['BENCH'] * num_rows,
+        'date': [date(2000, 1, 3) + timedelta(days=i) for i in range(num_rows)],
+        'open': prices.tolist(),
+        'high': (prices * 1.01).tolist(),
+        'low': (prices * 0.99).tolist(),
+        'close': (prices * rng.uniform(0.98, 1.02, num_rows)).tolist(),
+        'volume': rng.integers(1_000, 10_000_000, num_rows).tolist()
+    }
+
+
+def time_call(function, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
@@ -0,0 +1,87 @@
+from django.core.management.base import BaseCommand
+
+import asyncio
+import itertools
+import statistics
+import time
+import httpx
+
+
+ENDPOINTS = {
+    'get_stock_data': ('get_stock_data/', {}),
+    'backtest_moving_average': (
+        'backtest_moving_average/',
+        { 'initial_investment': 10000, 'buy_day_range': 20, 'sell_day_range': 50 }
+    ),
+    'predict_future_prices': (
+        'predict_future_prices/linear_regression/',
+        { 'num_days': 30, 'model_type': 'Linear Regression' }
+    )
+}
+
+
+class Command(BaseCommand):
+    help = ('Compares the throughput and latency of the sync and async variants of an endpoint on a '
+            'running server at the same concurrency. Run the server under ASGI (e.g. uvicorn '
+            'StockDanalysis.asgi:application) so the async views run on the event loop.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000/api/',
+                            help='URL the api/ routes are served under')
+        parser.add_argument('--endpoint', choices=ENDPOINTS, default='get_stock_data')
+        parser.add_argument('--symbols', nargs='+', default=['IBM'],
+                            help='Symbols requested in turn')
+        parser.add_argument('--concurrency', type=int, default=50,
+                            help='Number of requests in flight at once')
+        parser.add_argument('--requests', type=int, default=500,
+                            help='Number of requests sent to each variant')
+
+    def handle(self, *args, **options):
+        path, params = ENDPOINTS[options['endpoint']]
+        base_url = options['base_url'].rstrip('/') + '/'
+        
+        self.stdout.write(
+            f"{'variant':<8} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 (ms)':>10} {'p95 (ms)':>10} {'max (ms)':>10}"
+        )
+        for variant, url in (('sync', base_url + path), ('async', base_url + 'async/' + path)):
+            latencies, errors, elapsed = asyncio.run(
+                load(url, params, options['symbols'], options['concurrency'], options['requests'])
+            )
+            latencies = sorted(latencies) or [0]
+            self.stdout.write(
+                f"{variant:<8} {options['requests']:>9} {errors:>7} {options['requests'] / elapsed:>9.1f} "
+                f"{statistics.median(latencies):>10.1f} {latencies[int(0.95 * (len(latencies) - 1))]:>10.1f} "
+                f"{latencies[-1]:>10.1f}"
+            )
+
+
+async def load(url, params, symbols, concurrency, num_requests):
+    """Sends `num_requests` GET requests with at most `concurrency` in flight.
+
+    Returns:
+        tuple: The latencies of the successful requests in milliseconds, the number of failed
+               requests and the elapsed seconds
+    """
+    symbol_cycle = itertools.cycle(symbols)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+    
+    async def send(client, symbol):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await client.get(url, params={ 'symbol': symbol, **params })
+                response.raise_for_status()
+                latencies.append((time.perf_counter() - start) * 1000)
+            except httpx.HTTPError:
+                errors += 1
+    
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=None) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(send(client, next(symbol_cycle)) for _ in range(num_requests)))
+        elapsed = time.perf_counter() - start
+    
+    return latencies, errors, elapsed
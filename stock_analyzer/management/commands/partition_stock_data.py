@@ -0,0 +1,66 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+
+from stock_analyzer.views.postgres_api import partitions
+from stock_analyzer.views.storage import registry
+from stock_analyzer.views.data_cache import response_cache
+
+from datetime import date, timedelta
+
+
+class Command(BaseCommand):
+    help = ('Maintains the yearly partitions of the stock data table. Creates the partitions of '
+            'the given years ahead of ingestion, drops the partitions past STOCK_DATA_RETENTION_DAYS '
+            'and lists the row count of every partition.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--years',
+                            help='Years to create partitions for, as a single year or a range such as 2000-2030')
+        parser.add_argument('--drop-expired', action='store_true',
+                            help='Drop the partitions whose every day is past the retention horizon')
+
+    def handle(self, *args, **options):
+        if not partitions.is_partitioned():
+            raise CommandError('The stock data table is not partitioned. Partitioning requires Postgres.')
+
+        if options['years']:
+            with transaction.atomic():
+                partitions.ensure_partitions(parse_years(options['years']))
+
+        if options['drop_expired']:
+            cutoff_date = date.today() - timedelta(days=settings.STOCK_DATA_RETENTION_DAYS)
+            dropped = partitions.drop_partitions_before(cutoff_date)
+            # The Parquet store and the shared response cache still hold the dropped rows.
+            # Clearing the cache also retires every data version, so the price caches of
+            # running servers reload the history.
+            parquet_store = registry.get_parquet_backend()
+            if parquet_store is not None:
+                parquet_store.invalidate()
+            response_cache.invalidate()
+            self.stdout.write(f'Dropped the partitions of {dropped or "no years"} (before {cutoff_date})')
+
+        for name, num_rows in partition_sizes():
+            self.stdout.write(f'{name:40} {num_rows:>12}')
+
+
+def parse_years(value):
+    """Parses a year or an inclusive range of years such as '2000-2030'."""
+    try:
+        first, _, last = value.partition('-')
+        return range(int(first), int(last or first) + 1)
+    except ValueError:
+        raise CommandError(f"Invalid years '{value}'")
+
+
+def partition_sizes():
+    """Returns the name and estimated row count of every partition, in name order."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT child.relname, GREATEST(child.reltuples, 0)::bigint FROM pg_inherits '
+            'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+            'WHERE pg_inherits.inhparent = %s::regclass ORDER BY child.relname',
+            [partitions.TABLE]
+        )
+        return cursor.fetchall()
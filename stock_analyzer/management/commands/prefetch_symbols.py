@@ -0,0 +1,113 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.models import Max
+
+from stock_analyzer.models.stock_data import StockData
+from stock_analyzer.views.postgres_api import stock_data_query
+from stock_analyzer.views.external_api import alpha_vantage_api
+from stock_analyzer.views.external_api import rate_limiter
+from stock_analyzer.views.data_cache import freshness
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, timedelta
+import time
+
+
+class Command(BaseCommand):
+    help = ('Warms the database ahead of market open. Fetches the full history of symbols without '
+            'stored data and the compact delta of stale ones, concurrently within the Alpha Vantage '
+            'rate limit, and reports the throughput and failures.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('symbols', nargs='*', help='Symbols to prefetch')
+        parser.add_argument('--file',
+                            help='File with symbols to prefetch, separated by whitespace or commas. '
+                                 'Lines starting with # are ignored.')
+        parser.add_argument('--workers', type=int, default=settings.ALPHA_VANTAGE_POOL_SIZE,
+                            help='Number of concurrent fetches')
+
+    def handle(self, *args, **options):
+        symbols = read_symbols(options['symbols'], options['file'])
+        if not symbols:
+            raise CommandError('No symbols given')
+        
+        cold, stale, fresh = classify_symbols(symbols)
+        self.stdout.write(f'{len(symbols)} symbols: {len(cold)} cold, {len(stale)} stale, {len(fresh)} fresh')
+        
+        fetches = [(symbol, 'full') for symbol in cold] + [(symbol, 'compact') for symbol in stale]
+        
+        reports = []
+        failures = {}
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(options['workers'], 1)) as executor:
+            futures = {
+                executor.submit(prefetch_symbol, symbol, output_size): symbol
+                for symbol, output_size in fetches
+            }
+            for future in as_completed(futures):
+                symbol = futures[future]
+                try:
+                    reports.append(future.result())
+                except Exception as e:
+                    failures[symbol] = e.__str__()
+        elapsed = time.perf_counter() - start
+        
+        rows = sum(report['inserted'] for report in reports)
+        self.stdout.write(
+            f'Prefetched {len(reports)} of {len(fetches)} symbols and inserted {rows} rows in {elapsed:.2f}s '
+            f'({len(reports) / elapsed * 60 if elapsed else 0:.1f} symbols/min, '
+            f'{rows / elapsed if elapsed else 0:.0f} rows/sec)'
+        )
+        for symbol, error in sorted(failures.items()):
+            self.stderr.write(f'{symbol}: {error}')
+
+
+def read_symbols(symbols, path=None):
+    """Returns the upper-cased unique symbols of the arguments and the file, in order."""
+    if path is not None:
+        with open(path) as file:
+            for line in file:
+                if not line.lstrip().startswith('#'):
+                    symbols = [*symbols, *line.replace(',', ' ').split()]
+    return list(dict.fromkeys(symbol.upper() for symbol in symbols))
+
+
+def classify_symbols(symbols):
+    """Splits symbols into the ones without stored data, the ones whose most recent entry is
+    older than yesterday and the up to date ones, with one aggregate query.
+
+    Returns:
+        tuple: The cold, stale and fresh symbols
+    """
+    latest_dates = dict(
+        StockData.objects.filter(symbol__in=symbols).values('symbol').annotate(
+            latest_date=Max('date')
+        ).values_list('symbol', 'latest_date')
+    )
+    yesterday = date.today() - timedelta(days=1)
+    
+    cold = [symbol for symbol in symbols if symbol not in latest_dates]
+    stale = [symbol for symbol in symbols if symbol in latest_dates and latest_dates[symbol] < yesterday]
+    fresh = [symbol for symbol in symbols if symbol in latest_dates and latest_dates[symbol] >= yesterday]
+    return cold, stale, fresh
+
+
+def prefetch_symbol(symbol, output_size):
+    """Fetches and stores the data of one symbol at batch priority.
+
+    Returns:
+        dict: The ingestion report of the symbol
+    """
+    try:
+        with freshness.single_flight(symbol):
+            stock_data_json = alpha_vantage_api.get_time_series_daily(
+                symbol=symbol, output_size=output_size, priority=rate_limiter.BATCH
+            )
+            report = stock_data_query.save_daily_stock_data(stock_data_json)
+            freshness.mark_fresh(symbol, report['last_date'])
+        return report
+    
+    finally:
+        connection.close()
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from stock_analyzer.models.stock_data import StockData
+from stock_analyzer.views.data_prediction_models import linear_regression
+
+import time
+
+
+class Command(BaseCommand):
+    help = 'Refits the linear regression models and stores fresh predictions for many symbols in one job.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('symbols', nargs='*',
+                            help='Symbols to refresh. Defaults to every symbol with stored stock data.')
+        parser.add_argument('--num-days', type=int, default=30,
+                            help='Number of days to predict')
+
+    def handle(self, *args, **options):
+        symbols = [symbol.upper() for symbol in options['symbols']]
+        if not symbols:
+            symbols = list(StockData.objects.values_list('symbol', flat=True).distinct())
+        
+        start = time.perf_counter()
+        saved_predictions = linear_regression.predict_all_stock_data(symbols, options['num_days'])
+        elapsed = time.perf_counter() - start
+        
+        self.stdout.write(
+            f'Refreshed {options["num_days"]}-day predictions of {len(saved_predictions)} of '
+            f'{len(symbols)} symbols in {elapsed:.2f}s'
+        )
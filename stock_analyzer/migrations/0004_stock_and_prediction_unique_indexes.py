@@ -0,0 +1,32 @@
+# Generated by Django 5.1.2 on 2026-10-18 16:06
+
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def remove_duplicate_rows(apps, schema_editor):
+    """Keeps the earliest row of every duplicated key so the unique constraints can be created."""
+    for model_name, key_fields in (('StockData', ('symbol', 'date')),
+                                   ('PredictionData', ('symbol', 'model_type', 'date'))):
+        model = apps.get_model('stock_analyzer', model_name)
+        kept_ids = model.objects.values(*key_fields).annotate(kept_id=Min('id')).values('kept_id')
+        model.objects.exclude(id__in=kept_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock_analyzer', '0003_rename_model_used_predictiondata_model_type'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_rows, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='predictiondata',
+            constraint=models.UniqueConstraint(fields=('symbol', 'model_type', 'date'), include=('open', 'high', 'low', 'close', 'volume'), name='predictiondata_symbol_model_type_date_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='stockdata',
+            constraint=models.UniqueConstraint(fields=('symbol', 'date'), include=('open', 'high', 'low', 'close', 'volume'), name='stockdata_symbol_date_uniq'),
+        ),
+    ]
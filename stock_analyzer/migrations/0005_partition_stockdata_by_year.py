@@ -0,0 +1,97 @@
+from django.db import migrations
+
+from datetime import date
+
+
+TABLE = 'stock_analyzer_stockdata'
+OLD_TABLE = f'{TABLE}_old'
+
+COLUMNS = '''
+    id bigint GENERATED BY DEFAULT AS IDENTITY,
+    symbol text NOT NULL,
+    date date NOT NULL,
+    open double precision NOT NULL,
+    high double precision NOT NULL,
+    low double precision NOT NULL,
+    close double precision NOT NULL,
+    volume integer NOT NULL
+'''
+
+# Created as a unique index, like the AddConstraint of 0004 does
+UNIQUE_INDEX = f'CREATE UNIQUE INDEX stockdata_symbol_date_uniq ON {TABLE} (symbol, date) INCLUDE (open, high, low, close, volume)'
+
+
+def partition_by_year(apps, schema_editor):
+    """Rebuilds the stock data table as a Postgres table range partitioned by date, with one
+    partition per year from the oldest stored bar to next year and a default partition for
+    rows outside of them. The primary key includes the partition key, ids stay unique through
+    the shared identity sequence.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        _rename_existing(cursor)
+        cursor.execute(f'''
+            CREATE TABLE {TABLE} ({COLUMNS}, PRIMARY KEY (id, date))
+            PARTITION BY RANGE (date)
+        ''')
+        cursor.execute(UNIQUE_INDEX)
+
+        cursor.execute(f'SELECT EXTRACT(YEAR FROM MIN(date))::int FROM {OLD_TABLE}')
+        (first_year,) = cursor.fetchone()
+        this_year = date.today().year
+        for year in range(min(first_year or this_year, this_year), this_year + 2):
+            cursor.execute(
+                f'CREATE TABLE {TABLE}_y{year} PARTITION OF {TABLE} FOR VALUES FROM (%s) TO (%s)',
+                [date(year, 1, 1), date(year + 1, 1, 1)]
+            )
+        cursor.execute(f'CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT')
+
+        _copy_rows(cursor)
+
+
+def merge_partitions(apps, schema_editor):
+    """Rebuilds the stock data table as a single unpartitioned table."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        _rename_existing(cursor)
+        cursor.execute(f'CREATE TABLE {TABLE} ({COLUMNS}, PRIMARY KEY (id))')
+        cursor.execute(UNIQUE_INDEX)
+        _copy_rows(cursor)
+
+
+def _rename_existing(cursor):
+    # Frees the names of the table, its constraints and its id sequence
+    cursor.execute(f"SELECT pg_get_serial_sequence('{TABLE}', 'id')")
+    (sequence,) = cursor.fetchone()
+    cursor.execute(f'ALTER TABLE {TABLE} RENAME TO {OLD_TABLE}')
+    cursor.execute(f'ALTER SEQUENCE {sequence} RENAME TO {OLD_TABLE}_id_seq')
+    cursor.execute(f'ALTER TABLE {OLD_TABLE} RENAME CONSTRAINT {TABLE}_pkey TO {OLD_TABLE}_pkey')
+    cursor.execute(f'ALTER INDEX stockdata_symbol_date_uniq RENAME TO {OLD_TABLE}_uniq')
+
+
+def _copy_rows(cursor):
+    cursor.execute(f'''
+        INSERT INTO {TABLE} (id, symbol, date, open, high, low, close, volume)
+        OVERRIDING SYSTEM VALUE
+        SELECT id, symbol, date, open, high, low, close, volume FROM {OLD_TABLE}
+    ''')
+    cursor.execute(f'''
+        SELECT setval(pg_get_serial_sequence('{TABLE}', 'id'), COALESCE(MAX(id), 0) + 1, false) FROM {TABLE}
+    ''')
+    cursor.execute(f'DROP TABLE {OLD_TABLE}')
+    cursor.execute(f'ANALYZE {TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock_analyzer', '0004_stock_and_prediction_unique_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_by_year, merge_partitions),
+    ]
@@ -10,4 +10,12 @@ class PredictionData(models.Model):
     close = models.FloatField()
     volume = models.IntegerField()
     model_type = models.TextField()
-    
\ No newline at end of file
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['symbol', 'model_type', 'date'],
+                include=['open', 'high', 'low', 'close', 'volume'],
+                name='predictiondata_symbol_model_type_date_uniq'
+            )
+        ]
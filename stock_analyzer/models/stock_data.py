@@ -9,3 +9,14 @@ class StockData(models.Model):
     low = models.FloatField()
     close = models.FloatField()
     volume = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            # Backs every `symbol = ... ORDER BY date` lookup. The INCLUDE columns
+            # let Postgres answer price reads with an index-only scan.
+            models.UniqueConstraint(
+                fields=['symbol', 'date'],
+                include=['open', 'high', 'low', 'close', 'volume'],
+                name='stockdata_symbol_date_uniq'
+            )
+        ]
@@ -1,8 +1,13 @@
 from rest_framework import serializers
+from stock_analyzer.serializers.values_list import ValuesListSerializer
 from stock_analyzer.models.prediction_data import PredictionData
 
 
 class PredictionDataSerializer(serializers.ModelSerializer):
     class Meta:
         model = PredictionData
-        fields = ['id', 'symbol', 'date', 'open', 'high', 'low', 'close', 'volume', 'model_type']
\ No newline at end of file
+        fields = ['id', 'symbol', 'date', 'open', 'high', 'low', 'close', 'volume', 'model_type']
+
+
+class PredictionDataValuesSerializer(ValuesListSerializer):
+    fields = PredictionDataSerializer.Meta.fields
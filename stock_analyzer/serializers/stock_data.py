@@ -1,8 +1,13 @@
 from rest_framework import serializers
+from stock_analyzer.serializers.values_list import ValuesListSerializer
 from stock_analyzer.models.stock_data import StockData
 
 
 class StockDataSerializer(serializers.ModelSerializer):
     class Meta:
         model = StockData
-        fields = ['id', 'symbol', 'date', 'open', 'high', 'low', 'close', 'volume']
\ No newline at end of file
+        fields = ['id', 'symbol', 'date', 'open', 'high', 'low', 'close', 'volume']
+
+
+class StockDataValuesSerializer(ValuesListSerializer):
+    fields = StockDataSerializer.Meta.fields
@@ -0,0 +1,42 @@
+from django.db.models import QuerySet
+
+from datetime import date
+
+
+class ValuesListSerializer:
+    """A read-only serializer producing the same output as a `ModelSerializer` with `many=True`,
+    built straight from `values_list` tuples instead of model instances and per-field
+    `to_representation` calls. Columns are formatted in bulk, dates to ISO strings. Numeric
+    columns are passed through as the database driver already returns Python floats and ints.
+
+    Subclasses set `fields` to the `ModelSerializer.Meta.fields` they replace and `date_fields`
+    to the fields holding dates.
+
+    Args:
+        data (QuerySet | list[tuple]): A queryset, or rows of values in `fields` order
+    """
+    fields = ()
+    date_fields = ('date',)
+
+    def __init__(self, data):
+        if isinstance(data, QuerySet):
+            data = data.values_list(*self.fields)
+        self.rows = data
+
+    @property
+    def data(self):
+        """list[dict]: One dict per row, keyed by field"""
+        columns = self.columns
+        return [dict(zip(self.fields, row)) for row in zip(*columns.values())]
+
+    @property
+    def columns(self):
+        """dict: The formatted values of every field"""
+        columns = list(zip(*self.rows)) or [()] * len(self.fields)
+
+        formatted = {}
+        for field, values in zip(self.fields, columns):
+            if field in self.date_fields:
+                values = list(map(date.isoformat, values))
+            formatted[field] = values
+        return formatted
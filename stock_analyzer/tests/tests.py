@@ -1,3 +1,1407 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db import IntegrityError, connection, connections, transaction
+from django.http import JsonResponse
+from django.test import SimpleTestCase
+from django.test import Client
+from django.test import RequestFactory
 from django.test import TestCase
+from django.test import TransactionTestCase
+from django.test import override_settings
 
-# Create your tests here.
+from stock_analyzer.models.prediction_data import PredictionData
+from stock_analyzer.models.stock_data import StockData
+from stock_analyzer.serializers.prediction_data import PredictionDataSerializer, PredictionDataValuesSerializer
+from stock_analyzer.serializers.stock_data import StockDataSerializer, StockDataValuesSerializer
+from stock_analyzer.management.commands.benchmark_partitions import plan_relations
+from stock_analyzer.management.commands.benchmark_strategies import legacy_moving_average_backtest
+from stock_analyzer.views.backtest_strategies import batch_backtest
+from stock_analyzer.views.backtest_strategies import execution
+from stock_analyzer.views.backtest_strategies import metrics
+from stock_analyzer.views.backtest_strategies import moving_average
+from stock_analyzer.views.backtest_strategies import parameter_sweep
+from stock_analyzer.views.backtest_strategies import strategy
+from stock_analyzer.views.data_prediction_models import batched_regression
+from stock_analyzer.views.data_prediction_models import report_jobs
+from stock_analyzer.views.data_cache import freshness
+from stock_analyzer.views.data_cache import indicator_store
+from stock_analyzer.views.data_cache import model_registry
+from stock_analyzer.views.data_cache import price_cache
+from stock_analyzer.views.data_cache import response_cache
+from stock_analyzer.views.data_cache.symbol_context import SymbolDataContext
+from stock_analyzer.views.external_api import alpha_vantage_api
+from stock_analyzer.views.external_api import rate_limiter
+from stock_analyzer.views.postgres_api import connection_pool
+from stock_analyzer.views.postgres_api import partitions
+from stock_analyzer.views.postgres_api import prediction_data_query
+from stock_analyzer.views.postgres_api import stock_data_query
+from stock_analyzer.views.storage import backends
+from stock_analyzer.views.storage.backends import StockDataBackend
+from stock_analyzer.views.storage.parquet_backend import ParquetBackend
+from stock_analyzer.views import views
+from stock_analyzer.views.wire_format import arrow_ipc
+
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from io import BytesIO
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from unittest import skipUnless
+import asyncio
+import importlib
+import json
+import os
+import runpy
+import tempfile
+import threading
+import time
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+
+def random_stock_dataframe(num_days, buy_day_range, sell_day_range, seed):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'date': [date(2022, 1, 3) + timedelta(days=i) for i in range(num_days)],
+        'price': 100 * np.exp(np.cumsum(rng.normal(0, 0.02, num_days)))
+    })
+    df['buy_moving_average'] = df['price'].rolling(window=buy_day_range).mean()
+    df['sell_moving_average'] = df['price'].rolling(window=sell_day_range).mean()
+    return df
+
+
+class MovingAverageBacktestTests(SimpleTestCase):
+    def test_matches_legacy_loop(self):
+        for seed, (buy_day_range, sell_day_range) in enumerate([(1, 1), (5, 10), (20, 5), (50, 200), (3, 3)]):
+            for initial_investment in (0, 1, 10_000):
+                df = random_stock_dataframe(500, buy_day_range, sell_day_range, seed)
+                
+                expected = legacy_moving_average_backtest(df, initial_investment)
+                log = moving_average.run_moving_average_backtest(df, initial_investment, buy_day_range, sell_day_range)
+                
+                self.assertEqual(len(log['date']), len(expected))
+                for column in expected[0]:
+                    self.assertEqual(log[column], [row[column] for row in expected], column)
+
+    def test_empty_dataframe(self):
+        df = random_stock_dataframe(0, 5, 10, seed=0)
+        log = moving_average.run_moving_average_backtest(df, 1000, 5, 10)
+        self.assertEqual(log['date'], [])
+
+    def test_precomputed_averages_match_the_strategy_smas(self):
+        df = random_stock_dataframe(500, 20, 50, seed=0)
+        
+        served = moving_average.run_moving_average_backtest(df, 1000, 20, 50)
+        computed = moving_average.moving_average_strategy(20, 50).run_backtest(
+            df['date'].to_numpy(), { 'price': df['price'].to_numpy() }, 1000
+        )
+        
+        self.assertEqual(served, computed)
+
+
+
+class ParameterSweepTests(SimpleTestCase):
+    def test_cells_match_the_single_backtest(self):
+        buy_day_ranges, sell_day_ranges = [1, 5, 20, 50], [3, 10, 200]
+        df = random_stock_dataframe(600, 1, 1, seed=3)
+        
+        results = parameter_sweep.simulate_sweep(df['price'].to_numpy(), 1000, buy_day_ranges, sell_day_ranges)
+        
+        for i, buy_day_range in enumerate(buy_day_ranges):
+            for j, sell_day_range in enumerate(sell_day_ranges):
+                df = random_stock_dataframe(600, buy_day_range, sell_day_range, seed=3)
+                single = moving_average.backtest_moving_average(df, 1000, buy_day_range, sell_day_range)['metrics']
+                with self.subTest(buy_day_range=buy_day_range, sell_day_range=sell_day_range):
+                    # The wealth after each trade is a running product in the sweep
+                    self.assertEqual(results['num_trades'][i, j], single['num_trades'])
+                    self.assertAlmostEqual(results['total_return'][i, j], single['total_return'], delta=1e-9 * 1000)
+                    self.assertAlmostEqual(results['max_drawdown'][i, j], single['max_drawdown'], delta=1e-12)
+
+class StrategyFrameworkTests(SimpleTestCase):
+    def evaluate(self, expression, **columns):
+        return strategy.Evaluator({ name: np.asarray(values, dtype=np.float64) for name, values in columns.items() })(expression)
+
+    def test_shift(self):
+        x = strategy.Column('x')
+        np.testing.assert_array_equal(self.evaluate(x.shift(2), x=[1, 2, 3, 4]), [np.nan, np.nan, 1, 2])
+        np.testing.assert_array_equal(self.evaluate(x.shift(5), x=[1, 2, 3, 4]), [np.nan] * 4)
+
+    def test_cross(self):
+        x = strategy.Column('x')
+        values = [1, 2, 3, 2, 1, 3]
+        
+        self.assertEqual(self.evaluate(x.crosses_above(2), x=values).tolist(), [False, False, True, False, False, True])
+        self.assertEqual(self.evaluate(x.crosses_below(2), x=values).tolist(), [False, False, False, False, True, False])
+
+    def test_rsi_matches_wilders_definition(self):
+        window = 14
+        price = 100 + np.random.default_rng(0).normal(0, 1, 100).cumsum()
+        
+        change = np.diff(price)
+        gain, loss = np.clip(change, 0, None), np.clip(-change, 0, None)
+        average_gain, average_loss = gain[:window].mean(), loss[:window].mean()
+        expected = [np.nan] * window + [100 - 100 / (1 + average_gain / average_loss)]
+        for i in range(window, len(change)):
+            average_gain = (average_gain * (window - 1) + gain[i]) / window
+            average_loss = (average_loss * (window - 1) + loss[i]) / window
+            expected.append(100 - 100 / (1 + average_gain / average_loss))
+        
+        np.testing.assert_allclose(self.evaluate(strategy.RSI(strategy.PRICE, window), price=price), expected)
+        self.assertEqual(self.evaluate(strategy.RSI(strategy.PRICE, 3), price=[1, 2, 3, 4, 5])[-1], 100)
+
+    def test_bollinger_bands(self):
+        price = pd.Series(100 + np.random.default_rng(1).normal(0, 1, 60).cumsum())
+        lower, middle, upper = strategy.bollinger_bands(strategy.PRICE, window=20, num_std=2)
+        
+        mean = price.rolling(20).mean().to_numpy()
+        std = price.rolling(20).std(ddof=0).to_numpy()
+        np.testing.assert_allclose(self.evaluate(middle, price=price), mean)
+        np.testing.assert_allclose(self.evaluate(lower, price=price), mean - 2 * std)
+        np.testing.assert_allclose(self.evaluate(upper, price=price), mean + 2 * std)
+
+    def test_shared_subexpressions_are_computed_once(self):
+        # Separately built but structurally equal nodes share one value
+        crossover = strategy.Strategy(
+            'test',
+            entry=strategy.SMA(strategy.PRICE, 5).crosses_above(strategy.SMA(strategy.PRICE, 20)),
+            exit=strategy.SMA(strategy.PRICE, 5).crosses_below(strategy.SMA(strategy.PRICE, 20))
+        )
+        with mock.patch.object(strategy, '_rolling', wraps=strategy._rolling) as rolling:
+            crossover.signals({ 'price': np.arange(50, dtype=np.float64) })
+        
+        self.assertEqual(rolling.call_count, 2)
+
+    def test_nan_rules_never_trade(self):
+        threshold = strategy.Column('threshold')
+        never = strategy.Strategy('test', entry=strategy.PRICE < threshold, exit=strategy.PRICE > threshold)
+        log = never.run_backtest(
+            np.arange(10), { 'price': np.arange(1, 11, dtype=np.float64), 'threshold': np.full(10, np.nan) }, 1000
+        )
+        
+        self.assertEqual(set(log['action']), { 'Hold' })
+        self.assertEqual(log['total_value'], [1000] * 10)
+
+
+
+class BacktestMetricsTests(SimpleTestCase):
+    def compute(self, price, buy_signal, sell_signal):
+        # Four years between the first and the last day
+        dates = np.array([date(2020, 1, 1) + timedelta(days=day) for day in (0, 1, 2, 3, 1461)])
+        simulation = execution.simulate_all_in_all_out(np.array(price), np.array(buy_signal), np.array(sell_signal), 1000)
+        return metrics.compute_metrics(dates, simulation, 1000)
+
+    def test_metrics_of_a_known_equity_curve(self):
+        # Bought on the first day, the daily returns are +10%, -10%, +20% and 0%
+        result = self.compute([100, 110, 99, 118.8, 118.8], [True] + [False] * 4, [False] * 5)
+        
+        expected = {
+            'total_return': 188.0,
+            'num_trades': 2,
+            'max_drawdown': 0.1,
+            'max_drawdown_days': 1,
+            'cagr': 1.188 ** 0.25 - 1,
+            # The returns have a mean of 0.05, a sample variance of 0.05 / 3 and a downside deviation of 0.05
+            'volatility': np.sqrt(252 * 0.05 / 3),
+            'sharpe': np.sqrt(252 * 0.15),
+            'sortino': np.sqrt(252),
+            'win_rate': 1.0,
+            'exposure': 1.0,
+            'turnover': (1000 + 1188) / 1093.2 / 4
+        }
+        self.assertEqual(result.keys(), expected.keys())
+        for name, value in expected.items():
+            with self.subTest(metric=name):
+                self.assertAlmostEqual(result[name], value, places=9)
+
+    def test_undefined_ratios_without_trades(self):
+        result = self.compute([100, 110, 99, 118.8, 118.8], [False] * 5, [False] * 5)
+        
+        self.assertEqual((result['total_return'], result['num_trades'], result['max_drawdown']), (0.0, 0, 0.0))
+        self.assertEqual((result['cagr'], result['volatility'], result['exposure']), (0.0, 0.0, 0.0))
+        self.assertEqual((result['sharpe'], result['sortino'], result['win_rate']), (None, None, None))
+
+
+class AlphaVantageStub:
+    """A local HTTP server answering like the Alpha Vantage API. The first `server_errors`
+    calls get a 503 response, the next `rate_limited` ones the rate limit response.
+    """
+
+    def __init__(self, rate_limited=0, server_errors=0):
+        self.rate_limited = rate_limited
+        self.server_errors = server_errors
+        self.calls = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                stub.calls.append(self.client_address)
+                if len(stub.calls) <= stub.server_errors:
+                    self.send_response(503)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                if len(stub.calls) <= stub.server_errors + stub.rate_limited:
+                    data = { 'Information': 'Thank you for using Alpha Vantage! Our standard API rate limit is 25 requests per day.' }
+                else:
+                    data = {
+                        'Meta Data': { '2. Symbol': 'STUB' },
+                        'Time Series (Daily)': {
+                            '2024-01-02': { '1. open': '1', '2. high': '2', '3. low': '0.5', '4. close': '1.5', '5. volume': '100' }
+                        }
+                    }
+                body = json.dumps(data).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_port}/query'
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class RateLimitSchedulerTests(SimpleTestCase):
+    def test_waits_for_refill(self):
+        scheduler = rate_limiter.RateLimitScheduler([(2, 0.5)])
+        start = time.monotonic()
+        for _ in range(3):
+            scheduler.acquire(timeout=1)
+        self.assertGreaterEqual(time.monotonic() - start, 0.2)
+
+    def test_interactive_calls_go_first(self):
+        scheduler = rate_limiter.RateLimitScheduler([(1, 0.3)])
+        scheduler.acquire()
+        
+        order = []
+        def call(priority):
+            scheduler.acquire(priority, timeout=2)
+            order.append(priority)
+        
+        threads = [threading.Thread(target=call, args=(rate_limiter.BATCH,))]
+        threads[0].start()
+        while scheduler.pending() < 1:
+            time.sleep(0.001)
+        threads.append(threading.Thread(target=call, args=(rate_limiter.INTERACTIVE,)))
+        threads[1].start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(order, [rate_limiter.INTERACTIVE, rate_limiter.BATCH])
+
+    def test_fails_fast_when_quota_is_spent(self):
+        scheduler = rate_limiter.RateLimitScheduler([(1, 60), (1, 24 * 60 * 60)])
+        scheduler.acquire()
+        
+        start = time.monotonic()
+        with self.assertRaises(rate_limiter.RateLimitExceeded):
+            scheduler.acquire(timeout=5)
+        self.assertLess(time.monotonic() - start, 1)
+
+    def test_retries_only_count_against_the_shortest_limit(self):
+        scheduler = rate_limiter.RateLimitScheduler([(10, 60), (1, 24 * 60 * 60)])
+        scheduler.acquire()
+        scheduler.acquire(timeout=1, retry=True)
+        
+        with self.assertRaises(rate_limiter.RateLimitExceeded):
+            scheduler.acquire(timeout=1)
+
+    def test_shared_quota_limits_every_scheduler(self):
+        limits = [(2, 60), (3, 24 * 60 * 60)]
+        cache = caches['rate_limits']
+        cache.clear()
+        # Every process has its own scheduler, with the whole of the limits
+        schedulers = [
+            rate_limiter.RateLimitScheduler(limits, quota=rate_limiter.SharedQuota(cache, 'test', limits))
+            for _ in range(2)
+        ]
+        
+        schedulers[0].acquire()
+        schedulers[1].acquire()
+        with self.assertRaises(rate_limiter.RateLimitExceeded):
+            schedulers[1].acquire(timeout=1)
+
+
+@override_settings(ALPHA_VANTAGE_REQUESTS_PER_MINUTE=6000, ALPHA_VANTAGE_BACKOFF_SECONDS=0.01,
+                   ALPHA_VANTAGE_QUEUE_TIMEOUT_SECONDS=1, ALPHA_VANTAGE_MAX_RETRIES=2)
+class AlphaVantageApiTests(SimpleTestCase):
+    def setUp(self):
+        # Every test gets its own session and scheduler, created from its settings
+        for name in ('_session', '_scheduler'):
+            patcher = mock.patch.object(alpha_vantage_api, name, None)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        caches[alpha_vantage_api.QUOTA_CACHE_ALIAS].clear()
+
+    def test_retries_rate_limit_response_on_one_connection(self):
+        with AlphaVantageStub(rate_limited=1) as stub, self.settings(ALPHA_VANTAGE_BASE_URL=stub.url):
+            data = alpha_vantage_api.get_time_series_daily('STUB')
+            alpha_vantage_api.get_time_series_daily('STUB')
+        
+        self.assertIn('Time Series (Daily)', data)
+        self.assertEqual(len(stub.calls), 3)
+        self.assertEqual(len(set(stub.calls)), 1)
+
+    def test_rate_limit_error_after_retries(self):
+        with AlphaVantageStub(rate_limited=10) as stub, self.settings(ALPHA_VANTAGE_BASE_URL=stub.url):
+            with self.assertRaisesMessage(Exception, 'Alpha Vantage rate limit reached'):
+                alpha_vantage_api.get_time_series_daily('STUB')
+        
+        self.assertEqual(len(stub.calls), 3)
+
+    def test_rate_limit_retries_only_use_the_minute_quota(self):
+        with AlphaVantageStub(rate_limited=2) as stub, self.settings(ALPHA_VANTAGE_BASE_URL=stub.url,
+                                                                     ALPHA_VANTAGE_REQUESTS_PER_DAY=1):
+            data = alpha_vantage_api.get_time_series_daily('STUB')
+        
+        self.assertIn('Time Series (Daily)', data)
+        self.assertEqual(len(stub.calls), 3)
+
+    def test_sync_and_async_calls_retry_server_errors(self):
+        with AlphaVantageStub(server_errors=2) as stub, self.settings(ALPHA_VANTAGE_BASE_URL=stub.url):
+            data = alpha_vantage_api.get_time_series_daily('STUB')
+            async_data = asyncio.run(alpha_vantage_api.aget_time_series_daily('STUB'))
+        
+        self.assertEqual(async_data, data)
+        self.assertEqual(len(stub.calls), 4)
+        
+        with AlphaVantageStub(server_errors=2) as stub, self.settings(ALPHA_VANTAGE_BASE_URL=stub.url):
+            asyncio.run(alpha_vantage_api.aget_time_series_daily('STUB'))
+        
+        self.assertEqual(len(stub.calls), 3)
+
+
+def time_series_response(symbol, dates):
+    return {
+        'Meta Data': { '2. Symbol': symbol },
+        'Time Series (Daily)': {
+            stock_date.isoformat(): {
+                '1. open': f'{i}.25', '2. high': f'{i + 1}', '3. low': f'{i - 1}', '4. close': f'{i}.75', '5. volume': f'{i * 100}'
+            }
+            for i, stock_date in enumerate(dates, start=1)
+        }
+    }
+
+
+class SaveDailyStockDataTests(TestCase):
+    def test_skips_stored_dates_and_reports_counts(self):
+        today = date.today()
+        stock_data_query.save_daily_stock_data(time_series_response('TEST', [today - timedelta(days=3), today - timedelta(days=2)]))
+        
+        report = stock_data_query.save_daily_stock_data(time_series_response('TEST', [
+            # Older than the retention window, dropped while parsing
+            today - timedelta(days=settings.STOCK_DATA_RETENTION_DAYS + 1),
+            today - timedelta(days=3), today - timedelta(days=2), today - timedelta(days=1), today
+        ]))
+        
+        self.assertEqual({ key: report[key] for key in ('symbol', 'inserted', 'skipped', 'last_date') }, {
+            'symbol': 'TEST', 'inserted': 2, 'skipped': 2, 'last_date': today
+        })
+        self.assertEqual(
+            list(StockData.objects.filter(symbol='TEST').order_by('date').values_list('date', 'open', 'volume')),
+            [(today - timedelta(days=3), 1.25, 100), (today - timedelta(days=2), 2.25, 200),
+             (today - timedelta(days=1), 4.25, 400), (today, 5.25, 500)]
+        )
+
+    def test_reports_empty_responses(self):
+        report = stock_data_query.save_daily_stock_data(time_series_response('TEST', []))
+        
+        self.assertEqual((report['inserted'], report['skipped'], report['last_date']), (0, 0, None))
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Ingestions only take turns on Postgres')
+class ConcurrentSaveDailyStockDataTests(TransactionTestCase):
+    def test_rows_stored_by_a_concurrent_ingestion_are_reported_as_skipped(self):
+        dates = [date.today() - timedelta(days=2), date.today() - timedelta(days=1)]
+        saved = threading.Event()
+        commit = threading.Event()
+        
+        def first_ingestion():
+            try:
+                with transaction.atomic():
+                    stock_data_query.save_daily_stock_data(time_series_response('TEST', dates))
+                    saved.set()
+                    commit.wait(timeout=5)
+            finally:
+                connection.close()
+        
+        thread = threading.Thread(target=first_ingestion)
+        thread.start()
+        self.assertTrue(saved.wait(timeout=5))
+        # Commit the first ingestion while the second one waits for it
+        threading.Timer(0.2, commit.set).start()
+        report = stock_data_query.save_daily_stock_data(time_series_response('TEST', dates))
+        thread.join()
+        
+        self.assertEqual((report['inserted'], report['skipped']), (0, 2))
+        self.assertEqual(StockData.objects.filter(symbol='TEST').count(), 2)
+
+
+class ValuesListSerializerTests(TestCase):
+    def setUp(self):
+        for i in range(3):
+            fields = { 'symbol': 'TEST', 'date': date(2024, 2, 28) + timedelta(days=i), 'open': 100 + i / 3,
+                       'high': 101, 'low': 99.5, 'close': 1e-7 * i, 'volume': 2 ** 31 - 1 - i }
+            StockData.objects.create(**fields)
+            PredictionData.objects.create(model_type='Linear Regression', **fields)
+
+    def test_matches_model_serializers(self):
+        cases = [
+            (StockDataValuesSerializer, StockDataSerializer, StockData.objects.order_by('date')),
+            (PredictionDataValuesSerializer, PredictionDataSerializer, PredictionData.objects.order_by('date')),
+            (StockDataValuesSerializer, StockDataSerializer, StockData.objects.none())
+        ]
+        for values_serializer, model_serializer, queryset in cases:
+            with self.subTest(serializer=values_serializer.__name__, rows=queryset.count()):
+                expected = [dict(row) for row in model_serializer(queryset, many=True).data]
+                
+                self.assertEqual(values_serializer(queryset).data, expected)
+                # Rows read elsewhere are serialized the same way
+                self.assertEqual(values_serializer(list(queryset.values_list(*values_serializer.fields))).data, expected)
+                self.assertEqual([list(row) for row in values_serializer(queryset).data], [list(row) for row in expected])
+
+
+class StockDataPaginationTests(TestCase):
+    def setUp(self):
+        caches[response_cache.CACHE_ALIAS].clear()
+        today = date.today()
+        self.dates = [today - timedelta(days=i) for i in range(25)]
+        StockData.objects.bulk_create(
+            StockData(symbol='PAGE', date=stock_date, open=i, high=i + 1, low=i - 1, close=i + 0.5, volume=i)
+            for i, stock_date in enumerate(self.dates)
+        )
+        freshness.mark_fresh('PAGE', today)
+        self.addCleanup(freshness.invalidate, 'PAGE')
+        self.client = Client(SERVER_NAME='localhost')
+
+    def test_next_until_walks_every_page_once(self):
+        for url in ('/api/get_stock_data/', '/api/async/get_stock_data/'):
+            with self.subTest(url=url):
+                dates, page_sizes, params = [], [], { 'symbol': 'page', 'limit': 10 }
+                while True:
+                    response = self.client.get(url, params)
+                    page = response.json()
+                    dates += [date.fromisoformat(entry['date']) for entry in page]
+                    page_sizes.append(len(page))
+                    if 'X-Next-Until' not in response:
+                        break
+                    params['until'] = response['X-Next-Until']
+                
+                self.assertEqual(dates, self.dates)
+                self.assertEqual(page_sizes, [10, 10, 5])
+
+    def test_cursor_of_full_last_page_leads_to_an_empty_page(self):
+        response = self.client.get('/api/get_stock_data/', { 'symbol': 'PAGE', 'limit': 25 })
+        last = self.client.get('/api/get_stock_data/', { 'symbol': 'PAGE', 'limit': 25, 'until': response['X-Next-Until'] })
+        
+        self.assertEqual(last.json(), [])
+        self.assertNotIn('X-Next-Until', last)
+
+    def test_arrow_and_streamed_pages_share_the_cursor(self):
+        params = { 'symbol': 'PAGE', 'limit': 10, 'since': self.dates[19].isoformat() }
+        response = self.client.get('/api/get_stock_data/', params)
+        arrow = self.client.get('/api/get_stock_data/', params, HTTP_ACCEPT='application/vnd.apache.arrow.stream')
+        streamed = self.client.get('/api/get_stock_data/', { **params, 'stream': 'true' })
+        
+        self.assertEqual(arrow['X-Next-Until'], response['X-Next-Until'])
+        self.assertEqual(json.loads(b''.join(streamed.streaming_content)), response.json())
+        
+        rest = self.client.get('/api/get_stock_data/', { **params, 'until': response['X-Next-Until'] }).json()
+        self.assertEqual([entry['date'] for entry in response.json() + rest], [stock_date.isoformat() for stock_date in self.dates[:20]])
+
+
+def read_arrow_table(response):
+    return pa.ipc.open_stream(response.content).read_all()
+
+
+def isoformat_dates(rows):
+    return [{ field: value.isoformat() if isinstance(value, date) else value for field, value in row.items() } for row in rows]
+
+
+class ArrowResponseTests(TestCase):
+    ARROW = 'application/vnd.apache.arrow.stream'
+
+    def setUp(self):
+        caches[response_cache.CACHE_ALIAS].clear()
+        today = date.today()
+        rng = np.random.default_rng(0)
+        prices = 100 + rng.normal(0, 1, 120).cumsum()
+        StockData.objects.bulk_create(
+            StockData(symbol='ARROW', date=today - timedelta(days=i), open=price, high=price + 1,
+                      low=price - 1, close=price + 0.25, volume=1000 + i)
+            for i, price in enumerate(prices)
+        )
+        freshness.mark_fresh('ARROW', today)
+        self.addCleanup(freshness.invalidate, 'ARROW')
+        self.client = Client(SERVER_NAME='localhost')
+
+    def get_both(self, url, params):
+        response = self.client.get(url, params)
+        arrow = self.client.get(url, params, HTTP_ACCEPT=self.ARROW)
+        self.assertEqual(arrow['Content-Type'], self.ARROW)
+        return response.json(), read_arrow_table(arrow)
+
+    def test_stock_data_matches_json(self):
+        for url in ('/api/get_stock_data/', '/api/async/get_stock_data/'):
+            with self.subTest(url=url):
+                data, table = self.get_both(url, { 'symbol': 'ARROW', 'limit': 50 })
+                
+                self.assertEqual(table.schema, arrow_ipc.STOCK_DATA_SCHEMA)
+                self.assertEqual(isoformat_dates(table.to_pylist()), data)
+
+    def test_prediction_sections_match_json(self):
+        params = { 'symbol': 'ARROW', 'num_days': 10, 'model_type': 'Linear Regression' }
+        data, table = self.get_both('/api/predict_future_prices/linear_regression/', params)
+        
+        self.assertEqual(table.schema, arrow_ipc.PREDICTION_SECTIONS_SCHEMA)
+        sections = {}
+        for row in isoformat_dates(table.to_pylist()):
+            sections.setdefault(row.pop('section'), []).append(row)
+        self.assertEqual(sections.keys(), data.keys())
+        for section, rows in data.items():
+            with self.subTest(section=section):
+                self.assertEqual([{ field: row[field] for field in json_row } for row, json_row in zip(sections[section], rows)], rows)
+
+    def test_backtest_log_and_metrics_match_json(self):
+        params = { 'symbol': 'ARROW', 'initial_investment': 1000, 'buy_day_range': 5, 'sell_day_range': 20 }
+        data, table = self.get_both('/api/backtest_moving_average/', params)
+        
+        self.assertEqual(table.schema.remove_metadata(), arrow_ipc.BACKTEST_LOG_SCHEMA)
+        self.assertEqual(table.schema.metadata[b'symbol'].decode(), data['symbol'])
+        self.assertEqual(json.loads(table.schema.metadata[b'metrics']), data['metrics'])
+        log = table.to_pydict()
+        log['date'] = [stock_date.isoformat() for stock_date in log['date']]
+        self.assertEqual(log, data['log'])
+
+
+class AsyncBacktestTests(SimpleTestCase):
+    def setUp(self):
+        caches[response_cache.CACHE_ALIAS].clear()
+        freshness.mark_fresh('TEST', date.today())
+        self.addCleanup(freshness.invalidate)
+
+    def test_concurrent_backtests_run_in_parallel(self):
+        # Each simulation waits for the other one, which only returns if they run at the same time
+        barrier = threading.Barrier(2, timeout=5)
+        
+        def simulate(symbol, initial_investment, buy_day_range, sell_day_range, include_log):
+            barrier.wait()
+            return { 'symbol': symbol, 'metrics': { 'buy_day_range': buy_day_range } }
+        
+        async def backtest_both():
+            factory = RequestFactory()
+            requests = [
+                factory.get('/', { 'symbol': 'TEST', 'initial_investment': 1000, 'buy_day_range': buy_day_range,
+                                   'sell_day_range': 20, 'detail': 'summary' })
+                for buy_day_range in (5, 10)
+            ]
+            return await asyncio.gather(*(views.abacktest_moving_average(request) for request in requests))
+        
+        with mock.patch.object(views.moving_average, 'simulate_moving_average_strategy', side_effect=simulate):
+            responses = asyncio.run(backtest_both())
+        
+        self.assertEqual([json.loads(response.content)['metrics']['buy_day_range'] for response in responses], [5, 10])
+
+
+class BatchBacktestTests(TestCase):
+    def setUp(self):
+        today = date.today()
+        for seed, symbol in enumerate(['AAA', 'BBB']):
+            prices = 100 + np.random.default_rng(seed).normal(0, 1, 200).cumsum()
+            StockData.objects.bulk_create(
+                StockData(symbol=symbol, date=today - timedelta(days=i), open=price, high=price + 1,
+                          low=price - 1, close=price + 0.25, volume=1000)
+                for i, price in enumerate(prices)
+            )
+            freshness.mark_fresh(symbol, today)
+        self.addCleanup(freshness.invalidate)
+        price_cache.invalidate()
+        self.addCleanup(price_cache.invalidate)
+        self.client = Client(SERVER_NAME='localhost')
+
+    def test_streams_one_result_per_symbol(self):
+        params = { 'initial_investment': 1000, 'buy_day_range': 5, 'sell_day_range': 20 }
+        with mock.patch.object(stock_data_query.alpha_vantage_api, 'get_time_series_daily',
+                               side_effect=Exception('Invalid API call.')):
+            response = self.client.get('/api/backtest_moving_average/batch/', { 'symbols': 'aaa, MISSING,bbb,AAA', **params })
+            results = { result['symbol']: result for result in map(json.loads, b''.join(response.streaming_content).splitlines()) }
+        
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(sorted(results), ['AAA', 'BBB', 'MISSING'])
+        self.assertIn('Invalid API call.', results['MISSING']['Error Message'])
+        for symbol in ('AAA', 'BBB'):
+            with self.subTest(symbol=symbol):
+                single = self.client.get('/api/backtest_moving_average/', { 'symbol': symbol, 'detail': 'summary', **params }).json()
+                self.assertEqual(results[symbol]['metrics'], single['metrics'])
+                self.assertNotIn('log', results[symbol])
+                self.assertIn('simulate_seconds', results[symbol]['timings'])
+
+    def test_refreshes_symbols_concurrently(self):
+        # Each refresh waits for the other one, which only returns if they run at the same time
+        barrier = threading.Barrier(2, timeout=5)
+        with mock.patch.object(stock_data_query, 'refresh_data', side_effect=lambda symbol, priority: barrier.wait()):
+            results = list(batch_backtest.stream_moving_average_batch(['AAA', 'BBB'], 1000, 5, 20))
+        
+        self.assertEqual(sorted(result['symbol'] for result in results), ['AAA', 'BBB'])
+        for result in results:
+            self.assertIn('metrics', result)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Partitioning requires Postgres')
+class StockDataPartitionTests(TestCase):
+    def setUp(self):
+        # Partitions created by a test are rolled back with it
+        partitions.reset()
+        self.addCleanup(partitions.reset)
+
+    def test_date_range_query_prunes_partitions(self):
+        with transaction.atomic():
+            partitions.ensure_partitions({2021, 2022, 2023})
+        
+        queryset = StockData.objects.filter(symbol='TEST', date__range=(date(2022, 3, 1), date(2022, 9, 30)))
+        plan = json.loads(queryset.explain(format='json'))
+        
+        self.assertEqual(plan_relations(plan), { partitions.partition_name(2022) })
+
+    def test_new_partition_takes_rows_from_default_partition(self):
+        StockData.objects.create(symbol='TEST', date=date(2041, 5, 1), open=1, high=1, low=1, close=1, volume=1)
+        
+        with transaction.atomic():
+            partitions.ensure_partitions({2041})
+        
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT symbol FROM {partitions.partition_name(2041)}')
+            self.assertEqual(cursor.fetchall(), [('TEST',)])
+            cursor.execute(f'SELECT COUNT(*) FROM {partitions.DEFAULT_PARTITION}')
+            self.assertEqual(cursor.fetchone(), (0,))
+
+
+def plan_indexes(plan):
+    if isinstance(plan, list):
+        return set().union(*map(plan_indexes, plan))
+    indexes = { plan['Index Name'] } if 'Index Name' in plan else set()
+    for child in (plan.get('Plan'), *plan.get('Plans', ())):
+        if child is not None:
+            indexes |= plan_indexes(child)
+    return indexes
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Index plans require Postgres')
+class UniqueIndexTests(TestCase):
+    def index_family(self, index):
+        # The partitions of a partitioned table each have their own copy of its indexes
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT inhrelid::regclass::text FROM pg_inherits WHERE inhparent = %s::regclass', [index])
+            return { index, *(name for (name,) in cursor.fetchall()) }
+
+    def test_range_queries_use_the_unique_indexes(self):
+        # The test tables are nearly empty, a sequential scan would win on them
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        
+        queries = {
+            'stockdata_symbol_date_uniq': StockData.objects.filter(
+                symbol='TEST', date__range=(date(2022, 3, 1), date(2022, 9, 30))
+            ).values_list('date', 'open', 'close'),
+            'predictiondata_symbol_model_type_date_uniq': PredictionData.objects.filter(
+                symbol='TEST', model_type='Linear Regression', date__range=(date(2022, 3, 1), date(2022, 9, 30))
+            ).values_list('date', 'close')
+        }
+        for index, queryset in queries.items():
+            with self.subTest(index=index):
+                plan = json.loads(queryset.explain(format='json'))
+                self.assertTrue(plan_indexes(plan) & self.index_family(index), plan_indexes(plan))
+
+    def test_duplicate_keys_are_rejected(self):
+        for model, key in ((StockData, {}), (PredictionData, { 'model_type': 'Linear Regression' })):
+            with self.subTest(model=model.__name__):
+                row = { 'symbol': 'TEST', 'date': date(2024, 5, 15), 'open': 1, 'high': 2, 'low': 0.5, 'close': 1.5, 'volume': 100, **key }
+                model.objects.create(**row)
+                
+                with self.assertRaises(IntegrityError), transaction.atomic():
+                    model.objects.create(**row)
+
+
+class InMemoryBackend(StockDataBackend):
+    """A source backend holding the full history of every symbol, counting its reads."""
+
+    def __init__(self, histories):
+        self.histories = histories
+        self.reads = 0
+
+    def read_columns(self, symbol, since=None, until=None, limit=None, date_desc=False):
+        self.reads += 1
+        return self.histories.get(symbol, { field: [] for field in backends.FIELDS })
+
+    def read_series(self, symbols):
+        empty = { field: [] for field in backends.FIELDS }
+        return {
+            symbol: {
+                'dates': [stock_date.toordinal() for stock_date in self.histories.get(symbol, empty)['date']],
+                **{ field: self.histories.get(symbol, empty)[field] for field in backends.SERIES_FIELDS }
+            }
+            for symbol in symbols
+        }
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    databases = {'default'}
+
+    def load_settings(self, pool_mode):
+        with mock.patch.dict(os.environ, { 'POSTGRES_POOL_MODE': pool_mode, 'POSTGRES_POOL_MAX_SIZE': '4' }):
+            return runpy.run_path(importlib.import_module(settings.SETTINGS_MODULE).__file__)
+
+    def test_pool_mode_settings(self):
+        self.assertNotIn('OPTIONS', self.load_settings('none')['DATABASES']['default'])
+        
+        pool_options = self.load_settings('pool')['DATABASES']['default']['OPTIONS']['pool']
+        self.assertEqual((pool_options['min_size'], pool_options['max_size']), (2, 4))
+        
+        with self.assertRaises(ImproperlyConfigured):
+            self.load_settings('pgbouncer')
+
+    def test_stats_without_a_pool(self):
+        with self.settings(POSTGRES_POOL_MODE='none'):
+            stats = connection_pool.stats()
+        
+        self.assertEqual(stats, { 'mode': 'none', 'conn_max_age': 0, 'health_checks': False })
+
+    @skipUnless(connection.vendor == 'postgresql', 'Connection pools require psycopg 3 and Postgres')
+    def test_stats_of_a_pool(self):
+        pooled = type(connections['default'])({
+            **connection.settings_dict,
+            'OPTIONS': { **connection.settings_dict['OPTIONS'], 'pool': { 'min_size': 2, 'max_size': 2 } }
+        }, alias='pooled')
+        self.addCleanup(pooled.close_pool)
+        # A fixed size pool doesn't open connections in the background once it is full
+        pooled.pool.open(wait=True)
+        
+        with self.settings(POSTGRES_POOL_MODE='pool'), mock.patch.object(connection_pool, 'connections', { 'pooled': pooled }):
+            pooled.connect()
+            in_use = connection_pool.stats('pooled')
+            pooled.close()
+            released = connection_pool.stats('pooled')
+        
+        self.assertEqual((in_use['mode'], in_use['max_size'], in_use['in_use'], in_use['utilization']), ('pool', 2, 1, 0.5))
+        self.assertEqual(released['in_use'], 0)
+        self.assertGreaterEqual(released['checkouts'], 1)
+
+
+class ParquetBackendTests(SimpleTestCase):
+    def setUp(self):
+        num_days = 1000
+        self.history = {
+            'id': list(range(1, num_days + 1)),
+            'symbol': ['TEST'] * num_days,
+            'date': [date(2020, 1, 1) + timedelta(days=i) for i in range(num_days)],
+            'open': [float(i) for i in range(num_days)],
+            'high': [i + 1.0 for i in range(num_days)],
+            'low': [i - 1.0 for i in range(num_days)],
+            'close': [i + 0.5 for i in range(num_days)],
+            'volume': list(range(num_days))
+        }
+        self.source = InMemoryBackend({ 'TEST': self.history })
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.backend = ParquetBackend(directory.name, source=self.source)
+
+    def expected(self, start, end, step=1):
+        return { field: values[start:end][::step] for field, values in self.history.items() }
+
+    def test_reads_date_ranges(self):
+        cases = [
+            ({}, self.expected(0, 1000)),
+            ({ 'since': date(2021, 3, 1), 'until': date(2021, 3, 11) }, self.expected(425, 435)),
+            ({ 'since': date(2021, 3, 1), 'limit': 5 }, self.expected(425, 430)),
+            ({ 'until': date(2021, 3, 1), 'limit': 5, 'date_desc': True }, self.expected(420, 425, -1)),
+            ({ 'since': date(2030, 1, 1) }, self.expected(0, 0))
+        ]
+        for kwargs, expected in cases:
+            with self.subTest(**kwargs):
+                self.assertEqual(self.backend.read_columns('TEST', **kwargs), expected)
+
+    def test_copies_missing_symbols_from_source_once(self):
+        self.backend.read_columns('TEST')
+        series = self.backend.read_series(['TEST'])['TEST']
+        
+        self.assertEqual(self.source.reads, 1)
+        self.assertEqual(series['dates'].tolist(), [stock_date.toordinal() for stock_date in self.history['date']])
+        self.assertEqual(series['close'].tolist(), self.history['close'])
+        self.assertEqual(self.backend.read_columns('MISSING')['date'], [])
+
+    def test_invalidating_every_symbol_rebuilds_them_from_source(self):
+        self.backend.read_columns('TEST')
+        self.backend.invalidate()
+        
+        self.assertFalse(self.backend.path('TEST').exists())
+        self.assertEqual(self.backend.read_columns('TEST'), self.expected(0, 1000))
+        self.assertEqual(self.source.reads, 2)
+
+    def test_appends_new_rows_without_reading_the_source_again(self):
+        self.backend.read_columns('TEST')
+        new_rows = { field: values[-2:] for field, values in self.expected(0, 1000).items() }
+        new_rows['date'] = [date(2023, 1, 1), date(2023, 1, 2)]
+        self.backend.append('TEST', new_rows)
+        # Rows already in the file are skipped
+        self.backend.append('TEST', new_rows)
+        
+        self.assertEqual(self.source.reads, 1)
+        self.assertEqual(self.backend.read_columns('TEST', since=date(2022, 9, 1))['date'], [
+            *self.history['date'][-26:], date(2023, 1, 1), date(2023, 1, 2)
+        ])
+
+    def test_drops_symbols_with_rows_older_than_their_last_one(self):
+        self.backend.read_columns('TEST')
+        backfill = { field: values[:1] for field, values in self.history.items() }
+        backfill['date'] = [date(2019, 12, 31)]
+        self.backend.append('TEST', backfill)
+        
+        self.assertFalse(self.backend.path('TEST').exists())
+
+    def test_copies_from_source_do_not_replace_newer_files(self):
+        newer = ParquetBackend(self.backend.directory, source=InMemoryBackend({
+            'TEST': { field: values[:10] for field, values in self.history.items() }
+        }))
+
+        class RacingSource(InMemoryBackend):
+            # Another process copies the symbol while this one reads its source
+            def read_columns(self, symbol, **kwargs):
+                newer.read_columns(symbol)
+                return super().read_columns(symbol, **kwargs)
+
+        backend = ParquetBackend(self.backend.directory, source=RacingSource({ 'TEST': self.history }))
+        
+        self.assertEqual(len(backend.read_columns('TEST')['date']), 10)
+
+
+class ResponseCacheTests(SimpleTestCase):
+    def setUp(self):
+        caches[response_cache.CACHE_ALIAS].clear()
+        self.calls = 0
+        
+        @response_cache.cached('test_view', refresh=lambda symbol: None)
+        def view(request):
+            self.calls += 1
+            return JsonResponse({ 'symbol': request.GET['symbol'].upper(), 'calls': self.calls })
+        
+        self.view = view
+        self.factory = RequestFactory()
+
+    def test_equivalent_requests_share_a_response(self):
+        first = self.view(self.factory.get('/', { 'symbol': 'test', 'limit': 5 }))
+        second = self.view(self.factory.get('/', { 'limit': 5, 'symbol': 'TEST', 'since': '' }))
+        arrow = self.view(self.factory.get('/', { 'symbol': 'TEST', 'limit': 5 }, HTTP_ACCEPT='application/vnd.apache.arrow.stream'))
+        
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first['ETag'], second['ETag'])
+        self.assertNotEqual(first['ETag'], arrow['ETag'])
+
+    def test_revalidates_until_the_symbol_is_invalidated(self):
+        etag = self.view(self.factory.get('/', { 'symbol': 'TEST' }))['ETag']
+        not_modified = self.view(self.factory.get('/', { 'symbol': 'TEST' }, HTTP_IF_NONE_MATCH=etag))
+        
+        response_cache.invalidate('TEST')
+        modified = self.view(self.factory.get('/', { 'symbol': 'TEST' }, HTTP_IF_NONE_MATCH=etag))
+        
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(modified.status_code, 200)
+        self.assertNotEqual(modified['ETag'], etag)
+        self.assertEqual(json.loads(modified.content)['calls'], 2)
+
+
+
+class PredictionResponseCacheTests(TestCase):
+    URL = '/api/predict_future_prices/linear_regression/'
+
+    def setUp(self):
+        caches[response_cache.CACHE_ALIAS].clear()
+        last_date = date.today()
+        StockData.objects.bulk_create(
+            StockData(symbol='PREDTEST', date=last_date - timedelta(days=i), open=100 + i, high=101 + i,
+                      low=99 + i, close=100.5 + i, volume=1000 + i)
+            for i in range(60)
+        )
+        freshness.mark_fresh('PREDTEST', last_date)
+        self.addCleanup(freshness.invalidate, 'PREDTEST')
+        self.client = Client(SERVER_NAME='localhost')
+
+    def predict(self, num_days, **headers):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.get(self.URL, { 'symbol': 'PREDTEST', 'num_days': num_days, 'model_type': 'Linear Regression' }, **headers)
+
+    def test_new_predictions_retire_cached_responses(self):
+        # The first request stores its predictions, which retires its own response
+        self.predict(5)
+        first = self.predict(5)
+        self.assertEqual(self.predict(5, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+        
+        self.predict(30)
+        third = self.predict(5, HTTP_IF_NONE_MATCH=first['ETag'])
+        
+        self.assertEqual(third.status_code, 200)
+        self.assertEqual(len(third.json()['requested_predicted_data']), 5)
+        self.assertEqual(len(third.json()['all_predicted_data']), 30)
+
+
+
+class SavePredictionsTests(TestCase):
+    def test_keeps_predictions_stored_concurrently(self):
+        most_recent_date = date(2024, 5, 15)
+        # Stored by another request after this one looked up the stored predictions
+        PredictionData.objects.create(
+            symbol='TEST', model_type='Linear Regression', date=most_recent_date + timedelta(days=2),
+            open=-1, high=-1, low=-1, close=-1, volume=-1
+        )
+        predictions = { field: np.arange(1, 4) * 10 for field in ('open', 'high', 'low', 'close', 'volume') }
+        
+        saved = prediction_data_query.save_predictions(
+            'TEST', 'Linear Regression', 3, most_recent_date, predictions, stored_predictions=[]
+        )
+        
+        self.assertEqual([prediction['open'] for prediction in saved], [10, -1, 30])
+        self.assertTrue(all(prediction['id'] is not None for prediction in saved))
+        self.assertEqual(
+            list(PredictionData.objects.filter(symbol='TEST').order_by('date').values_list('open', flat=True)),
+            [10, -1, 30]
+        )
+
+
+class BatchedRegressionTests(SimpleTestCase):
+    def series(self, num_days, seed):
+        rng = np.random.default_rng(seed)
+        # Dates with gaps like trading days, at the magnitude of real ordinals
+        dates = date(2024, 1, 2).toordinal() + np.sort(rng.choice(2 * num_days, num_days, replace=False))
+        trend = np.column_stack([rng.normal(0, 1), rng.normal(0, 1), rng.normal(0, 1), rng.normal(0, 1), rng.normal(0, 100)])
+        targets = 100 + (dates - dates[0])[:, None] * trend + rng.normal(0, 2, (num_days, 5))
+        targets[:, 4] += 10000
+        return dates, targets
+
+    def test_fit_matches_a_separate_regression_per_target(self):
+        dates, targets = self.series(500, seed=0)
+        future_dates = dates[-1] + np.arange(1, 31)
+        
+        predicted = batched_regression.predict(batched_regression.fit(dates, targets), future_dates)
+        
+        for i in range(targets.shape[1]):
+            with self.subTest(target=i):
+                slope, intercept = np.polyfit(dates, targets[:, i], 1)
+                np.testing.assert_allclose(predicted[:, i], slope * future_dates + intercept, rtol=1e-9)
+
+    def test_fit_many_matches_fit_per_symbol(self):
+        all_series = [self.series(num_days, seed) for seed, num_days in enumerate([500, 1, 2, 37])]
+        future_dates = np.array([dates[-1] + np.arange(1, 11) for dates, _ in all_series])
+        
+        coefficients = batched_regression.fit_many(*zip(*all_series))
+        predicted = batched_regression.predict(coefficients, future_dates)
+        
+        self.assertEqual(predicted.shape, (4, 10, 5))
+        for i, (dates, targets) in enumerate(all_series):
+            with self.subTest(num_days=len(dates)):
+                expected = batched_regression.predict(batched_regression.fit(dates, targets), future_dates[i])
+                np.testing.assert_allclose(predicted[i], expected, rtol=1e-9)
+        # A single day has no trend
+        np.testing.assert_array_equal(predicted[1], np.repeat(all_series[1][1], 10, axis=0))
+
+
+def market_time(day, hour, minute=0):
+    return datetime(2024, 5, day, hour, minute, tzinfo=freshness.MARKET_TIMEZONE)
+
+
+@override_settings(STOCK_DATA_FRESHNESS_GRACE_MINUTES=30, STOCK_DATA_FRESHNESS_RETRY_MINUTES=15)
+class FreshnessTests(SimpleTestCase):
+    # May 15th 2024 is a Wednesday
+    def tearDown(self):
+        freshness.invalidate()
+
+    def test_fresh_until_the_bar_after_the_last_stored_one_is_due(self):
+        freshness.mark_fresh('TEST', date(2024, 5, 15), now=market_time(15, 17))
+        
+        self.assertTrue(freshness.is_fresh('TEST', now=market_time(16, 16, 29)))
+        self.assertFalse(freshness.is_fresh('TEST', now=market_time(16, 16, 30)))
+
+    def test_evening_refresh_missing_todays_bar_is_retried(self):
+        freshness.mark_fresh('TEST', date(2024, 5, 14), now=market_time(15, 17))
+        
+        self.assertTrue(freshness.is_fresh('TEST', now=market_time(15, 17, 14)))
+        self.assertFalse(freshness.is_fresh('TEST', now=market_time(15, 17, 15)))
+
+    def test_refresh_inside_the_grace_window(self):
+        freshness.mark_fresh('TEST', date(2024, 5, 14), now=market_time(15, 16, 5))
+        
+        self.assertTrue(freshness.is_fresh('TEST', now=market_time(15, 16, 29)))
+        self.assertFalse(freshness.is_fresh('TEST', now=market_time(15, 16, 30)))
+
+    def test_friday_bar_stays_fresh_over_the_weekend(self):
+        freshness.mark_fresh('TEST', date(2024, 5, 17), now=market_time(17, 17))
+        self.assertTrue(freshness.is_fresh('TEST', now=market_time(20, 16, 29)))
+        self.assertFalse(freshness.is_fresh('TEST', now=market_time(20, 16, 30)))
+        
+        freshness.mark_fresh('TEST', date(2024, 5, 16), now=market_time(17, 17))
+        self.assertFalse(freshness.is_fresh('TEST', now=market_time(18, 9)))
+
+
+class RefreshDataTests(TransactionTestCase):
+    def setUp(self):
+        freshness.invalidate()
+        self.addCleanup(freshness.invalidate)
+        self.fetches = []
+        self.fetching = threading.Event()
+        self.release = threading.Event()
+        
+        def get_time_series_daily(symbol, output_size, priority):
+            self.fetches.append(output_size)
+            self.fetching.set()
+            self.release.wait(timeout=5)
+            # Older than yesterday, so only the freshness check stops the waiting refreshes
+            return time_series_response(symbol, [date.today() - timedelta(days=5)])
+        
+        async def aget_time_series_daily(symbol, output_size, priority):
+            return get_time_series_daily(symbol, output_size, priority)
+        
+        for name, fetch in (('get_time_series_daily', get_time_series_daily), ('aget_time_series_daily', aget_time_series_daily)):
+            patcher = mock.patch.object(stock_data_query.alpha_vantage_api, name, side_effect=fetch)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def in_thread(self, target):
+        def run():
+            try:
+                target()
+            finally:
+                connection.close()
+        thread = threading.Thread(target=run)
+        thread.start()
+        return thread
+
+    def test_waiting_refreshes_reuse_the_one_in_flight(self):
+        async def arefresh_many():
+            await asyncio.gather(*(stock_data_query.arefresh_data('TEST') for _ in range(3)))
+        
+        threads = [self.in_thread(lambda: stock_data_query.refresh_data('TEST'))]
+        self.assertTrue(self.fetching.wait(timeout=5))
+        threads += [self.in_thread(lambda: stock_data_query.refresh_data('TEST')) for _ in range(3)]
+        threads.append(self.in_thread(lambda: asyncio.run(arefresh_many())))
+        # Let the other refreshes queue up behind the fetch
+        time.sleep(0.1)
+        self.release.set()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(self.fetches, ['full'])
+        self.assertEqual(StockData.objects.filter(symbol='TEST').count(), 1)
+        self.assertTrue(freshness.is_fresh('TEST'))
+
+
+@override_settings(REPORT_CACHE_MAX_ENTRIES=1)
+class ReportJobTests(SimpleTestCase):
+    def setUp(self):
+        patchers = [
+            mock.patch.object(report_jobs, '_jobs', OrderedDict()),
+            mock.patch.object(report_jobs, '_reports', OrderedDict()),
+            mock.patch.object(report_jobs, '_jobs_by_key', {}),
+            mock.patch.object(report_jobs.stock_data_query, 'refresh_data'),
+            mock.patch.object(report_jobs.linear_regression, 'get_prediction_sections', return_value={
+                'requested_predicted_data': [], 'all_predicted_data': [], 'all_actual_data': []
+            }),
+            mock.patch.object(report_jobs.linear_regression, 'generate_report',
+                              side_effect=lambda *sections: BytesIO(b'%PDF')),
+            mock.patch.object(report_jobs.connection, 'close')
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        caches[response_cache.CACHE_ALIAS].clear()
+
+    def test_finished_job_is_reused_while_its_report_is_cached(self):
+        job = report_jobs.submit('TEST', 'Linear Regression', 5)
+        report_jobs.wait(job, timeout=5)
+        
+        self.assertIs(report_jobs.submit('TEST', 'Linear Regression', 5), job)
+
+    def test_evicted_report_is_rendered_again(self):
+        evicted = report_jobs.submit('TEST', 'Linear Regression', 5)
+        report_jobs.wait(evicted, timeout=5)
+        report_jobs.wait(report_jobs.submit('TEST', 'Linear Regression', 10), timeout=5)
+        self.assertIsNone(report_jobs.get_report(evicted.id))
+        
+        job = report_jobs.submit('TEST', 'Linear Regression', 5)
+        
+        self.assertIsNot(job, evicted)
+        self.assertEqual(report_jobs.wait(job, timeout=5), b'%PDF')
+
+    def test_new_data_renders_the_report_again(self):
+        for kind in (response_cache.STOCK_DATA, response_cache.PREDICTIONS):
+            with self.subTest(kind=kind):
+                job = report_jobs.submit('TEST', 'Linear Regression', 5)
+                report_jobs.wait(job, timeout=5)
+                
+                response_cache.invalidate('TEST', kind)
+                
+                self.assertIsNot(report_jobs.submit('TEST', 'Linear Regression', 5), job)
+
+
+def stock_history(symbol, first_date, num_days, seed=0):
+    rng = np.random.default_rng(seed)
+    open = (100 + rng.normal(0, 1, num_days).cumsum()).tolist()
+    close = (100 + rng.normal(0, 1, num_days).cumsum()).tolist()
+    return {
+        'id': list(range(1, num_days + 1)),
+        'symbol': [symbol] * num_days,
+        'date': [first_date + timedelta(days=i) for i in range(num_days)],
+        'open': open,
+        'high': [max(o, c) + 1 for o, c in zip(open, close)],
+        'low': [min(o, c) - 1 for o, c in zip(open, close)],
+        'close': close,
+        'volume': rng.integers(1000, 2000, num_days).tolist()
+    }
+
+
+def append_history(history, num_days, seed=1):
+    """Extends a history from `stock_history` by `num_days` days and returns the new rows."""
+    new_rows = stock_history(history['symbol'][0], history['date'][-1] + timedelta(days=1), num_days, seed)
+    for field, values in new_rows.items():
+        history[field].extend(values)
+    return new_rows
+
+
+class ModelRegistryTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.enterContext(override_settings(MODEL_REGISTRY_DIR=directory.name))
+        model_registry.invalidate()
+        self.addCleanup(model_registry.invalidate)
+
+    def series(self, symbol, first_date, num_days):
+        history = stock_history(symbol, first_date, num_days)
+        return price_cache.PriceSeries(
+            symbol, [stock_date.toordinal() for stock_date in history['date']],
+            *(history[field] for field in backends.SERIES_FIELDS)
+        )
+
+    def test_symbols_with_punctuation_keep_their_own_models(self):
+        symbols = ['BRK.B', 'BRK_B', 'BRK-B', 'BRK', 'BRK@B']
+        for i, symbol in enumerate(symbols):
+            model_registry.put(symbol, 'linear', self.series(symbol, date(2024, 1, 1), 30), np.full(3, i))
+        model_registry.invalidate()
+        
+        for i, symbol in enumerate(symbols):
+            with self.subTest(symbol=symbol):
+                coefficients = model_registry.get_or_fit(
+                    symbol, 'linear', self.series(symbol, date(2024, 1, 1), 30), fit=self.fail
+                )
+                self.assertEqual(coefficients.tolist(), [i] * 3)
+
+    def test_newer_models_replace_only_the_files_of_their_symbol(self):
+        model_registry.put('BRK', 'linear', self.series('BRK', date(2024, 1, 1), 30), np.zeros(3))
+        model_registry.put('BRK.B', 'linear', self.series('BRK.B', date(2024, 1, 1), 30), np.zeros(3))
+        model_registry.put('BRK', 'linear', self.series('BRK', date(2024, 1, 1), 31), np.ones(3))
+        
+        self.assertEqual(sorted(path.name for path in Path(settings.MODEL_REGISTRY_DIR).iterdir()), [
+            'BRK.B@linear@2024-01-30.npz', 'BRK@linear@2024-01-31.npz'
+        ])
+
+    def test_model_fitted_on_older_data_saved_last_is_not_kept(self):
+        model_registry.put('BRK', 'linear', self.series('BRK', date(2024, 1, 1), 31), np.ones(3))
+        model_registry.put('BRK', 'linear', self.series('BRK', date(2024, 1, 1), 30), np.zeros(3))
+        
+        self.assertEqual([path.name for path in Path(settings.MODEL_REGISTRY_DIR).iterdir()], ['BRK@linear@2024-01-31.npz'])
+
+    @override_settings(MODEL_REGISTRY_MAX_MODELS=2)
+    def test_least_recently_used_models_are_evicted(self):
+        series = { symbol: self.series(symbol, date(2024, 1, 1), 30) for symbol in ('AAA', 'BBB', 'CCC') }
+        evictions = model_registry.stats()['evictions']
+        model_registry.put('AAA', 'linear', series['AAA'], np.zeros(3))
+        model_registry.put('BBB', 'linear', series['BBB'], np.zeros(3))
+        model_registry.get_or_fit('AAA', 'linear', series['AAA'], fit=self.fail)
+        model_registry.put('CCC', 'linear', series['CCC'], np.zeros(3))
+        
+        stats = model_registry.stats()
+        self.assertEqual((stats['size'], stats['evictions'] - evictions), (2, 1))
+        
+        disk_reuses = stats['disk_reuses']
+        model_registry.get_or_fit('BBB', 'linear', series['BBB'], fit=self.fail)
+        self.assertEqual(model_registry.stats()['disk_reuses'], disk_reuses + 1)
+
+
+class PriceCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.history = stock_history('TEST', date(2024, 1, 1), 300)
+        self.backend = InMemoryBackend({ 'TEST': self.history })
+        patcher = mock.patch.object(price_cache.registry, 'get_backend', return_value=self.backend)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        price_cache.invalidate()
+        self.addCleanup(price_cache.invalidate)
+
+    def test_reloads_rows_stored_by_another_process(self):
+        self.assertEqual(len(price_cache.get('TEST')), 300)
+        
+        with mock.patch.object(self.backend, 'read_series', wraps=self.backend.read_series) as read_series:
+            price_cache.get('TEST')
+            # Stored without patching this process' cache
+            append_history(self.history, 2)
+            response_cache.invalidate('TEST')
+            series = price_cache.get('TEST')
+        
+        self.assertEqual(read_series.call_count, 1)
+        self.assertEqual(len(series), 302)
+        self.assertEqual(series.close.tolist(), self.history['close'])
+
+    def test_patches_cached_series_with_stored_rows(self):
+        price_cache.get('TEST')
+        new_rows = append_history(self.history, 3)
+        # Rows already cached are merged, not repeated
+        price_cache.patch('TEST', { field: self.history[field][-5:] for field in ('date', *backends.SERIES_FIELDS) },
+                          response_cache.invalidate('TEST'))
+        
+        with mock.patch.object(self.backend, 'read_series', wraps=self.backend.read_series) as read_series:
+            series = price_cache.get('TEST')
+        
+        read_series.assert_not_called()
+        self.assertEqual(series.date_objects(), self.history['date'])
+        self.assertEqual(series.close.tolist(), self.history['close'])
+        self.assertEqual(series.volume.tolist(), self.history['volume'])
+        self.assertEqual(series.last_date, new_rows['date'][-1])
+
+    def test_patch_after_rows_stored_by_another_process_reloads(self):
+        price_cache.get('TEST')
+        append_history(self.history, 1, seed=1)
+        response_cache.invalidate('TEST')
+        new_rows = append_history(self.history, 1, seed=2)
+        price_cache.patch('TEST', new_rows, response_cache.invalidate('TEST'))
+        
+        series = price_cache.get('TEST')
+        
+        self.assertEqual(series.close.tolist(), self.history['close'])
+
+    def test_series_loaded_while_rows_are_stored_is_not_cached(self):
+        read_series = self.backend.read_series
+        
+        def read_series_during_ingestion(symbols):
+            loaded = { symbol: { field: list(values) for field, values in series.items() }
+                       for symbol, series in read_series(symbols).items() }
+            # Committed after the read, the loaded series misses the new rows
+            price_cache.patch('TEST', append_history(self.history, 2))
+            return loaded
+        
+        with mock.patch.object(self.backend, 'read_series', side_effect=read_series_during_ingestion):
+            self.assertEqual(len(price_cache.get('TEST')), 300)
+        before = price_cache.stats()
+        
+        self.assertEqual(len(price_cache.get('TEST')), 302)
+        # Reloaded as a plain miss, the outdated series never reached the cache
+        self.assertEqual(price_cache.stats()['misses'], before['misses'] + 1)
+        self.assertEqual(price_cache.stats()['stale'], before['stale'])
+
+
+@override_settings(INDICATOR_STORE_EAGER_WINDOWS=(5, 20))
+class IndicatorStoreTests(SimpleTestCase):
+    def setUp(self):
+        self.history = stock_history('TEST', date(2024, 1, 1), 300)
+        patcher = mock.patch.object(price_cache.registry, 'get_backend', return_value=InMemoryBackend({ 'TEST': self.history }))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        for cache in (price_cache, indicator_store):
+            cache.invalidate()
+            self.addCleanup(cache.invalidate)
+
+    def store(self, num_days, seed):
+        new_rows = append_history(self.history, num_days, seed)
+        version = response_cache.invalidate('TEST')
+        price_cache.patch('TEST', new_rows, version)
+        indicator_store.append('TEST', new_rows, version)
+
+    def assertMatchesPandas(self, series, windows):
+        price = (pd.Series(self.history['open']) + pd.Series(self.history['close'])) / 2
+        self.assertEqual(series.date_objects(), self.history['date'])
+        for window in windows:
+            np.testing.assert_allclose(series.moving_averages[window], price.rolling(window=window).mean(), rtol=1e-12)
+
+    def test_appended_bars_match_rolling_means(self):
+        indicator_store.get('TEST', windows=(50,))
+        before = indicator_store.stats()
+        # Enough bars to grow the arrays twice
+        for seed, num_days in enumerate([1, 7, 400, 1, 600], start=1):
+            self.store(num_days, seed)
+        
+        series = indicator_store.get('TEST', windows=(5, 20, 50))
+        
+        self.assertMatchesPandas(series, (5, 20, 50))
+        self.assertEqual(indicator_store.stats()['misses'], before['misses'])
+        self.assertEqual(indicator_store.stats()['appended_bars'], before['appended_bars'] + 1009)
+
+    def test_rebuilds_bars_stored_by_another_process(self):
+        indicator_store.get('TEST', windows=(5,))
+        with mock.patch.object(response_cache, 'data_versions', wraps=response_cache.data_versions) as data_versions:
+            indicator_store.get('TEST', windows=(5,))
+        # A hit reads the data version once and nothing else
+        self.assertEqual(data_versions.call_count, 1)
+        
+        append_history(self.history, 2)
+        response_cache.invalidate('TEST')
+        before = indicator_store.stats()
+        series = indicator_store.get('TEST', windows=(5, 20))
+        
+        self.assertMatchesPandas(series, (5, 20))
+        self.assertEqual(indicator_store.stats()['stale'], before['stale'] + 1)
+
+    def test_bars_before_the_last_one_rebuild_the_symbol(self):
+        indicator_store.get('TEST')
+        before = indicator_store.stats()
+        last_day = { field: values[-1:] for field, values in self.history.items() }
+        indicator_store.append('TEST', { **last_day, 'close': [last_day['close'][0] + 100] })
+        self.store(3, seed=1)
+        
+        series = indicator_store.get('TEST', windows=(5, 20))
+        
+        self.assertMatchesPandas(series, (5, 20))
+        self.assertEqual(indicator_store.stats()['misses'], before['misses'] + 1)
+        self.assertEqual(indicator_store.stats()['appended_bars'], before['appended_bars'])
+
+
+class SymbolDataContextTests(SimpleTestCase):
+    # Database queries fail in these tests, the stock data must come from the backend
+    def setUp(self):
+        self.history = stock_history('TEST', date(2024, 1, 1), 30)
+        self.backend = InMemoryBackend({ 'TEST': self.history })
+        patcher = mock.patch.object(price_cache.registry, 'get_backend', return_value=self.backend)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        price_cache.invalidate()
+        self.addCleanup(price_cache.invalidate)
+        freshness.mark_fresh('TEST', self.history['date'][-1])
+        self.addCleanup(freshness.invalidate)
+
+    def assertReadFromBackend(self, context):
+        self.assertEqual(context.stock_data, StockDataValuesSerializer(list(zip(*self.history.values()))).data)
+        self.assertIs(context.price_series, price_cache.get('TEST'))
+        self.assertEqual(self.backend.reads, 1)
+
+    def test_reads_stock_data_from_the_backend_and_the_price_cache(self):
+        context = SymbolDataContext('TEST')
+        context.stock_data
+        
+        self.assertReadFromBackend(context)
+
+    def test_aload_reads_the_stock_data_once(self):
+        context = SymbolDataContext('TEST')
+        asyncio.run(context.aload())
+        
+        self.assertReadFromBackend(context)
@@ -6,6 +6,17 @@ urlpatterns = [
     path('hello_world/', views.hello_world),
     path('get_stock_data/', views.get_stock_data),
     path('backtest_moving_average/', views.backtest_moving_average),
+    path('backtest_moving_average/sweep/', views.backtest_moving_average_sweep),
+    path('backtest_moving_average/batch/', views.backtest_moving_average_batch),
     path('predict_future_prices/linear_regression/', views.predict_future_prices),
-    path("generate_prediction_report/", views.generate_prediction_report)
+    path("generate_prediction_report/", views.generate_prediction_report),
+    path('prediction_report/jobs/', views.submit_prediction_report),
+    path('prediction_report/jobs/<str:job_id>/', views.prediction_report_status),
+    path('prediction_report/jobs/<str:job_id>/download/', views.download_prediction_report),
+    path('metrics/', views.metrics),
+    
+    # Async variants of the I/O bound endpoints, for ASGI deployments
+    path('async/get_stock_data/', views.aget_stock_data),
+    path('async/backtest_moving_average/', views.abacktest_moving_average),
+    path('async/predict_future_prices/linear_regression/', views.apredict_future_prices)
 ]
@@ -0,0 +1,112 @@
+from stock_analyzer.views.postgres_api import stock_data_query
+from stock_analyzer.views.external_api import rate_limiter
+from stock_analyzer.views.backtest_strategies import moving_average
+from stock_analyzer.views.backtest_strategies import worker_pool
+from stock_analyzer.views.data_cache import indicator_store
+
+from django.conf import settings
+from django.db import connections
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta, date
+import time
+
+
+def stream_moving_average_batch(symbols, initial_investment, buy_day_range, sell_day_range,
+                                include_log=False, num_days=None):
+    """Simulates the moving average strategy with the same parameters on several stock symbols.
+    The symbols are refreshed concurrently, and each one is simulated on the backtest worker pool
+    as soon as its data is ready. Results are yielded as soon as each symbol finishes, so a slow
+    fetch doesn't hold back the others, and a failing symbol only produces an error result for
+    itself.
+
+    Args:
+        symbols (list[str]): The stock symbols the strategy will be performed on
+        initial_investment (float): The amount of initial cash to start with
+        buy_day_range (int): The window size of your buy moving average
+        sell_day_range (int): The window size of your sell moving average
+        include_log (bool, optional): Include the daily investment log of every symbol. Defaults to False.
+        num_days (int, optional): The number of days ago to start the simulation from. Defaults to STOCK_DATA_RETENTION_DAYS.
+
+    Yields:
+        dict: The result of one symbol, with its metrics block (or 'Error Message') and timings in seconds
+    """
+    num_days = num_days or settings.STOCK_DATA_RETENTION_DAYS
+    today = date.today()
+    start_date = today - timedelta(days=num_days)
+    
+    timings = { symbol: {} for symbol in symbols }
+    
+    # Fetches are rate limited by the scheduler, the threads only keep them from queuing behind each other
+    with ThreadPoolExecutor(max_workers=max(min(len(symbols), settings.ALPHA_VANTAGE_POOL_SIZE), 1)) as refresh_executor:
+        refreshes = { refresh_executor.submit(_refresh_symbol, symbol): symbol for symbol in symbols }
+        simulations = {}
+        
+        while refreshes or simulations:
+            done, _ = wait([*refreshes, *simulations], return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in refreshes:
+                    symbol = refreshes.pop(future)
+                    error, timings[symbol]['refresh_seconds'] = future.result()
+                    if error is None:
+                        error = _submit_symbol(
+                            simulations, symbol, start_date, today, initial_investment, buy_day_range,
+                            sell_day_range, include_log, timings[symbol]
+                        )
+                    if error is not None:
+                        yield { 'symbol': symbol, 'Error Message': error, 'timings': timings[symbol] }
+                    continue
+                
+                symbol = simulations.pop(future)
+                try:
+                    result, simulate_seconds = future.result()
+                    timings[symbol]['simulate_seconds'] = simulate_seconds
+                    yield { 'symbol': symbol, **result, 'timings': timings[symbol] }
+                except Exception as e:
+                    yield { 'symbol': symbol, 'Error Message': e.__str__(), 'timings': timings[symbol] }
+
+
+def _refresh_symbol(symbol):
+    refresh_start = time.perf_counter()
+    try:
+        stock_data_query.refresh_data(symbol=symbol, priority=rate_limiter.BATCH)
+        error = None
+    except Exception as e:
+        error = e.__str__()
+    finally:
+        # Refresh threads aren't request threads, whose connections Django closes
+        connections.close_all()
+    return error, time.perf_counter() - refresh_start
+
+
+def _submit_symbol(simulations, symbol, start_date, end_date, initial_investment, buy_day_range,
+                   sell_day_range, include_log, timings):
+    # Loads the symbol from the indicator store, as the single backtest does, and submits its
+    # simulation. Returns the error message if it can't be simulated.
+    load_start = time.perf_counter()
+    try:
+        indicators = indicator_store.get(symbol, (buy_day_range, sell_day_range)).between(start_date, end_date)
+    except Exception as e:
+        return e.__str__()
+    finally:
+        timings['load_seconds'] = time.perf_counter() - load_start
+    
+    if not len(indicators):
+        return 'No stock data available.'
+    
+    future = worker_pool.get_executor().submit(
+        _simulate_symbol, indicators, initial_investment, buy_day_range, sell_day_range, include_log
+    )
+    simulations[future] = symbol
+    return None
+
+
+def _simulate_symbol(indicators, initial_investment, buy_day_range, sell_day_range, include_log):
+    simulate_start = time.perf_counter()
+    
+    stock_dataframe = moving_average.build_dataframe_from_indicators(indicators, buy_day_range, sell_day_range)
+    result = moving_average.backtest_moving_average(
+        stock_dataframe, initial_investment, buy_day_range, sell_day_range, include_log
+    )
+    
+    return result, time.perf_counter() - simulate_start
@@ -0,0 +1,122 @@
+import numpy as np
+
+
+HOLD = 0
+BUY = 1
+SELL = -1
+
+ACTION_NAMES = np.array(['Sell', 'Hold', 'Buy'])
+
+
+def simulate_all_in_all_out(price, buy_signal, sell_signal, initial_investment, exact=True):
+    """Simulates a strategy that invests all held cash when `buy_signal` is set and sells
+    all holdings when `sell_signal` is set, and liquidates any holdings on the last day.
+    
+    While holding cash only the buy signal is checked and while holding stock only the
+    sell signal is checked. Days where both signals are set therefore flip the position,
+    while days with a single signal set it. The position on every day is the value set by
+    the last single-signal day, flipped once per both-signal day since then, which lets
+    the whole position series be computed with cumulative operations.
+
+    Args:
+        price (np.ndarray): The price of the stock on every day
+        buy_signal (np.ndarray): Boolean array, True on days the strategy wants to buy
+        sell_signal (np.ndarray): Boolean array, True on days the strategy wants to sell
+        initial_investment (float): The amount of initial cash to start with
+        exact (bool, optional): Compute the cash and holdings of each trade one by one so the
+                                results match sequential float arithmetic bit for bit. When False
+                                they are computed with a running product, which is faster for
+                                strategies that trade often but can differ in the last few bits.
+                                Defaults to True.
+
+    Returns:
+        dict: Columns 'row' (index of the day the row refers to), 'action' (BUY, SELL or
+              HOLD codes), 'price', 'cash', 'stock_holdings', 'total_value' and 'return'.
+              The final liquidation, if any, is appended as an extra row.
+    """
+    price = np.asarray(price, dtype=np.float64)
+    num_days = len(price)
+    day_index = np.arange(num_days)
+    
+    buy_signal = np.asarray(buy_signal, dtype=bool) & (initial_investment > 0)
+    sell_signal = np.asarray(sell_signal, dtype=bool)
+    
+    only_buy = buy_signal & ~sell_signal
+    only_sell = sell_signal & ~buy_signal
+    both = buy_signal & sell_signal
+    
+    last_set = np.maximum.accumulate(np.where(only_buy | only_sell, day_index, -1))
+    has_set = last_set >= 0
+    last_set = last_set.clip(min=0)
+    
+    flips = np.cumsum(both)
+    flips_since_set = flips - np.where(has_set, flips[last_set], 0)
+    position = (has_set & only_buy[last_set]) ^ (flips_since_set & 1).astype(bool)
+    
+    action = np.diff(position.astype(np.int8), prepend=np.int8(0))
+    
+    # Cash and holdings only change on trade days. Slot 0 holds the starting state
+    trade_days = np.flatnonzero(action)
+    trade_cash = np.empty(len(trade_days) + 1)
+    trade_holdings = np.empty(len(trade_days) + 1)
+    trade_cash[0] = initial_investment
+    trade_holdings[0] = 0
+    if exact:
+        cash = initial_investment
+        stock_holdings = 0
+        for i, day in enumerate(trade_days.tolist(), start=1):
+            if action[day] == BUY:
+                stock_holdings = cash / price[day]
+                cash = 0
+            else:
+                cash = stock_holdings * price[day]
+                stock_holdings = 0
+            trade_cash[i] = cash
+            trade_holdings[i] = stock_holdings
+    else:
+        # Trades alternate between buying and selling everything, so the wealth after
+        # every trade is a running product of the trade prices
+        is_buy = action[trade_days] == BUY
+        wealth = initial_investment * np.cumprod(np.where(is_buy, 1 / price[trade_days], price[trade_days]))
+        trade_cash[1:] = np.where(is_buy, 0, wealth)
+        trade_holdings[1:] = np.where(is_buy, wealth, 0)
+    
+    state = np.searchsorted(trade_days, day_index, side='right')
+    cash = trade_cash[state]
+    stock_holdings = trade_holdings[state]
+    
+    total_value = cash + np.where(stock_holdings > 0, stock_holdings * price, 0)
+    
+    result = {
+        'row': day_index,
+        'action': action,
+        'price': price,
+        'cash': cash,
+        'stock_holdings': stock_holdings,
+        'total_value': total_value,
+        'return': total_value - initial_investment
+    }
+    
+    # At the end of the period, sell any remaining stock at the last day's price
+    if num_days and stock_holdings[-1] > 0:
+        final_cash = stock_holdings[-1] * price[-1]
+        final_row = {
+            'row': num_days - 1,
+            'action': SELL,
+            'price': price[-1],
+            'cash': final_cash,
+            'stock_holdings': 0,
+            'total_value': final_cash,
+            'return': total_value[-1] - initial_investment
+        }
+        result = {
+            column: np.append(values, final_row[column]).astype(values.dtype)
+            for column, values in result.items()
+        }
+    
+    return result
+
+
+def action_names(action):
+    """Converts BUY, SELL and HOLD codes to the 'Buy', 'Sell' and 'Hold' labels."""
+    return ACTION_NAMES[np.asarray(action) + 1]
@@ -0,0 +1,99 @@
+from stock_analyzer.views.backtest_strategies import execution
+
+import numpy as np
+
+
+TRADING_DAYS_PER_YEAR = 252
+DAYS_PER_YEAR = 365.25
+
+
+def compute_metrics(dates, simulation, initial_investment, risk_free_rate=0.0):
+    """Computes the performance summary of a simulation in one pass over its equity curve.
+    Metrics that are undefined for the simulation, e.g. the Sharpe ratio of a strategy that
+    never trades, are None.
+
+    Args:
+        dates (np.ndarray): The date of every day of the series
+        simulation (dict): The columns returned by `execution.simulate_all_in_all_out`
+        initial_investment (float): The amount of initial cash the simulation started with
+        risk_free_rate (float, optional): The annual risk free rate for the Sharpe and Sortino ratios. Defaults to 0.
+
+    Returns:
+        dict: 'total_return', 'num_trades', 'max_drawdown' (fraction of the peak),
+              'max_drawdown_days' (longest number of trading days below a previous peak),
+              'cagr', 'volatility' (annualized), 'sharpe', 'sortino', 'win_rate' (fraction of
+              round trips sold above their buy price), 'exposure' (fraction of days holding stock)
+              and 'turnover' (value traded per year as a multiple of the average portfolio value)
+    """
+    action = simulation['action']
+    num_days = len(dates)
+
+    # The final liquidation row repeats the last day, the daily curve stops before it
+    equity = simulation['total_value'][:num_days]
+    daily_returns = _daily_returns(equity)
+    excess_returns = daily_returns - risk_free_rate / TRADING_DAYS_PER_YEAR
+
+    years = (dates[-1] - dates[0]).days / DAYS_PER_YEAR if num_days else 0
+
+    traded_prices = simulation['price'][action != execution.HOLD]
+    # Every buy is followed by a sell, the last one being the liquidation
+    buy_prices, sell_prices = traded_prices[0::2], traded_prices[1::2]
+    traded_value = simulation['total_value'][action != execution.HOLD].sum()
+
+    volatility = daily_returns.std(ddof=1) if len(daily_returns) > 1 else None
+    downside_deviation = np.sqrt(np.mean(np.minimum(excess_returns, 0) ** 2)) if len(excess_returns) else None
+
+    return {
+        'total_return': float(simulation['return'][-1]) if len(action) else 0.0,
+        'num_trades': int(np.count_nonzero(action)),
+        'max_drawdown': max_drawdown(equity),
+        'max_drawdown_days': max_drawdown_days(equity),
+        'cagr': _ratio_or_none(
+            lambda: (equity[-1] / initial_investment) ** (1 / years) - 1, years > 0 and initial_investment > 0
+        ),
+        'volatility': _annualized(volatility),
+        'sharpe': _ratio_or_none(lambda: _annualized(excess_returns.mean() / volatility), volatility),
+        'sortino': _ratio_or_none(lambda: _annualized(excess_returns.mean() / downside_deviation), downside_deviation),
+        'win_rate': _ratio_or_none(lambda: np.mean(sell_prices > buy_prices), len(sell_prices)),
+        'exposure': float(np.mean(simulation['stock_holdings'][:num_days] > 0)) if num_days else 0.0,
+        'turnover': _ratio_or_none(lambda: traded_value / equity.mean() / years, years > 0 and equity.mean() > 0)
+    }
+
+
+def max_drawdown(total_value):
+    """The largest peak to trough drop of the portfolio value, as a fraction of the peak."""
+    total_value = np.asarray(total_value, dtype=np.float64)
+    if not len(total_value):
+        return 0.0
+    peaks = np.maximum.accumulate(total_value)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        drawdowns = np.where(peaks > 0, 1 - total_value / peaks, 0)
+    return float(drawdowns.max())
+
+
+def max_drawdown_days(total_value):
+    """The longest number of days the portfolio value stayed below a previous peak."""
+    total_value = np.asarray(total_value, dtype=np.float64)
+    if not len(total_value):
+        return 0
+    day_index = np.arange(len(total_value))
+    at_peak = total_value >= np.maximum.accumulate(total_value)
+    last_peak = np.maximum.accumulate(np.where(at_peak, day_index, 0))
+    return int((day_index - last_peak).max())
+
+
+def _daily_returns(equity):
+    if len(equity) < 2:
+        return np.zeros(0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = np.diff(equity) / equity[:-1]
+    return returns[np.isfinite(returns)]
+
+
+def _annualized(value):
+    # Daily deviations and ratios scale with the square root of the number of trading days in a year
+    return None if value is None else float(value * np.sqrt(TRADING_DAYS_PER_YEAR))
+
+
+def _ratio_or_none(compute, defined):
+    return float(compute()) if defined else None
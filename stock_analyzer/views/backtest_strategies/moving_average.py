@@ -1,10 +1,14 @@
 from stock_analyzer.views.postgres_api import stock_data_query
+from stock_analyzer.views.backtest_strategies import strategy
+
+from django.conf import settings
 
 from datetime import timedelta, date
+import numpy as np
 import pandas as pd
 
 
-def simulate_moving_average_strategy(symbol, initial_investment, buy_day_range, sell_day_range):
+def simulate_moving_average_strategy(symbol, initial_investment, buy_day_range, sell_day_range, include_log=True):
     """This function simulates the buying and selling of the given stock symbol using
     the moving average strategy. Using the initial investment and all future returns,
     we use all our held cash to buy if the current price is below the buy moving average 
@@ -16,114 +20,137 @@ def simulate_moving_average_strategy(symbol, initial_investment, buy_day_range,
         initial_investment (float): The amount of initial cash to start with
         buy_day_range (int): The window size of your buy moving average
         sell_day_range (int): The window size of your sell moving average
+        include_log (bool, optional): Include the daily investment log. Defaults to True.
 
     Returns:
-        dict[]: The 
+        dict: The symbol, the metrics block and, when `include_log` is set, the daily investment
+              log as columns, see `backtest_moving_average`
     """
     stock_dataframe = build_dataframe(symbol, buy_day_range, sell_day_range)
     
-    # Simulate the strategy
-    cash = initial_investment
-    stock_holdings = 0
-    total_value = initial_investment
-    
-    log_data = []
-    
-    for i in range(len(stock_dataframe)):
-        current_date = stock_dataframe.iloc[i]['date']
-        current_price = stock_dataframe.iloc[i]['price']
-        buy_threshold = stock_dataframe.iloc[i]['buy_moving_average']
-        sell_threshold = stock_dataframe.iloc[i]['sell_moving_average']
-        
-        action = 'Hold'
-        
-        # Go to next day when not enough data to have a moving average yet
-        if buy_threshold is not None and sell_threshold is not None:
-            # Check if can buy and invest all cash
-            if current_price < buy_threshold and cash > 0:
-                stock_holdings = cash / current_price
-                cash = 0
-                action = 'Buy'
-                print(f"Bought on {current_date} at {current_price}")
-            
-            # Check if can sell and sell all holdings
-            elif current_price > sell_threshold and stock_holdings > 0:
-                cash = stock_holdings * current_price
-                stock_holdings = 0
-                action = 'Sell'
-                print(f"Sold on {current_date} at {current_price}")
-                
-            
-        # Update total portfolio value (cash + stock value)
-        total_value = cash + (stock_holdings * current_price if stock_holdings > 0 else 0)
-        
-        log_data.append({
-            'symbol': symbol,
-            'date': current_date,
-            'action': action,
-            'price': current_price,
-            'cash': cash,
-            'stock_holdings': stock_holdings,
-            'total_value': total_value,
-            'return': total_value - initial_investment
-        })
-
-    # At the end of the period, sell any remaining stock at the last day's price
-    if stock_holdings > 0:
-        final_price = stock_dataframe.iloc[-1]['price']
-        cash = stock_holdings * final_price
-        stock_holdings = 0
-        
-        log_data.append({
-            'symbol': symbol,
-            'date': stock_dataframe.iloc[-1]['date'],
-            'action': "Sell",
-            'price': final_price,
-            'cash': cash,
-            'stock_holdings': stock_holdings,
-            'total_value': cash,
-            'return': total_value - initial_investment
-        })
-        print(f"Sold remaining stock on {stock_dataframe.iloc[-1]['date']} at {final_price}")
-
-
-    # Final total value
-    total_value = cash
-    print(f"Total return after 2 years: {total_value - initial_investment}")
-    return log_data
+    return {
+        'symbol': symbol,
+        **backtest_moving_average(stock_dataframe, initial_investment, buy_day_range, sell_day_range, include_log)
+    }
+
+
+def moving_average_strategy(buy_day_range, sell_day_range, price=strategy.PRICE):
+    """The moving average strategy on the strategy framework: buy while the price is below
+    the buy moving average and sell while it is above the sell moving average.
+
+    Args:
+        buy_day_range (int): The window size of your buy moving average
+        sell_day_range (int): The window size of your sell moving average
+        price (Expression, optional): The price the averages are computed over. Defaults to the 'price' column.
+
+    Returns:
+        Strategy: The strategy
+    """
+    return strategy.Strategy(
+        f'Moving Average ({buy_day_range}/{sell_day_range})',
+        entry=price < strategy.SMA(price, buy_day_range),
+        exit=price > strategy.SMA(price, sell_day_range)
+    )
+
+
+def run_moving_average_backtest(stock_dataframe, initial_investment, buy_day_range, sell_day_range):
+    """Runs the moving average strategy over a dataframe built by `build_dataframe`.
+
+    Args:
+        stock_dataframe (pandas.DataFrame): The date, price and buy and sell moving averages of every day
+        initial_investment (float): The amount of initial cash to start with
+        buy_day_range (int): The window size of the buy moving average of the dataframe
+        sell_day_range (int): The window size of the sell moving average of the dataframe
+
+    Returns:
+        dict: Lists keyed by 'date', 'action', 'price', 'cash', 'stock_holdings', 'total_value'
+              and 'return', one entry per day plus the final liquidation if there is one
+    """
+    return moving_average_strategy(buy_day_range, sell_day_range).run_backtest(
+        stock_dataframe['date'].to_numpy(), _strategy_columns(stock_dataframe, buy_day_range, sell_day_range),
+        initial_investment
+    )
+
+
+def backtest_moving_average(stock_dataframe, initial_investment, buy_day_range, sell_day_range, include_log=True):
+    """Runs the moving average strategy over a dataframe built by `build_dataframe` and
+    computes its metrics.
+
+    Args:
+        stock_dataframe (pandas.DataFrame): The date, price and buy and sell moving averages of every day
+        initial_investment (float): The amount of initial cash to start with
+        buy_day_range (int): The window size of the buy moving average of the dataframe
+        sell_day_range (int): The window size of the sell moving average of the dataframe
+        include_log (bool, optional): Include the daily investment log. Defaults to True.
+
+    Returns:
+        dict: The 'metrics' block of `metrics.compute_metrics`, and the 'log' of
+              `run_moving_average_backtest` when `include_log` is set
+    """
+    return moving_average_strategy(buy_day_range, sell_day_range).backtest(
+        stock_dataframe['date'].to_numpy(), _strategy_columns(stock_dataframe, buy_day_range, sell_day_range),
+        initial_investment, include_log=include_log
+    )
     
 
-def build_dataframe(symbol, buy_day_range, sell_day_range, num_days=2*365):
+def build_dataframe(symbol, buy_day_range, sell_day_range, num_days=None):
     """Builds the dataframe calculating the buy and sell moving averages
     and the price of a given stock symbol for every day from today to
     num_days ago.
+    
+    The moving averages are read from the indicator store instead of being recomputed. The first
+    day range - 1 days of the period are left without an average, as if the averages were computed
+    over the period alone.
 
     Args:
         symbol (str): The stock to be calculated on
         buy_day_range (int): The number of days your window size will be for the buy moving average
         sell_day_range (int): The number of days your window size will be for the sell moving average
-        num_days (int, optional): The number of days ago you want to start the simulation from. Defaults to 2*365 (2 years).
+        num_days (int, optional): The number of days ago you want to start the simulation from. Defaults to STOCK_DATA_RETENTION_DAYS.
 
     Returns:
         pandas.DataFrame: A Pandas dataframe with the stock data and the day price, buy moving average,
                           and sell moving average added as columns.
     """
+    num_days = num_days or settings.STOCK_DATA_RETENTION_DAYS
     today = date.today()
-    two_years_ago = today - timedelta(days=num_days)
-    
-    stock_data = stock_data_query.get_stock_data_from_date_range(
-        symbol=symbol,
-        start_date=two_years_ago,
-        end_date=today,
-        date_desc=False
-    )
-    
-    df = pd.DataFrame(stock_data)
-    df = df.sort_values('date')
+    start_date = today - timedelta(days=num_days)
     
-    # Using (open + close) / 2 as the stock value for the given day
-    df['price'] = (df['open'] + df['close']) / 2    
-    df['buy_moving_average'] = df['price'].rolling(window=buy_day_range).mean()
-    df['sell_moving_average'] = df['price'].rolling(window=sell_day_range).mean()
+    indicators = stock_data_query.get_indicators(symbol, (buy_day_range, sell_day_range)).between(start_date, today)
     
-    return df
+    return build_dataframe_from_indicators(indicators, buy_day_range, sell_day_range)
+
+
+def build_dataframe_from_indicators(indicators, buy_day_range, sell_day_range):
+    """Builds the dataframe of `build_dataframe` from an already loaded indicator series, so
+    the single and batch backtests trade on the same averages.
+
+    Args:
+        indicators (IndicatorSeries): The price and buy and sell moving averages of the stock over the simulated period
+        buy_day_range (int): The number of days your window size will be for the buy moving average
+        sell_day_range (int): The number of days your window size will be for the sell moving average
+
+    Returns:
+        pandas.DataFrame: The date, price, buy moving average and sell moving average of every day
+    """
+    return pd.DataFrame({
+        'date': indicators.date_objects(),
+        'price': indicators.price,
+        'buy_moving_average': _from_period_start(indicators.moving_averages[buy_day_range], buy_day_range),
+        'sell_moving_average': _from_period_start(indicators.moving_averages[sell_day_range], sell_day_range)
+    })
+
+
+def _from_period_start(moving_average, day_range):
+    moving_average = moving_average.copy()
+    moving_average[:day_range - 1] = np.nan
+    return moving_average
+
+
+def _strategy_columns(stock_dataframe, buy_day_range, sell_day_range):
+    # The averages of the dataframe stand in for the strategy's SMA nodes, so they aren't recomputed
+    return {
+        'price': stock_dataframe['price'].to_numpy(),
+        strategy.SMA(strategy.PRICE, buy_day_range): stock_dataframe['buy_moving_average'].to_numpy(),
+        strategy.SMA(strategy.PRICE, sell_day_range): stock_dataframe['sell_moving_average'].to_numpy()
+    }
@@ -0,0 +1,140 @@
+from stock_analyzer.views.postgres_api import stock_data_query
+from stock_analyzer.views.backtest_strategies import execution
+from stock_analyzer.views.backtest_strategies import metrics
+from stock_analyzer.views.backtest_strategies import worker_pool
+
+from django.conf import settings
+
+from datetime import timedelta, date
+import numpy as np
+import pandas as pd
+
+
+MAX_DAY_RANGE = 200
+
+
+def sweep_moving_average_strategy(symbol, initial_investment, buy_day_ranges, sell_day_ranges, num_days=None):
+    """Simulates the moving average strategy for every combination of buy and sell window
+    sizes over the same price series.
+
+    Args:
+        symbol (str): The stock symbol the strategy will be performed on
+        initial_investment (float): The amount of initial cash to start with
+        buy_day_ranges (list[int]): The window sizes of the buy moving average to try
+        sell_day_ranges (list[int]): The window sizes of the sell moving average to try
+        num_days (int, optional): The number of days ago to start the simulation from. Defaults to STOCK_DATA_RETENTION_DAYS.
+
+    Returns:
+        dict: The tried window sizes and `len(buy_day_ranges) x len(sell_day_ranges)` matrices of
+              the total return, number of trades and max drawdown of every combination
+    """
+    for day_range in list(buy_day_ranges) + list(sell_day_ranges):
+        if not 1 <= day_range <= MAX_DAY_RANGE:
+            raise ValueError(f'Day ranges must be between 1 and {MAX_DAY_RANGE}.')
+    
+    num_days = num_days or settings.STOCK_DATA_RETENTION_DAYS
+    today = date.today()
+    start_date = today - timedelta(days=num_days)
+    stock_series = stock_data_query.get_price_series(symbol)
+    start = np.searchsorted(stock_series.dates, start_date.toordinal(), side='left')
+    end = np.searchsorted(stock_series.dates, today.toordinal(), side='right')
+    results = simulate_sweep(stock_series.price()[:end], initial_investment, buy_day_ranges, sell_day_ranges, start)
+    
+    return {
+        'symbol': symbol,
+        'buy_day_ranges': list(buy_day_ranges),
+        'sell_day_ranges': list(sell_day_ranges),
+        'total_return': results['total_return'].tolist(),
+        'num_trades': results['num_trades'].tolist(),
+        'max_drawdown': results['max_drawdown'].tolist()
+    }
+
+
+def simulate_sweep(price, initial_investment, buy_day_ranges, sell_day_ranges, start=0):
+    """Simulates the moving average strategy for every combination of window sizes over a
+    price series, in worker processes when the grid is large enough.
+    
+    The moving averages are computed over the whole history with pandas, as the indicator store
+    builds the ones `/backtest_moving_average/` reads, so a cell makes the same trades as the
+    single backtest with the same windows. Only averages the store extended bar by bar since it
+    built them can differ in the last bits, and so flip a trade when the price equals the
+    average. The cells are simulated with `exact=False`, so their returns can also differ from
+    the single backtest in the last bits.
+
+    Args:
+        price (np.ndarray): The price of the stock on every day of its history up to the last simulated day
+        initial_investment (float): The amount of initial cash to start with
+        buy_day_ranges (list[int]): The window sizes of the buy moving average to try
+        sell_day_ranges (list[int]): The window sizes of the sell moving average to try
+        start (int, optional): The index of the first simulated day. Defaults to 0.
+
+    Returns:
+        dict: `len(buy_day_ranges) x len(sell_day_ranges)` arrays of the 'total_return',
+              'num_trades' and 'max_drawdown' of every combination
+    """
+    moving_averages = rolling_means(price, sorted(set(buy_day_ranges) | set(sell_day_ranges)), start)
+    price = price[start:]
+    buy_signals = np.array([price < moving_averages[day_range] for day_range in buy_day_ranges])
+    sell_signals = np.array([price > moving_averages[day_range] for day_range in sell_day_ranges])
+    
+    num_workers = settings.BACKTEST_WORKERS
+    num_cells = len(buy_day_ranges) * len(sell_day_ranges)
+    if num_workers <= 1 or num_cells < settings.BACKTEST_SWEEP_PARALLEL_MIN_CELLS:
+        results = _simulate_grid(price, buy_signals, sell_signals, initial_investment)
+    else:
+        # Each task evaluates a block of buy windows against every sell window
+        blocks = np.array_split(np.arange(len(buy_day_ranges)), min(num_workers * 4, len(buy_day_ranges)))
+        futures = [
+            worker_pool.get_executor().submit(
+                _simulate_grid, price, buy_signals[block], sell_signals, initial_investment
+            )
+            for block in blocks
+        ]
+        block_results = [future.result() for future in futures]
+        results = { metric: np.concatenate([block[metric] for block in block_results]) for metric in block_results[0] }
+    return results
+
+
+def rolling_means(price, day_ranges, start=0):
+    """Computes the trailing moving average of every requested window size over the whole
+    history with pandas, as the indicator store does, and slices it to the simulated period.
+    The first window size - 1 days of the period are left without an average, as in
+    `moving_average.build_dataframe`.
+
+    Args:
+        price (np.ndarray): The price of the stock on every day of its history
+        day_ranges (list[int]): The window sizes
+        start (int, optional): The index of the first simulated day. Defaults to 0.
+
+    Returns:
+        dict: The moving average array of every window size over the period
+    """
+    price_series = pd.Series(price, dtype=np.float64)
+    moving_averages = {}
+    for day_range in day_ranges:
+        moving_average = price_series.rolling(window=day_range).mean().to_numpy()[start:]
+        moving_average[:day_range - 1] = np.nan
+        moving_averages[day_range] = moving_average
+    return moving_averages
+
+
+def _simulate_grid(price, buy_signals, sell_signals, initial_investment):
+    shape = (len(buy_signals), len(sell_signals))
+    results = {
+        'total_return': np.zeros(shape),
+        'num_trades': np.zeros(shape, dtype=np.int64),
+        'max_drawdown': np.zeros(shape)
+    }
+    if not len(price):
+        return results
+    
+    for i, buy_signal in enumerate(buy_signals):
+        for j, sell_signal in enumerate(sell_signals):
+            simulation = execution.simulate_all_in_all_out(
+                price, buy_signal, sell_signal, initial_investment, exact=False
+            )
+            results['total_return'][i, j] = simulation['return'][-1]
+            results['num_trades'][i, j] = np.count_nonzero(simulation['action'])
+            results['max_drawdown'][i, j] = metrics.max_drawdown(simulation['total_value'])
+    return results
+
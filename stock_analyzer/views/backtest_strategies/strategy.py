@@ -0,0 +1,382 @@
+from stock_analyzer.views.backtest_strategies import execution
+from stock_analyzer.views.backtest_strategies import metrics
+
+import numpy as np
+import pandas as pd
+
+
+class Expression:
+    """A node of a vectorized expression over the columns of a price series. Expressions are
+    combined with the arithmetic, comparison and logical (&, |, ~) operators, and are evaluated
+    once per series for every day at the same time.
+
+    Every node has a structural key, so a subexpression used by several rules, e.g. the same
+    moving average in the entry and exit rules, is only computed once per evaluation.
+    """
+    key = ()
+
+    def compute(self, evaluate):
+        """Computes the values of the node. `evaluate` evaluates child nodes."""
+        raise NotImplementedError
+
+    def crosses_above(self, other):
+        return Cross(self, _as_expression(other), above=True)
+
+    def crosses_below(self, other):
+        return Cross(self, _as_expression(other), above=False)
+
+    def shift(self, num_days=1):
+        return Shift(self, num_days)
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __eq__(self, other):
+        return isinstance(other, Expression) and self.key == other.key
+
+    def __repr__(self):
+        return f'{type(self).__name__}{self.key[1:]}'
+
+    def __lt__(self, other):
+        return BinaryOperation('less', self, other)
+
+    def __le__(self, other):
+        return BinaryOperation('less_equal', self, other)
+
+    def __gt__(self, other):
+        return BinaryOperation('greater', self, other)
+
+    def __ge__(self, other):
+        return BinaryOperation('greater_equal', self, other)
+
+    def __and__(self, other):
+        return BinaryOperation('logical_and', self, other)
+
+    def __or__(self, other):
+        return BinaryOperation('logical_or', self, other)
+
+    def __invert__(self):
+        return Not(self)
+
+    def __add__(self, other):
+        return BinaryOperation('add', self, other)
+
+    def __radd__(self, other):
+        return BinaryOperation('add', other, self)
+
+    def __sub__(self, other):
+        return BinaryOperation('subtract', self, other)
+
+    def __rsub__(self, other):
+        return BinaryOperation('subtract', other, self)
+
+    def __mul__(self, other):
+        return BinaryOperation('multiply', self, other)
+
+    def __rmul__(self, other):
+        return BinaryOperation('multiply', other, self)
+
+    def __truediv__(self, other):
+        return BinaryOperation('divide', self, other)
+
+    def __rtruediv__(self, other):
+        return BinaryOperation('divide', other, self)
+
+
+class Column(Expression):
+    """An input column of the series, e.g. 'price' or 'close'."""
+
+    def __init__(self, name):
+        self.name = name
+        self.key = ('column', name)
+
+    def compute(self, evaluate):
+        raise KeyError(f"The series has no '{self.name}' column.")
+
+
+class Constant(Expression):
+    def __init__(self, value):
+        self.value = value
+        self.key = ('constant', value)
+
+    def compute(self, evaluate):
+        return self.value
+
+
+class BinaryOperation(Expression):
+    def __init__(self, operation, left, right):
+        self.operation = operation
+        self.left = _as_expression(left)
+        self.right = _as_expression(right)
+        self.key = ('binary', operation, self.left.key, self.right.key)
+
+    def compute(self, evaluate):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return getattr(np, self.operation)(evaluate(self.left), evaluate(self.right))
+
+
+class Not(Expression):
+    def __init__(self, operand):
+        self.operand = operand
+        self.key = ('not', operand.key)
+
+    def compute(self, evaluate):
+        return np.logical_not(evaluate(self.operand))
+
+
+class Shift(Expression):
+    """The value of an expression `num_days` days earlier, NaN for the first days."""
+
+    def __init__(self, operand, num_days):
+        self.operand = operand
+        self.num_days = num_days
+        self.key = ('shift', operand.key, num_days)
+
+    def compute(self, evaluate):
+        values = np.asarray(evaluate(self.operand), dtype=np.float64)
+        shifted = np.full(len(values), np.nan)
+        if self.num_days < len(values):
+            shifted[self.num_days:] = values[:len(values) - self.num_days]
+        return shifted
+
+
+class Cross(Expression):
+    """True on the days `left` crosses above (or below) `right`: it is above (below) on the
+    day and was not on the previous day.
+    """
+
+    def __init__(self, left, right, above=True):
+        self.left = left
+        self.right = right
+        self.above = above
+        self.key = ('cross', left.key, right.key, above)
+
+    def compute(self, evaluate):
+        difference = np.asarray(evaluate(self.left - self.right), dtype=np.float64)
+        if not self.above:
+            difference = -difference
+        previous = np.concatenate([[np.nan], difference[:-1]])
+        return (difference > 0) & (previous <= 0)
+
+
+class SMA(Expression):
+    """The simple moving average over the last `window` days, NaN until the window is full."""
+
+    def __init__(self, operand, window):
+        self.operand = _as_expression(operand)
+        self.window = window
+        self.key = ('sma', self.operand.key, window)
+
+    def compute(self, evaluate):
+        return _rolling(evaluate(self.operand), self.window).mean().to_numpy()
+
+
+class RollingStd(Expression):
+    """The population standard deviation over the last `window` days, NaN until the window is full."""
+
+    def __init__(self, operand, window):
+        self.operand = _as_expression(operand)
+        self.window = window
+        self.key = ('rolling_std', self.operand.key, window)
+
+    def compute(self, evaluate):
+        return _rolling(evaluate(self.operand), self.window).std(ddof=0).to_numpy()
+
+
+class RSI(Expression):
+    """The relative strength index with Wilder's smoothing, from 0 to 100. NaN for the first `window` days."""
+
+    def __init__(self, operand, window=14):
+        self.operand = _as_expression(operand)
+        self.window = window
+        self.key = ('rsi', self.operand.key, window)
+
+    def compute(self, evaluate):
+        change = np.diff(np.asarray(evaluate(self.operand), dtype=np.float64))
+        rsi = np.full(len(change) + 1, np.nan)
+        if len(change) < self.window:
+            return rsi
+        
+        average_gain = self._wilder_average(np.clip(change, 0, None))
+        average_loss = self._wilder_average(np.clip(-change, 0, None))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rsi[self.window:] = np.where(average_loss == 0, 100.0, 100 - 100 / (1 + average_gain / average_loss))
+        return rsi
+
+    def _wilder_average(self, values):
+        # Seeded with the mean of the first window, then smoothed with alpha = 1 / window
+        seeded = np.concatenate([[values[:self.window].mean()], values[self.window:]])
+        return pd.Series(seeded).ewm(alpha=1 / self.window, adjust=False).mean().to_numpy()
+
+
+def bollinger_bands(operand, window=20, num_std=2):
+    """Returns the lower, middle and upper Bollinger bands of an expression as expressions."""
+    middle = SMA(operand, window)
+    deviation = num_std * RollingStd(operand, window)
+    return middle - deviation, middle, middle + deviation
+
+
+class Strategy:
+    """An all-in all-out strategy: all cash is invested on the days the entry rule is True and
+    all holdings are sold on the days the exit rule is True. Days where a rule evaluates NaN
+    never trigger a trade.
+
+    Args:
+        name (str): The name of the strategy
+        entry (Expression): The buy rule
+        exit (Expression): The sell rule
+    """
+
+    def __init__(self, name, entry, exit):
+        self.name = name
+        self.entry = entry
+        self.exit = exit
+
+    def signals(self, columns):
+        """Evaluates the entry and exit rules over a series.
+
+        Args:
+            columns (dict): Equal length arrays keyed by column name. Values of other expressions,
+                            e.g. precomputed indicators, can be given keyed by the expression.
+
+        Returns:
+            tuple: The boolean buy and sell signal arrays
+        """
+        evaluate = Evaluator(columns)
+        return (
+            np.asarray(evaluate(self.entry), dtype=bool),
+            np.asarray(evaluate(self.exit), dtype=bool)
+        )
+
+    def simulate(self, columns, initial_investment, price_column='price', exact=True):
+        """Runs the strategy over a series with the shared execution kernel.
+
+        Args:
+            columns (dict): The series, see `signals`
+            initial_investment (float): The amount of initial cash to start with
+            price_column (str, optional): The column trades are made at. Defaults to 'price'.
+            exact (bool, optional): See `execution.simulate_all_in_all_out`. Defaults to True.
+
+        Returns:
+            dict: The columns returned by `execution.simulate_all_in_all_out`
+        """
+        buy_signal, sell_signal = self.signals(columns)
+        return execution.simulate_all_in_all_out(
+            price=columns[price_column],
+            buy_signal=buy_signal,
+            sell_signal=sell_signal,
+            initial_investment=initial_investment,
+            exact=exact
+        )
+
+    def run_backtest(self, dates, columns, initial_investment, price_column='price'):
+        """Runs the strategy and formats the daily investment log.
+
+        Args:
+            dates (np.ndarray): The date of every day of the series
+            columns (dict): The series, see `signals`
+            initial_investment (float): The amount of initial cash to start with
+            price_column (str, optional): The column trades are made at. Defaults to 'price'.
+
+        Returns:
+            dict: Lists keyed by 'date', 'action', 'price', 'cash', 'stock_holdings', 'total_value'
+                  and 'return', one entry per day plus the final liquidation if there is one
+        """
+        simulation = self.simulate(columns, initial_investment, price_column)
+        return _format_log(dates, simulation)
+
+    def backtest(self, dates, columns, initial_investment, price_column='price', include_log=True):
+        """Runs the strategy and summarizes it with `metrics.compute_metrics`.
+
+        Args:
+            dates (np.ndarray): The date of every day of the series
+            columns (dict): The series, see `signals`
+            initial_investment (float): The amount of initial cash to start with
+            price_column (str, optional): The column trades are made at. Defaults to 'price'.
+            include_log (bool, optional): Also format the daily investment log. Defaults to True.
+
+        Returns:
+            dict: The 'metrics' block, and the 'log' of `run_backtest` when `include_log` is set
+        """
+        dates = np.asarray(dates)
+        simulation = self.simulate(columns, initial_investment, price_column)
+
+        result = { 'metrics': metrics.compute_metrics(dates, simulation, initial_investment) }
+        if include_log:
+            result['log'] = _format_log(dates, simulation)
+        return result
+
+    def __repr__(self):
+        return f'Strategy({self.name!r}, entry={self.entry!r}, exit={self.exit!r})'
+
+
+class Evaluator:
+    """Evaluates expressions over one series, computing every distinct node once.
+
+    Args:
+        columns (dict): Arrays keyed by column name or by expression
+    """
+
+    def __init__(self, columns):
+        self._values = {}
+        for name, values in columns.items():
+            key = name.key if isinstance(name, Expression) else Column(name).key
+            self._values[key] = values
+
+    def __call__(self, expression):
+        if expression.key not in self._values:
+            self._values[expression.key] = expression.compute(self)
+        return self._values[expression.key]
+
+
+PRICE = Column('price')
+
+
+def sma_crossover(fast_window, slow_window, price=PRICE):
+    """Buys when the fast moving average crosses above the slow one and sells when it crosses below."""
+    fast, slow = SMA(price, fast_window), SMA(price, slow_window)
+    return Strategy(
+        f'SMA Crossover ({fast_window}/{slow_window})',
+        entry=fast.crosses_above(slow),
+        exit=fast.crosses_below(slow)
+    )
+
+
+def rsi_threshold(window=14, oversold=30, overbought=70, price=PRICE):
+    """Buys when the RSI is below `oversold` and sells when it is above `overbought`."""
+    rsi = RSI(price, window)
+    return Strategy(
+        f'RSI ({window}, {oversold}/{overbought})',
+        entry=rsi < oversold,
+        exit=rsi > overbought
+    )
+
+
+def bollinger_breakout(window=20, num_std=2, price=PRICE):
+    """Buys when the price closes above the upper band and sells when it falls back below the middle band."""
+    lower, middle, upper = bollinger_bands(price, window, num_std)
+    return Strategy(
+        f'Bollinger Breakout ({window}, {num_std})',
+        entry=price.crosses_above(upper),
+        exit=price.crosses_below(middle)
+    )
+
+
+def _format_log(dates, simulation):
+    return {
+        'date': np.asarray(dates)[simulation['row']].tolist(),
+        'action': execution.action_names(simulation['action']).tolist(),
+        'price': simulation['price'].tolist(),
+        'cash': simulation['cash'].tolist(),
+        'stock_holdings': simulation['stock_holdings'].tolist(),
+        'total_value': simulation['total_value'].tolist(),
+        'return': simulation['return'].tolist()
+    }
+
+
+def _as_expression(value):
+    return value if isinstance(value, Expression) else Constant(value)
+
+
+def _rolling(values, window):
+    return pd.Series(values, dtype=np.float64).rolling(window=window)
@@ -0,0 +1,29 @@
+from django.conf import settings
+
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import threading
+import django
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Returns the process pool shared by the CPU-bound backtest jobs, creating it on first use.
+    Its size is set by `BACKTEST_WORKERS`.
+    
+    Workers are started with `BACKTEST_WORKER_START_METHOD` instead of forking the server,
+    whose other threads may hold locks and database connections at that moment, and set up
+    Django themselves.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.BACKTEST_WORKERS,
+                mp_context=multiprocessing.get_context(settings.BACKTEST_WORKER_START_METHOD),
+                initializer=django.setup
+            )
+        return _executor
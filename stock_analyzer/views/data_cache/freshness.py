@@ -0,0 +1,116 @@
+from django.conf import settings
+
+from contextlib import asynccontextmanager, contextmanager
+from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo
+import asyncio
+import threading
+
+
+MARKET_TIMEZONE = ZoneInfo('America/New_York')
+MARKET_CLOSE = time(hour=16)
+
+_fresh_until = {}
+_refresh_locks = {}
+_registry_lock = threading.Lock()
+
+
+def is_fresh(symbol, now=None):
+    """Checks if the given symbol was confirmed up to date and its freshness window
+    has not expired yet.
+
+    Args:
+        symbol (str): The symbol of the stock to be checked
+        now (datetime, optional): The current time. Defaults to datetime.now(MARKET_TIMEZONE).
+
+    Returns:
+        bool: True if the stored data can be used without checking the database or Alpha Vantage
+    """
+    now = now or datetime.now(MARKET_TIMEZONE)
+    with _registry_lock:
+        fresh_until = _fresh_until.get(symbol)
+    return fresh_until is not None and now < fresh_until
+
+
+def mark_fresh(symbol, last_date, now=None):
+    """Records that the given symbol was checked against Alpha Vantage. The symbol stays fresh
+    until the close of the session after its most recent stored bar (plus
+    `STOCK_DATA_FRESHNESS_GRACE_MINUTES` for the daily bar to be published), when the next bar
+    is due. Symbols whose next bar is already due are checked again after
+    `STOCK_DATA_FRESHNESS_RETRY_MINUTES`.
+
+    Args:
+        symbol (str): The symbol of the stock that was checked
+        last_date (date): The date of the most recent stored bar of the symbol, or None if it has none
+        now (datetime, optional): The time of the check. Defaults to datetime.now(MARKET_TIMEZONE).
+    """
+    now = now or datetime.now(MARKET_TIMEZONE)
+    fresh_until = now + timedelta(minutes=settings.STOCK_DATA_FRESHNESS_RETRY_MINUTES)
+    if last_date is not None:
+        last_close = datetime.combine(last_date, MARKET_CLOSE, tzinfo=MARKET_TIMEZONE)
+        next_bar_due = next_market_close(last_close) + timedelta(minutes=settings.STOCK_DATA_FRESHNESS_GRACE_MINUTES)
+        fresh_until = max(fresh_until, next_bar_due)
+    with _registry_lock:
+        _fresh_until[symbol] = fresh_until
+
+
+def invalidate(symbol=None):
+    """Forgets the freshness of the given symbol, or of every symbol when none is given."""
+    with _registry_lock:
+        if symbol is None:
+            _fresh_until.clear()
+        else:
+            _fresh_until.pop(symbol, None)
+
+
+@contextmanager
+def single_flight(symbol):
+    """Serializes refreshes of the same symbol. Callers that had to wait should check
+    `is_fresh` again, since the refresh they were waiting on has usually made theirs unnecessary.
+
+    Args:
+        symbol (str): The symbol of the stock being refreshed
+    """
+    with _get_refresh_lock(symbol):
+        yield
+
+
+@asynccontextmanager
+async def asingle_flight(symbol, poll_seconds=0.01):
+    """The async variant of `single_flight`, sharing its locks with synchronous refreshes.
+    The lock is polled so waiting doesn't block the event loop.
+
+    Args:
+        symbol (str): The symbol of the stock being refreshed
+        poll_seconds (float, optional): The interval between attempts to take the lock. Defaults to 0.01.
+    """
+    refresh_lock = _get_refresh_lock(symbol)
+    while not refresh_lock.acquire(blocking=False):
+        await asyncio.sleep(poll_seconds)
+    try:
+        yield
+    finally:
+        refresh_lock.release()
+
+
+def _get_refresh_lock(symbol):
+    with _registry_lock:
+        return _refresh_locks.setdefault(symbol, threading.Lock())
+
+
+def next_market_close(now):
+    """Finds the first weekday market close strictly after the given time.
+
+    Args:
+        now (datetime): A timezone aware datetime
+
+    Returns:
+        datetime: The next market close in the market timezone
+    """
+    now = now.astimezone(MARKET_TIMEZONE)
+    close = datetime.combine(now.date(), MARKET_CLOSE, tzinfo=MARKET_TIMEZONE)
+    if close <= now:
+        close += timedelta(days=1)
+    while close.weekday() >= 5:
+        close += timedelta(days=1)
+    return close
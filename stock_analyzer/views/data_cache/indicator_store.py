@@ -0,0 +1,265 @@
+from stock_analyzer.views.data_cache import price_cache
+from stock_analyzer.views.data_cache import response_cache
+
+from django.conf import settings
+
+from collections import OrderedDict
+from datetime import date
+import math
+import threading
+import numpy as np
+import pandas as pd
+
+
+class IndicatorSeries:
+    """A read-only snapshot of the daily price of a stock symbol and its trailing moving
+    averages, sorted by date. Dates are stored as proleptic Gregorian ordinals.
+    """
+    __slots__ = ('symbol', 'dates', 'price', 'moving_averages')
+
+    def __init__(self, symbol, dates, price, moving_averages):
+        self.symbol = symbol
+        self.dates = dates
+        self.price = price
+        self.moving_averages = moving_averages
+
+    def __len__(self):
+        return len(self.dates)
+
+    def date_objects(self):
+        """The dates of the series as a list of `datetime.date`"""
+        return [date.fromordinal(ordinal) for ordinal in self.dates.tolist()]
+
+    def between(self, start_date, end_date):
+        """Slices the series to the entries with start_date <= date <= end_date without copying.
+        The moving averages keep the values computed over the full history.
+        """
+        start = np.searchsorted(self.dates, start_date.toordinal(), side='left')
+        end = np.searchsorted(self.dates, end_date.toordinal(), side='right')
+        return IndicatorSeries(
+            self.symbol, self.dates[start:end], self.price[start:end],
+            { window: moving_average[start:end] for window, moving_average in self.moving_averages.items() }
+        )
+
+
+class SymbolIndicators:
+    """The daily price, (open + close) / 2, of one stock symbol and its trailing moving averages.
+    Arrays are over-allocated so new bars are appended in place, and every window keeps a
+    compensated running sum so each appended bar updates it in O(1).
+
+    Args:
+        dates (np.ndarray): The date ordinals of the bars, ascending
+        price (np.ndarray): The price of every bar
+    """
+
+    def __init__(self, dates, price):
+        self.size = len(dates)
+        capacity = max(2 * self.size, 16)
+        self._dates = np.zeros(capacity, dtype=np.int32)
+        self._dates[:self.size] = dates
+        self._price = np.zeros(capacity)
+        self._price[:self.size] = price
+        self._moving_averages = {}
+        self._sums = {}
+
+    @property
+    def last_date(self):
+        return int(self._dates[self.size - 1]) if self.size else None
+
+    def has_window(self, window):
+        return window in self._moving_averages
+
+    def add_window(self, window):
+        """Materializes the moving average of a window over the whole history."""
+        price = self._price[:self.size]
+        moving_average = np.full(len(self._price), np.nan)
+        moving_average[:self.size] = pd.Series(price).rolling(window=window).mean().to_numpy()
+        self._moving_averages[window] = moving_average
+        # The running sum of the last `window` prices and its compensation term
+        self._sums[window] = [math.fsum(price[-window:]), 0.0]
+
+    def append(self, ordinal, price):
+        """Appends a bar dated after the last one and extends every moving average by one value."""
+        if self.size == len(self._dates):
+            self._grow()
+
+        i = self.size
+        self._dates[i] = ordinal
+        self._price[i] = price
+        self.size += 1
+
+        for window, moving_average in self._moving_averages.items():
+            running_sum = self._sums[window]
+            _compensated_add(running_sum, price)
+            if i >= window:
+                _compensated_add(running_sum, -self._price[i - window])
+            if self.size >= window:
+                moving_average[i] = (running_sum[0] + running_sum[1]) / window
+
+    def snapshot(self, symbol, windows):
+        """Returns read-only views of the current bars and of the given windows."""
+        return IndicatorSeries(
+            symbol,
+            _read_only(self._dates[:self.size]),
+            _read_only(self._price[:self.size]),
+            { window: _read_only(self._moving_averages[window][:self.size]) for window in windows }
+        )
+
+    def _grow(self):
+        # Snapshots keep referencing the old arrays, which are never written again
+        capacity = 2 * len(self._dates)
+        self._dates = np.concatenate([self._dates, np.zeros(capacity - len(self._dates), dtype=np.int32)])
+        self._price = np.concatenate([self._price, np.zeros(capacity - len(self._price))])
+        for window, moving_average in self._moving_averages.items():
+            self._moving_averages[window] = np.concatenate(
+                [moving_average, np.full(capacity - len(moving_average), np.nan)]
+            )
+
+
+_indicators = OrderedDict()
+# The data version the indicators of every symbol were built at
+_versions = {}
+_generations = {}
+_counters = { 'hits': 0, 'misses': 0, 'stale': 0, 'evictions': 0, 'appended_bars': 0, 'on_demand_windows': 0 }
+_lock = threading.Lock()
+
+
+def get(symbol, windows=()):
+    """Returns the price and moving averages of a symbol. A symbol missing from the store, or
+    whose data version changed since it was built, is built from the price cache with the
+    windows of `INDICATOR_STORE_EAGER_WINDOWS`, and other requested windows are computed once
+    and kept.
+
+    Args:
+        symbol (str): The symbol of the stock
+        windows (tuple[int], optional): The windows of the moving averages to return. Defaults to ().
+
+    Returns:
+        IndicatorSeries: The full stored history of the symbol with the requested moving averages
+    """
+    windows = tuple(dict.fromkeys(windows))
+    # Bars stored or dropped by other processes aren't appended to this store
+    version = response_cache.data_version(symbol)
+    
+    with _lock:
+        indicators = _indicators.get(symbol)
+        if indicators is not None and _versions[symbol] == version:
+            _indicators.move_to_end(symbol)
+            _counters['hits'] += 1
+        else:
+            if indicators is not None:
+                _drop(symbol)
+                _counters['stale'] += 1
+                indicators = None
+            _counters['misses'] += 1
+            generation = _generations.get(symbol, 0)
+
+    if indicators is None:
+        stock_series = price_cache.get(symbol, version)
+        indicators = SymbolIndicators(stock_series.dates, stock_series.price())
+        for window in settings.INDICATOR_STORE_EAGER_WINDOWS:
+            indicators.add_window(window)
+
+        with _lock:
+            # Bars were stored while the symbol was being built. Use the built indicators
+            # but don't keep them, the next read will build them with the new bars.
+            if _generations.get(symbol, 0) == generation and indicators.size:
+                _indicators[symbol] = indicators
+                _versions[symbol] = version
+                _evict()
+
+    with _lock:
+        for window in windows:
+            if not indicators.has_window(window):
+                indicators.add_window(window)
+                _counters['on_demand_windows'] += 1
+        return indicators.snapshot(symbol, windows)
+
+
+def append(symbol, columns, version=None):
+    """Extends the stored indicators of a symbol with newly stored bars. Symbols that aren't
+    in the store are left alone, and bars that don't all come after the last stored one
+    drop the symbol so it is rebuilt on its next read.
+
+    Args:
+        symbol (str): The symbol of the stock
+        columns (dict): Lists keyed by 'date', 'open' and 'close', among others
+        version (int, optional): The data version `response_cache.invalidate` gave the bars, see
+                                 `price_cache.patch`. Defaults to None.
+    """
+    if not columns['date']:
+        return
+
+    with _lock:
+        _generations[symbol] = _generations.get(symbol, 0) + 1
+        indicators = _indicators.get(symbol)
+        if indicators is None:
+            return
+
+        bars = sorted(
+            (stock_date.toordinal(), (open + close) / 2)
+            for stock_date, open, close in zip(columns['date'], columns['open'], columns['close'])
+        )
+        if indicators.size and bars[0][0] <= indicators.last_date:
+            _drop(symbol)
+            return
+
+        for ordinal, price in bars:
+            indicators.append(ordinal, price)
+        if version is not None and version == _versions[symbol] + 1:
+            _versions[symbol] = version
+        _counters['appended_bars'] += len(bars)
+
+
+def invalidate(symbol=None):
+    """Drops the indicators of the given symbol, or of every symbol when none is given."""
+    with _lock:
+        if symbol is None:
+            for stored_symbol in _indicators:
+                _generations[stored_symbol] = _generations.get(stored_symbol, 0) + 1
+            _indicators.clear()
+            _versions.clear()
+        else:
+            _generations[symbol] = _generations.get(symbol, 0) + 1
+            if symbol in _indicators:
+                _drop(symbol)
+
+
+def stats():
+    """Returns the store counters and current size."""
+    with _lock:
+        return {
+            **_counters,
+            'size': len(_indicators),
+            'max_size': settings.PRICE_CACHE_MAX_SYMBOLS,
+            'eager_windows': list(settings.INDICATOR_STORE_EAGER_WINDOWS)
+        }
+
+
+def _evict():
+    while len(_indicators) > settings.PRICE_CACHE_MAX_SYMBOLS:
+        _drop(next(iter(_indicators)))
+        _counters['evictions'] += 1
+
+
+def _drop(symbol):
+    del _indicators[symbol]
+    del _versions[symbol]
+
+
+def _compensated_add(running_sum, value):
+    # Neumaier summation keeps the error of the running sum from growing with every bar
+    total, compensation = running_sum
+    new_total = total + value
+    if abs(total) >= abs(value):
+        compensation += (total - new_total) + value
+    else:
+        compensation += (value - new_total) + total
+    running_sum[0] = new_total
+    running_sum[1] = compensation
+
+
+def _read_only(array):
+    view = array.view()
+    view.flags.writeable = False
+    return view
@@ -0,0 +1,166 @@
+from django.conf import settings
+
+from collections import OrderedDict, defaultdict
+from pathlib import Path
+from urllib.parse import quote
+import os
+import tempfile
+import threading
+import numpy as np
+
+
+class FittedModel:
+    """The coefficients of a fitted model together with the data they were fitted on.
+    `coefficients` is any array the model knows how to predict from.
+    """
+    __slots__ = ('coefficients', 'num_rows')
+
+    def __init__(self, coefficients, num_rows):
+        self.coefficients = coefficients
+        self.num_rows = num_rows
+
+
+# Least recently used first
+_models = OrderedDict()
+_counters = { 'fits': 0, 'memory_reuses': 0, 'disk_reuses': 0, 'evictions': 0 }
+_lock = threading.Lock()
+# Serialize the model files written for a symbol
+_symbol_locks = defaultdict(threading.Lock)
+
+
+def get_or_fit(symbol, model_type, stock_series, fit):
+    """Returns the coefficients of the given model fitted on the given price series, reusing
+    the coefficients fitted on the same data when they are in memory or on disk.
+    
+    Models are keyed by `(symbol, model_type, last_data_date)`, so they stop being reused as
+    soon as new stock data arrives. The number of rows they were fitted on is checked as well,
+    which catches back-filled history.
+
+    Args:
+        symbol (str): The symbol of the stock
+        model_type (str): The name of the model
+        stock_series (PriceSeries): The data the model is fitted on
+        fit (callable): Fits the model on a price series and returns its coefficients as an array
+
+    Returns:
+        np.ndarray: The fitted coefficients
+    """
+    key = (symbol, model_type, stock_series.last_date)
+    num_rows = len(stock_series)
+    
+    with _lock:
+        model = _models.get(key)
+        if model is not None and model.num_rows == num_rows:
+            _models.move_to_end(key)
+            _counters['memory_reuses'] += 1
+            return model.coefficients
+    
+    model = _load(key)
+    if model is not None and model.num_rows == num_rows:
+        counter = 'disk_reuses'
+    else:
+        model = FittedModel(np.asarray(fit(stock_series)), num_rows)
+        counter = 'fits'
+        _save(key, model)
+    
+    with _lock:
+        _counters[counter] += 1
+        _store(key, model)
+    
+    return model.coefficients
+
+
+def put(symbol, model_type, stock_series, coefficients):
+    """Stores coefficients fitted outside of `get_or_fit`, for example by a batch job.
+
+    Args:
+        symbol (str): The symbol of the stock
+        model_type (str): The name of the model
+        stock_series (PriceSeries): The data the model was fitted on
+        coefficients (np.ndarray): The fitted coefficients
+    """
+    key = (symbol, model_type, stock_series.last_date)
+    model = FittedModel(np.asarray(coefficients), len(stock_series))
+    _save(key, model)
+    
+    with _lock:
+        _counters['fits'] += 1
+        _store(key, model)
+
+
+def invalidate(symbol=None):
+    """Forgets the in-memory models of the given symbol, or of every symbol when none is given."""
+    with _lock:
+        for key in [k for k in _models if symbol is None or k[0] == symbol]:
+            del _models[key]
+
+
+def stats():
+    """Returns the fit, reuse and eviction counters and the number of models held in memory."""
+    with _lock:
+        return {
+            **_counters,
+            'size': len(_models),
+            'max_size': settings.MODEL_REGISTRY_MAX_MODELS,
+            'persisted': settings.MODEL_REGISTRY_DIR is not None
+        }
+
+
+def _store(key, model):
+    # Models fitted on older data for the same symbol won't be asked for again
+    for stale_key in [k for k in _models if k[:2] == key[:2] and k != key]:
+        del _models[stale_key]
+    _models[key] = model
+    _models.move_to_end(key)
+    _evict()
+
+
+def _evict():
+    while len(_models) > settings.MODEL_REGISTRY_MAX_MODELS:
+        _models.popitem(last=False)
+        _counters['evictions'] += 1
+
+
+def _path(key):
+    symbol, model_type, last_data_date = key
+    # Quoting escapes every '@', so the parts of the name can't run into each other
+    return Path(settings.MODEL_REGISTRY_DIR) / f"{_prefix(symbol, model_type)}@{last_data_date.isoformat()}.npz"
+
+
+def _prefix(symbol, model_type):
+    return f"{quote(symbol, safe='')}@{quote(model_type, safe='')}"
+
+
+def _load(key):
+    if settings.MODEL_REGISTRY_DIR is None:
+        return None
+    try:
+        with np.load(_path(key)) as stored:
+            return FittedModel(stored['coefficients'], int(stored['num_rows']))
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def _save(key, model):
+    if settings.MODEL_REGISTRY_DIR is None:
+        return
+    path = _path(key)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    
+    with _get_symbol_lock(key[0]):
+        # Write to a temporary file first so other workers never read a partial file
+        with tempfile.NamedTemporaryFile(dir=path.parent, suffix='.npz', delete=False) as temporary_file:
+            np.savez(temporary_file, coefficients=model.coefficients, num_rows=model.num_rows)
+        os.replace(temporary_file.name, path)
+        
+        # Only the model fitted on the latest data is kept, even when a model fitted on older data
+        # is saved last, so saves racing in other processes settle on the same file. Quoted names
+        # have no glob wildcards, and ISO dates sort like the dates.
+        paths = sorted(path.parent.glob(f'{_prefix(key[0], key[1])}@*.npz'), key=lambda p: p.name)
+        for stale_path in paths[:-1]:
+            stale_path.unlink(missing_ok=True)
+
+
+def _get_symbol_lock(symbol):
+    with _lock:
+        return _symbol_locks[symbol]
@@ -0,0 +1,225 @@
+from stock_analyzer.views.storage import registry
+from stock_analyzer.views.data_cache import response_cache
+
+from django.conf import settings
+
+from collections import OrderedDict
+from datetime import date
+import threading
+import numpy as np
+
+
+PRICE_FIELDS = ('open', 'high', 'low', 'close')
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+class PriceSeries:
+    """The OHLCV history of a single stock symbol held as contiguous, read-only NumPy arrays
+    sorted by date. Dates are stored as proleptic Gregorian ordinals (`date.toordinal()`).
+    """
+    __slots__ = ('symbol', 'dates', 'open', 'high', 'low', 'close', 'volume')
+
+    def __init__(self, symbol, dates, open, high, low, close, volume):
+        self.symbol = symbol
+        self.dates = _frozen(dates, np.int32)
+        self.open = _frozen(open, np.float64)
+        self.high = _frozen(high, np.float64)
+        self.low = _frozen(low, np.float64)
+        self.close = _frozen(close, np.float64)
+        self.volume = _frozen(volume, np.int64)
+
+    def __len__(self):
+        return len(self.dates)
+
+    @property
+    def last_date(self):
+        """date: The most recent date of the series, or None if the series is empty"""
+        return date.fromordinal(int(self.dates[-1])) if len(self.dates) else None
+
+    def price(self):
+        """The daily price used by the backtests, (open + close) / 2"""
+        return (self.open + self.close) / 2
+
+    def date_objects(self):
+        """The dates of the series as a list of `datetime.date`"""
+        return [date.fromordinal(ordinal) for ordinal in self.dates.tolist()]
+
+    def datetime64(self):
+        """The dates of the series as a `datetime64[D]` array"""
+        return (self.dates - EPOCH_ORDINAL).astype('datetime64[D]')
+
+    def between(self, start_date, end_date):
+        """Slices the series to the entries with start_date <= date <= end_date without copying.
+
+        Args:
+            start_date (date): The lower bound date
+            end_date (date): The upper bound date
+
+        Returns:
+            PriceSeries: A view of this series over the requested range
+        """
+        start = np.searchsorted(self.dates, start_date.toordinal(), side='left')
+        end = np.searchsorted(self.dates, end_date.toordinal(), side='right')
+        return PriceSeries(
+            self.symbol, self.dates[start:end], self.open[start:end], self.high[start:end],
+            self.low[start:end], self.close[start:end], self.volume[start:end]
+        )
+
+
+_series = OrderedDict()
+# The data version every cached series was loaded at
+_versions = {}
+_generations = {}
+_counters = { 'hits': 0, 'misses': 0, 'stale': 0, 'evictions': 0, 'patches': 0 }
+_lock = threading.Lock()
+
+
+def get(symbol, version=None):
+    """Returns the cached price series of a symbol, loading it from the stock data backend on a miss.
+
+    Args:
+        symbol (str): The symbol of the stock
+        version (int, optional): The data version of the symbol, when the caller already read it. Defaults to None.
+
+    Returns:
+        PriceSeries: The full stored history of the symbol
+    """
+    return get_many([symbol], None if version is None else { symbol: version })[symbol]
+
+
+def get_many(symbols, versions=None):
+    """Returns the cached price series of several symbols. Every symbol missing from the
+    cache, or whose data version changed since it was cached, is loaded with one read of
+    the stock data backend, a single `symbol__in` query on the PostgresDB.
+
+    Args:
+        symbols (list[str]): The symbols of the stocks
+        versions (dict, optional): The data versions of the symbols, when the caller already read
+                                   them. Defaults to None (read with one cache lookup).
+
+    Returns:
+        dict: PriceSeries keyed by symbol. Symbols without stored data map to an empty series.
+    """
+    # Rows stored or dropped by other processes don't reach this cache, so the cached series
+    # are checked against the data versions shared by every process
+    if versions is None:
+        versions = response_cache.data_versions(symbols)
+    
+    found = {}
+    missing = []
+    with _lock:
+        for symbol in symbols:
+            series = _series.get(symbol)
+            if series is not None and _versions[symbol] == versions[symbol]:
+                _series.move_to_end(symbol)
+                found[symbol] = series
+                _counters['hits'] += 1
+            else:
+                if series is not None:
+                    _drop(symbol)
+                    _counters['stale'] += 1
+                missing.append(symbol)
+                _counters['misses'] += 1
+        generations = { symbol: _generations.get(symbol, 0) for symbol in missing }
+
+    if missing:
+        loaded = _load(missing)
+        with _lock:
+            for symbol, series in loaded.items():
+                # Ingestion for the symbol happened while it was being loaded. Return the
+                # loaded series but don't cache it, the next read will load the new rows.
+                if _generations.get(symbol, 0) != generations[symbol] or not len(series):
+                    continue
+                # The versions were read before the load, newer rows only make them stale
+                _series[symbol] = series
+                _versions[symbol] = versions[symbol]
+                _evict()
+        found.update(loaded)
+
+    return found
+
+
+def patch(symbol, columns, version=None):
+    """Merges newly stored rows into the cached series of a symbol. Symbols that aren't
+    cached are left alone, they will be loaded with the new rows on their next read.
+
+    Args:
+        symbol (str): The symbol of the stock
+        columns (dict): Lists keyed by 'date', 'open', 'high', 'low', 'close' and 'volume'
+        version (int, optional): The data version `response_cache.invalidate` gave the rows. The
+                                 patched series takes it when the rows are the only change since
+                                 the series was loaded, otherwise its next read reloads it.
+                                 Defaults to None.
+    """
+    if not columns['date']:
+        return
+
+    with _lock:
+        _generations[symbol] = _generations.get(symbol, 0) + 1
+        cached = _series.get(symbol)
+        if cached is None:
+            return
+
+        new_dates = np.array([stock_date.toordinal() for stock_date in columns['date']], dtype=np.int32)
+        dates = np.concatenate([cached.dates, new_dates])
+        dates, order = np.unique(dates, return_index=True)
+        _series[symbol] = PriceSeries(
+            symbol, dates,
+            *(np.concatenate([getattr(cached, field), columns[field]])[order]
+              for field in PRICE_FIELDS + ('volume',))
+        )
+        if version is not None and version == _versions[symbol] + 1:
+            _versions[symbol] = version
+        _counters['patches'] += 1
+
+
+def invalidate(symbol=None):
+    """Drops the cached series of the given symbol, or of every symbol when none is given."""
+    with _lock:
+        if symbol is None:
+            for cached_symbol in _series:
+                _generations[cached_symbol] = _generations.get(cached_symbol, 0) + 1
+            _series.clear()
+            _versions.clear()
+        else:
+            _generations[symbol] = _generations.get(symbol, 0) + 1
+            if symbol in _series:
+                _drop(symbol)
+
+
+def stats():
+    """Returns the cache counters and current size."""
+    with _lock:
+        return {
+            **_counters,
+            'size': len(_series),
+            'max_size': settings.PRICE_CACHE_MAX_SYMBOLS
+        }
+
+
+def _evict():
+    while len(_series) > settings.PRICE_CACHE_MAX_SYMBOLS:
+        _drop(next(iter(_series)))
+        _counters['evictions'] += 1
+
+
+def _drop(symbol):
+    del _series[symbol]
+    del _versions[symbol]
+
+
+def _load(symbols):
+    loaded = registry.get_backend().read_series(symbols)
+    return {
+        symbol: PriceSeries(
+            symbol, columns['dates'], columns['open'], columns['high'],
+            columns['low'], columns['close'], columns['volume']
+        )
+        for symbol, columns in loaded.items()
+    }
+
+
+def _frozen(values, dtype):
+    array = np.ascontiguousarray(values, dtype=dtype)
+    array.flags.writeable = False
+    return array
@@ -0,0 +1,239 @@
+from stock_analyzer.views.wire_format import arrow_ipc
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from asgiref.sync import sync_to_async
+
+from datetime import date
+import functools
+import hashlib
+import inspect
+import json
+import random
+import threading
+
+
+CACHE_ALIAS = 'responses'
+
+# The kinds of stored data a symbol has a version of
+STOCK_DATA = 'stock_data'
+PREDICTIONS = 'predictions'
+
+# Headers that are rebuilt from the cached body instead of being stored with it
+_REBUILT_HEADERS = ('content-type', 'content-length', 'etag', 'vary', 'cache-control')
+
+_counters = { 'hits': 0, 'not_modified': 0, 'misses': 0, 'uncacheable': 0, 'bytes_saved': 0 }
+_lock = threading.Lock()
+
+
+def cached(endpoint, refresh):
+    """Caches the responses of a view that depend only on its query parameters and the stored
+    data of the `symbol` parameter. Responses are keyed by the endpoint, the normalized
+    parameters, the representation asked for in the Accept header and the data versions of the
+    symbol, which change whenever new bars or predictions are stored. Every response carries an
+    ETag derived from its key, so clients revalidating with `If-None-Match` get a 304 without
+    the view running.
+
+    Args:
+        endpoint (str): The name the responses of the view are cached under. Async and sync
+                        variants of a view share it.
+        refresh (callable): Brings the data of a symbol up to date before its version is read,
+                            `stock_data_query.refresh_data` or its async variant for async views
+
+    Returns:
+        callable: The decorator of the view
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def cached_view(request, *args, **kwargs):
+            symbol = _cacheable_symbol(request)
+            if symbol is None:
+                return view(request, *args, **kwargs)
+            try:
+                refresh(symbol)
+            except Exception:
+                # The view reports the error
+                return view(request, *args, **kwargs)
+
+            key, etag, response = _lookup(endpoint, symbol, request)
+            if response is not None:
+                return response
+            return _store(key, etag, view(request, *args, **kwargs))
+
+        @functools.wraps(view)
+        async def acached_view(request, *args, **kwargs):
+            symbol = _cacheable_symbol(request)
+            if symbol is None:
+                return await view(request, *args, **kwargs)
+            try:
+                await refresh(symbol)
+            except Exception:
+                return await view(request, *args, **kwargs)
+
+            # File caches block on disk reads
+            key, etag, response = await sync_to_async(_lookup)(endpoint, symbol, request)
+            if response is not None:
+                return response
+            response = await view(request, *args, **kwargs)
+            return await sync_to_async(_store)(key, etag, response)
+
+        return acached_view if inspect.iscoroutinefunction(view) else cached_view
+    return decorator
+
+
+def data_version(symbol, kind=STOCK_DATA):
+    """Returns a data version of a symbol, see `data_versions`."""
+    return data_versions([symbol], kind)[symbol]
+
+
+def data_versions(symbols, kind=STOCK_DATA):
+    """Returns the data versions of several symbols with one cache read. A data version is a
+    counter of the given kind of stored data of a symbol, shared by every process using the
+    cache, that `invalidate` increments whenever new rows are stored. In-process caches compare
+    it with the version they loaded a symbol at to notice rows stored by other processes. A
+    symbol without one, or whose one was culled, gets a random one so it doesn't repeat an
+    older version.
+
+    Args:
+        symbols (list[str]): The symbols
+        kind (str, optional): STOCK_DATA or PREDICTIONS. Defaults to STOCK_DATA.
+
+    Returns:
+        dict: The version of every symbol
+    """
+    cache = caches[CACHE_ALIAS]
+    keys = { _version_key(symbol, kind): symbol for symbol in symbols }
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    for key in missing:
+        # Another worker sharing the cache may have set it first
+        cache.add(key, _new_version(), timeout=None)
+    if missing:
+        versions.update(cache.get_many(missing))
+    return { keys[key]: version for key, version in versions.items() }
+
+
+def invalidate(symbol=None, kind=STOCK_DATA):
+    """Retires the cached responses of the given symbol by incrementing its data version of the
+    given kind, or drops every cached response and data version when no symbol is given.
+    Caches whose `incr` is atomic, such as Memcached and Redis, give every increment its own
+    version. The file and database caches read and write it, so two processes storing rows of
+    the same symbol at the same time can get the same version.
+
+    Returns:
+        int: The new data version of the symbol, or None when no symbol is given
+    """
+    cache = caches[CACHE_ALIAS]
+    if symbol is None:
+        cache.clear()
+        return None
+    key = _version_key(symbol, kind)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, _new_version(), timeout=None)
+        return cache.get(key)
+
+
+def response_key(endpoint, symbol, request, versions):
+    """Builds the cache key and ETag of a request. Parameters are sorted, empty values dropped
+    and the symbol uppercased, so equivalent requests share an entry. The key includes today's
+    date as backtest windows and predictions are relative to it.
+
+    Args:
+        endpoint (str): The name the responses of the view are cached under
+        symbol (str): The uppercased symbol of the request
+        request (HttpRequest): The request
+        versions (tuple): The data versions of the symbol
+
+    Returns:
+        tuple: The cache key and the quoted ETag
+    """
+    params = sorted(
+        (name, symbol if name == 'symbol' else value)
+        for name, values in request.GET.lists()
+        for value in values
+        if value
+    )
+    representation = 'arrow' if arrow_ipc.accepts_arrow(request) else 'json'
+    digest = hashlib.sha256(
+        json.dumps([endpoint, params, representation, date.today().isoformat(), versions]).encode()
+    ).hexdigest()
+    return f'response:{endpoint}:{digest}', f'"{digest[:32]}"'
+
+
+def stats():
+    """Returns the response cache counters, the ratio of requests answered from the cache and
+    the bytes of bodies 304 responses didn't send. The counters are kept per worker process.
+    """
+    with _lock:
+        answered = _counters['hits'] + _counters['not_modified']
+        lookups = answered + _counters['misses']
+        return {
+            **_counters,
+            'hit_ratio': answered / lookups if lookups else None,
+            'backend': settings.RESPONSE_CACHE_BACKEND
+        }
+
+
+def _lookup(endpoint, symbol, request):
+    versions = (data_version(symbol, STOCK_DATA), data_version(symbol, PREDICTIONS))
+    key, etag = response_key(endpoint, symbol, request, versions)
+
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        entry = caches[CACHE_ALIAS].get(key)
+        _count('not_modified', len(entry['content']) if entry is not None else 0)
+        return key, etag, _with_validators(not_modified, etag)
+
+    entry = caches[CACHE_ALIAS].get(key)
+    if entry is not None:
+        _count('hits')
+        response = HttpResponse(entry['content'], content_type=entry['content_type'], headers=entry['headers'])
+        return key, etag, _with_validators(response, etag)
+
+    return key, etag, None
+
+
+def _store(key, etag, response):
+    # Errors and streams are sent as they are
+    if response.status_code != 200 or response.streaming:
+        _count('uncacheable')
+        return response
+
+    _count('misses')
+    caches[CACHE_ALIAS].set(key, {
+        'content': response.content,
+        'content_type': response['Content-Type'],
+        'headers': { name: value for name, value in response.items() if name.lower() not in _REBUILT_HEADERS }
+    })
+    return _with_validators(response, etag)
+
+
+def _with_validators(response, etag):
+    response['ETag'] = etag
+    # Clients revalidate every time as new bars may arrive at any point
+    patch_cache_control(response, no_cache=True)
+    patch_vary_headers(response, ('Accept',))
+    return response
+
+
+def _cacheable_symbol(request):
+    symbol = request.GET.get('symbol', '').upper()
+    return symbol if request.method in ('GET', 'HEAD') and symbol else None
+
+
+def _count(counter, bytes_saved=0):
+    with _lock:
+        _counters[counter] += 1
+        _counters['bytes_saved'] += bytes_saved
+
+
+def _version_key(symbol, kind):
+    return f'version:{kind}:{symbol}'
+
+
+def _new_version():
+    return random.getrandbits(62)
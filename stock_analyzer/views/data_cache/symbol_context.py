@@ -0,0 +1,115 @@
+from stock_analyzer.models.prediction_data import PredictionData
+from stock_analyzer.serializers.stock_data import StockDataValuesSerializer
+from stock_analyzer.serializers.prediction_data import PredictionDataValuesSerializer
+from stock_analyzer.views.postgres_api import stock_data_query
+from stock_analyzer.views.data_cache import price_cache
+from stock_analyzer.views.storage import registry
+
+from asgiref.sync import sync_to_async
+
+
+class SymbolDataContext:
+    """A request-scoped memo of the data of one stock symbol. The symbol is refreshed at most
+    once, its stock data is read at most once from the stock data backend and its price series
+    from the price cache, like the backtests, and the predictions of each model are read from
+    the PostgresDB at most once, however many sections of the response are built from them.
+
+    Args:
+        symbol (str): The symbol of the stock
+    """
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self._refreshed = False
+        self._stock_columns = None
+        self._stock_data = None
+        self._price_series = None
+        self._prediction_data = {}
+
+    async def aload(self, model_types=()):
+        """Refreshes the symbol and reads its stock data, its price series and the predictions of
+        the given models, so the synchronous accessors don't read anything afterwards. The
+        predictions are read with the async ORM and the stock data in a worker thread.
+
+        Args:
+            model_types (tuple[str], optional): The models whose predictions are read. Defaults to ().
+        """
+        if not self._refreshed:
+            await stock_data_query.arefresh_data(symbol=self.symbol)
+            self._refreshed = True
+        
+        if self._stock_columns is None or self._price_series is None:
+            await sync_to_async(self._load_stock_data)()
+        
+        for model_type in model_types:
+            if model_type not in self._prediction_data:
+                prediction_rows = PredictionData.objects.filter(
+                    symbol=self.symbol, model_type=model_type
+                ).order_by('date').values_list(*PredictionDataValuesSerializer.fields)
+                self._prediction_data[model_type] = PredictionDataValuesSerializer(
+                    [row async for row in prediction_rows]
+                ).data
+
+    def refresh(self):
+        """Refreshes the stored data of the symbol, once per context."""
+        if not self._refreshed:
+            stock_data_query.refresh_data(symbol=self.symbol)
+            self._refreshed = True
+
+    @property
+    def stock_data(self):
+        """list[dict]: The serialized stock data of the symbol sorted by ascending date"""
+        if self._stock_data is None:
+            self._stock_data = StockDataValuesSerializer(list(zip(*self._get_stock_columns().values()))).data
+        return self._stock_data
+
+    @property
+    def price_series(self):
+        """PriceSeries: The OHLCV columns of the symbol from the price cache"""
+        return self._get_price_series()
+
+    def prediction_data(self, model_type):
+        """Returns the serialized stored predictions of a model for the symbol sorted by
+        ascending date, including the ones added with `add_predictions`.
+
+        Args:
+            model_type (str): The name of the prediction model
+
+        Returns:
+            list[dict]: The predictions of the model
+        """
+        if model_type not in self._prediction_data:
+            prediction_data = PredictionData.objects.filter(
+                symbol=self.symbol, model_type=model_type
+            ).order_by('date')
+            self._prediction_data[model_type] = PredictionDataValuesSerializer(prediction_data).data
+        return self._prediction_data[model_type]
+
+    def add_predictions(self, model_type, predictions):
+        """Merges newly saved serialized predictions of a model into the memo, so later
+        sections see them without reading the table again.
+
+        Args:
+            model_type (str): The name of the prediction model
+            predictions (list[dict]): The saved predictions
+        """
+        merged = { row['date']: row for row in self.prediction_data(model_type) }
+        merged.update((row['date'], row) for row in predictions)
+        # ISO dates sort in chronological order
+        self._prediction_data[model_type] = [merged[prediction_date] for prediction_date in sorted(merged)]
+
+    def _load_stock_data(self):
+        self._get_stock_columns()
+        self._get_price_series()
+
+    def _get_stock_columns(self):
+        if self._stock_columns is None:
+            self.refresh()
+            self._stock_columns = registry.get_backend().read_columns(self.symbol)
+        return self._stock_columns
+
+    def _get_price_series(self):
+        if self._price_series is None:
+            self.refresh()
+            self._price_series = price_cache.get(self.symbol)
+        return self._price_series
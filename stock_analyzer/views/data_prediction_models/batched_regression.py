@@ -0,0 +1,78 @@
+import numpy as np
+
+
+def fit(dates, targets):
+    """Fits a simple linear regression of every target column against the date with a single
+    least squares solve over the stacked target array.
+
+    Args:
+        dates (np.ndarray): The n date ordinals
+        targets (np.ndarray): A (n, k) array with one column per target
+
+    Returns:
+        np.ndarray: A (2, k) array with the slope of every target in row 0 and the intercept in row 1
+    """
+    dates = np.asarray(dates, dtype=np.float64)
+    targets = np.asarray(targets, dtype=np.float64)
+    
+    # Centering the dates keeps the solve well conditioned, ordinals are around 740,000
+    center = dates.mean()
+    design = np.column_stack([dates - center, np.ones(len(dates))])
+    solution, _, _, _ = np.linalg.lstsq(design, targets, rcond=None)
+    
+    slope = solution[0]
+    intercept = solution[1] - slope * center
+    return np.vstack([slope, intercept])
+
+
+def fit_many(dates_list, targets_list):
+    """Fits `fit` for many symbols at once. The per-symbol series are stacked into one array and
+    the closed-form least squares solution of every symbol is computed with grouped sums,
+    which is the same solution as solving each symbol's design matrix separately.
+
+    Args:
+        dates_list (list[np.ndarray]): The date ordinals of every symbol, none of them empty
+        targets_list (list[np.ndarray]): The (n_i, k) target array of every symbol
+
+    Returns:
+        np.ndarray: A (m, 2, k) array with the slopes and intercepts of the m symbols
+    """
+    lengths = np.array([len(dates) for dates in dates_list])
+    if not len(lengths):
+        return np.empty((0, 2, 0))
+    if (lengths == 0).any():
+        raise ValueError('Cannot fit a regression on an empty series.')
+    
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    dates = np.concatenate(dates_list).astype(np.float64)
+    targets = np.concatenate(targets_list).astype(np.float64)
+    
+    dates_mean = np.add.reduceat(dates, starts) / lengths
+    targets_mean = np.add.reduceat(targets, starts) / lengths[:, None]
+    
+    centered_dates = dates - np.repeat(dates_mean, lengths)
+    centered_targets = targets - np.repeat(targets_mean, lengths, axis=0)
+    
+    dates_variance = np.add.reduceat(centered_dates * centered_dates, starts)
+    covariance = np.add.reduceat(centered_dates[:, None] * centered_targets, starts)
+    
+    # A series of a single date has no slope, like sklearn's LinearRegression
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = np.where(dates_variance[:, None] > 0, covariance / dates_variance[:, None], 0)
+    intercept = targets_mean - slope * dates_mean[:, None]
+    return np.stack([slope, intercept], axis=1)
+
+
+def predict(coefficients, future_dates):
+    """Predicts every target on every future date in one call.
+
+    Args:
+        coefficients (np.ndarray): The (2, k) result of `fit` or the (m, 2, k) result of `fit_many`
+        future_dates (np.ndarray): The h date ordinals to predict, or a (m, h) array with the dates of every symbol
+
+    Returns:
+        np.ndarray: A (h, k) array of predictions, or (m, h, k) for many symbols
+    """
+    coefficients = np.asarray(coefficients)
+    future_dates = np.asarray(future_dates, dtype=np.float64)
+    return future_dates[..., None] * coefficients[..., 0:1, :] + coefficients[..., 1:2, :]
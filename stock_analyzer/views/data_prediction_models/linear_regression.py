@@ -1,71 +1,185 @@
 from stock_analyzer.views.postgres_api import stock_data_query
 from stock_analyzer.views.postgres_api import prediction_data_query
+from stock_analyzer.views.data_prediction_models import batched_regression
+from stock_analyzer.views.data_cache import model_registry
+from stock_analyzer.views.data_cache import price_cache
+from stock_analyzer.views.data_cache.symbol_context import SymbolDataContext
 
-from sklearn.linear_model import LinearRegression
+from asgiref.sync import sync_to_async
 
-from datetime import timedelta, datetime
+import asyncio
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 
+from matplotlib.figure import Figure
 from matplotlib.backends.backend_pdf import PdfPages
 from io import BytesIO
 
 
-def predict_stock_data(symbol, predict_num_days):
-    stock_data = stock_data_query.get_all_stock_data(symbol=symbol, date_desc=False)
-    
-    # Convert dates from str to date obj. Then convert dates to numerical value.
-    # Transpose dates array to make it a 2d array
-    dates = [datetime.strptime(stock['date'], "%Y-%m-%d").date() for stock in stock_data]
-    dates = [date.toordinal() for date in dates]
-    dates = np.array(dates).reshape(-1, 1)
+MODEL_TYPE = 'Linear Regression'
+TARGETS = ('open', 'high', 'low', 'close', 'volume')
+
+
+def predict_stock_data(symbol, predict_num_days, context=None):
+    if context is None:
+        stock_series = stock_data_query.get_price_series(symbol)
+        stored_predictions = None
+    else:
+        stock_series = context.price_series
+        stored_predictions = context.prediction_data(MODEL_TYPE)
     
-    open_prices = np.array([stock['open'] for stock in stock_data])
-    high_prices = np.array([stock['high'] for stock in stock_data])
-    low_prices = np.array([stock['low'] for stock in stock_data])
-    close_prices = np.array([stock['close'] for stock in stock_data])
-    volumes = np.array([stock['volume'] for stock in stock_data])
+    predictions = forecast(symbol, stock_series, predict_num_days)
+
+    saved_predictions = prediction_data_query.save_predictions(
+        symbol=symbol,
+        model_type=MODEL_TYPE,
+        predict_num_days=predict_num_days,
+        most_recent_date=stock_series.last_date,
+        predictions=predictions,
+        stored_predictions=stored_predictions
+    )
+    if context is not None:
+        context.add_predictions(MODEL_TYPE, saved_predictions)
+    return saved_predictions
+
+
+async def apredict_stock_data(symbol, predict_num_days, context):
+    """The async variant of `predict_stock_data` for a context loaded with `aload`. The fit runs
+    in a worker thread and the predictions are saved in a thread-sensitive one.
+    """
+    stock_series = context.price_series
+    predictions = await asyncio.to_thread(forecast, symbol, stock_series, predict_num_days)
     
-    models = {
-        'open': LinearRegression(),
-        'high': LinearRegression(),
-        'low': LinearRegression(),
-        'close': LinearRegression(),
-        'volume': LinearRegression(),
-    }
+    saved_predictions = await sync_to_async(prediction_data_query.save_predictions)(
+        symbol=symbol,
+        model_type=MODEL_TYPE,
+        predict_num_days=predict_num_days,
+        most_recent_date=stock_series.last_date,
+        predictions=predictions,
+        stored_predictions=context.prediction_data(MODEL_TYPE)
+    )
+    context.add_predictions(MODEL_TYPE, saved_predictions)
+    return saved_predictions
+
 
-    models['open'].fit(dates, open_prices)
-    models['high'].fit(dates, high_prices)
-    models['low'].fit(dates, low_prices)
-    models['close'].fit(dates, close_prices)
-    models['volume'].fit(dates, volumes)
+def forecast(symbol, stock_series, predict_num_days):
+    """Predicts the `predict_num_days` days following the most recent date of a price series.
+
+    Args:
+        symbol (str): The symbol of the stock
+        stock_series (PriceSeries): The data the models are fitted on
+        predict_num_days (int): The number of days to predict
+
+    Returns:
+        dict: Arrays of `predict_num_days` values keyed by 'open', 'high', 'low', 'close' and 'volume'
+    """
+    # Row 0 holds the slope and row 1 the intercept of every target
+    coefficients = model_registry.get_or_fit(symbol, MODEL_TYPE, stock_series, fit_models)
     
     # Start from the day after most recent date and predict the next `predict_num_days` days
-    most_recent_date = datetime.strptime(stock_data[-1]['date'], "%Y-%m-%d").date()
+    future_dates = stock_series.last_date.toordinal() + np.arange(1, predict_num_days + 1)
     
-    future_dates = [(most_recent_date + timedelta(days=i)).toordinal() for i in range(1, predict_num_days + 1)]
-    future_dates = np.array(future_dates).reshape(-1, 1)
+    predicted_values = batched_regression.predict(coefficients, future_dates)
+    return { target: predicted_values[:, i] for i, target in enumerate(TARGETS) }
+
+
+def get_prediction_sections(symbol, model_type, predict_num_days):
+    """Predicts the next `predict_num_days` days of a stock and returns the sections of the
+    prediction response. All sections are built from one request-scoped data context, so the
+    symbol is refreshed once and each table is read once.
+
+    Args:
+        symbol (str): The symbol of the stock
+        model_type (str): The name of the model whose stored predictions are returned
+        predict_num_days (int): The number of days to predict after the most recent date
+
+    Returns:
+        dict: The 'requested_predicted_data', 'all_predicted_data' and 'all_actual_data' rows
+    """
+    context = SymbolDataContext(symbol)
+    requested_predicted_data = predict_stock_data(symbol, predict_num_days, context=context)
+    return {
+        'requested_predicted_data': requested_predicted_data,
+        'all_predicted_data': context.prediction_data(model_type),
+        'all_actual_data': context.stock_data
+    }
+
+
+async def aget_prediction_sections(symbol, model_type, predict_num_days):
+    """The async variant of `get_prediction_sections`. The data is read with the async ORM
+    before the fit is offloaded to a worker thread.
+    """
+    context = SymbolDataContext(symbol)
+    await context.aload(model_types=(MODEL_TYPE, model_type))
     
-    predictions = {
-        'open': models['open'].predict(future_dates),
-        'high': models['high'].predict(future_dates),
-        'low': models['low'].predict(future_dates),
-        'close': models['close'].predict(future_dates),
-        'volume': models['volume'].predict(future_dates),
+    requested_predicted_data = await apredict_stock_data(symbol, predict_num_days, context)
+    return {
+        'requested_predicted_data': requested_predicted_data,
+        'all_predicted_data': context.prediction_data(model_type),
+        'all_actual_data': context.stock_data
     }
 
-    saved_predictions = prediction_data_query.save_predictions(
-        symbol=symbol,
-        model_type='Linear Regression',
-        predict_num_days=predict_num_days,
-        most_recent_date=most_recent_date,
-        predictions=predictions
+
+def predict_all_stock_data(symbols, predict_num_days):
+    """Refreshes the stored predictions of many stock symbols in one job. The models of all
+    symbols are fitted together and every horizon is predicted in one call.
+
+    Args:
+        symbols (list[str]): The symbols of the stocks, which should already have stored data
+        predict_num_days (int): The number of days to predict after each symbol's most recent date
+
+    Returns:
+        dict: The saved predictions of every symbol with stored data
+    """
+    all_stock_series = price_cache.get_many(symbols)
+    all_stock_series = [stock_series for stock_series in all_stock_series.values() if len(stock_series)]
+    if not all_stock_series:
+        return {}
+    
+    all_coefficients = batched_regression.fit_many(
+        [stock_series.dates for stock_series in all_stock_series],
+        [_stack_targets(stock_series) for stock_series in all_stock_series]
     )
+    
+    future_dates = np.array([
+        stock_series.last_date.toordinal() + np.arange(1, predict_num_days + 1)
+        for stock_series in all_stock_series
+    ])
+    all_predicted_values = batched_regression.predict(all_coefficients, future_dates)
+    
+    saved_predictions = {}
+    for stock_series, coefficients, predicted_values in zip(all_stock_series, all_coefficients, all_predicted_values):
+        model_registry.put(stock_series.symbol, MODEL_TYPE, stock_series, coefficients)
+        
+        saved_predictions[stock_series.symbol] = prediction_data_query.save_predictions(
+            symbol=stock_series.symbol,
+            model_type=MODEL_TYPE,
+            predict_num_days=predict_num_days,
+            most_recent_date=stock_series.last_date,
+            predictions={ target: predicted_values[:, i] for i, target in enumerate(TARGETS) }
+        )
     return saved_predictions
 
 
+def fit_models(stock_series):
+    """Fits one linear regression of every OHLCV target against the date, all in one solve.
+
+    Args:
+        stock_series (PriceSeries): The data to fit the models on
+
+    Returns:
+        np.ndarray: A (2, 5) array with the slope of every target in row 0 and the intercept in row 1
+    """
+    return batched_regression.fit(stock_series.dates, _stack_targets(stock_series))
+
+
+def _stack_targets(stock_series):
+    return np.column_stack([getattr(stock_series, target) for target in TARGETS])
+
+
 def generate_report(requested_predicted_data, all_predicted_data, all_actual_data):
+    # Figures are built with the object-oriented API and never registered with pyplot,
+    # so they are freed as soon as the report is written
     figs = generate_all_plots(all_predicted_data, all_actual_data)
     dataframe_fig = dataframe_to_figure(requested_predicted_data)
     
@@ -84,7 +198,8 @@ def dataframe_to_figure(requested_predicted_data):
     df = pd.DataFrame(requested_predicted_data)
     df = df.drop(columns=['id'])
     
-    fig, ax = plt.subplots(figsize=(8, 6))
+    fig = Figure(figsize=(8, 6))
+    ax = fig.subplots()
     ax.axis('tight')
     ax.axis('off')
     ax.table(cellText=df.values, colLabels=df.columns, loc='center')
@@ -118,7 +233,8 @@ def generate_plot(all_predicted_data, all_actual_data, prediction_plot_choice):
         ((preds['date'] > latest_date) & (preds['date'] <= latest_date + pd.Timedelta(days=30)))  # Dates within 30 days after the latest date in actual
     ]
     
-    fig, ax = plt.subplots(figsize=(12, 6))
+    fig = Figure(figsize=(12, 6))
+    ax = fig.subplots()
     
     label_actual = 'Actual Volume' if prediction_plot_choice == 'Volume' else f'Actual {prediction_plot_choice} Prices'
     label_preds = 'Predicted Volume' if prediction_plot_choice == 'Volume' else f'Actual {prediction_plot_choice} Prices'
@@ -135,7 +251,6 @@ def generate_plot(all_predicted_data, all_actual_data, prediction_plot_choice):
     ax.set_title(y_axis_title)
     ax.legend()
     ax.grid(True)
-
-    plt.xticks(rotation=45)
+    ax.tick_params(axis='x', labelrotation=45)
     
     return fig
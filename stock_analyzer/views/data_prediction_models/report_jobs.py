@@ -0,0 +1,174 @@
+from stock_analyzer.views.postgres_api import stock_data_query
+from stock_analyzer.views.data_prediction_models import linear_regression
+from stock_analyzer.views.data_cache import response_cache
+
+from django.conf import settings
+from django.db import connection
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import uuid
+
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class ReportJob:
+    """A prediction report rendered in the background. `key` identifies the report content,
+    `(symbol, model_type, num_days, data_version)`, where the data version pairs the stock data
+    and prediction versions of the symbol in the response cache.
+    """
+    __slots__ = ('id', 'key', 'status', 'error', 'future')
+
+    def __init__(self, key):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.status = QUEUED
+        self.error = None
+        self.future = None
+
+    def to_dict(self):
+        symbol, model_type, num_days, data_version = self.key
+        job = {
+            'job_id': self.id,
+            'status': self.status,
+            'symbol': symbol,
+            'model_type': model_type,
+            'num_days': num_days
+        }
+        if self.error is not None:
+            job['Error Message'] = self.error
+        return job
+
+
+_jobs = OrderedDict()
+_jobs_by_key = {}
+_reports = OrderedDict()
+_lock = threading.Lock()
+_executor = None
+
+
+def submit(symbol, model_type, num_days):
+    """Queues the rendering of a prediction report. Requests for a report that is already
+    rendered or being rendered for the same data get the existing job.
+
+    Args:
+        symbol (str): The symbol of the stock
+        model_type (str): The name of the prediction model
+        num_days (int): The number of predicted days in the report
+
+    Returns:
+        ReportJob: The job rendering the report
+    """
+    # Refreshing the data here lets the version below capture any newly fetched rows
+    stock_data_query.refresh_data(symbol)
+    data_version = (
+        response_cache.data_version(symbol, response_cache.STOCK_DATA),
+        response_cache.data_version(symbol, response_cache.PREDICTIONS)
+    )
+    key = (symbol, model_type, num_days, data_version)
+    
+    with _lock:
+        job_id = _jobs_by_key.get(key)
+        if job_id in _jobs and _is_reusable(_jobs[job_id]):
+            return _jobs[job_id]
+        
+        job = ReportJob(key)
+        _jobs[job.id] = job
+        _jobs_by_key[key] = job.id
+        _prune_jobs()
+        
+        if key in _reports:
+            job.status = DONE
+            _reports.move_to_end(key)
+        else:
+            job.future = _get_executor().submit(_render, job)
+    
+    return job
+
+
+def get(job_id):
+    """Returns the job with the given id, or None if it is unknown or was pruned."""
+    with _lock:
+        return _jobs.get(job_id)
+
+
+def get_report(job_id):
+    """Returns the rendered PDF of a finished job as bytes, or None if it isn't available."""
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None or job.status != DONE:
+            return None
+        return _reports.get(job.key)
+
+
+def wait(job, timeout=None):
+    """Blocks until the job finishes and returns its rendered PDF.
+
+    Raises:
+        Exception: If the job failed or the report was evicted from the cache
+    """
+    if job.future is not None:
+        job.future.result(timeout=timeout)
+    if job.status == FAILED:
+        raise Exception(job.error)
+    
+    report = get_report(job.id)
+    if report is None:
+        raise Exception('The report is no longer available. Please request it again.')
+    return report
+
+
+def _render(job):
+    symbol, model_type, num_days, data_version = job.key
+    with _lock:
+        job.status = RUNNING
+    try:
+        sections = linear_regression.get_prediction_sections(symbol=symbol, model_type=model_type, predict_num_days=num_days)
+        
+        pdf_buffer = linear_regression.generate_report(
+            sections['requested_predicted_data'], sections['all_predicted_data'], sections['all_actual_data']
+        )
+        
+        with _lock:
+            _reports[job.key] = pdf_buffer.getvalue()
+            while len(_reports) > settings.REPORT_CACHE_MAX_ENTRIES:
+                _reports.popitem(last=False)
+            job.status = DONE
+    
+    except Exception as e:
+        with _lock:
+            job.error = e.__str__()
+            job.status = FAILED
+    
+    finally:
+        # Worker threads don't go through the request cycle that closes connections
+        connection.close()
+
+
+def _is_reusable(job):
+    # Finished jobs are only as good as their report, which may have been evicted
+    if job.status == DONE:
+        return job.key in _reports
+    return job.status != FAILED
+
+
+def _prune_jobs():
+    while len(_jobs) > settings.REPORT_JOBS_MAX_ENTRIES:
+        oldest_id = next(iter(_jobs))
+        if _jobs[oldest_id].status in (QUEUED, RUNNING):
+            break
+        oldest = _jobs.pop(oldest_id)
+        if _jobs_by_key.get(oldest.key) == oldest_id:
+            del _jobs_by_key[oldest.key]
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.REPORT_WORKERS, thread_name_prefix='report')
+    return _executor
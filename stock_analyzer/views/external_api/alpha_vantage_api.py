@@ -1,40 +1,228 @@
+from stock_analyzer.views.external_api import rate_limiter
+
+from django.conf import settings
+from django.core.cache import caches
+
+import asyncio
 import os
+import random
+import threading
+import time
+import weakref
+import httpx
 import requests
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 
 load_dotenv()
 
+SECONDS_PER_MINUTE = 60
+SECONDS_PER_DAY = 24 * 60 * 60
+
+# Cache the calls made with the API key are counted in, see settings.CACHES
+QUOTA_CACHE_ALIAS = 'rate_limits'
+
+# Responses retried by the sync session and the async client alike
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+RATE_LIMIT_MESSAGE = 'Alpha Vantage rate limit reached. Only previously queried stock symbols can be analyzed.'
+
+_session = None
+_scheduler = None
+# httpx clients can only be used on the event loop that created them
+_async_clients = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
 
-def get_time_series_daily(symbol, output_size='compact'):
+
+def get_time_series_daily(symbol, output_size='compact', priority=rate_limiter.INTERACTIVE):
     """This function queries the Alpha Vantage API to get the Time Series Daily
     of a given stock symbol
+    
+    Calls share one pooled HTTP session and are scheduled to stay within the per-minute
+    and per-day limits of the API, interactive calls before batch ones. The calls of every
+    process are counted in the shared rate limit cache. A rate limit response from the API
+    is retried with exponential backoff.
 
     Args:
         symbol (str): The symbol of the stock to be queries
         output_size (str): 'compact' or 'full' are accepted. Query param for the API call
+        priority (int): rate_limiter.INTERACTIVE or rate_limiter.BATCH
 
     Returns:
         JsonObject: The unedited JSON response data from the API call
     """
     try:
-        query_params = {
-            'function': 'TIME_SERIES_DAILY',
-            'symbol': symbol,
-            'outputsize': output_size,
-            'datatype': 'json',
-            'apikey':  os.getenv('ALPHA_VANTAGE_API_KEY')
-        }
-        url = 'https://www.alphavantage.co/query'
-        response = requests.get(url, params=query_params)
-        data = response.json()
+        query_params = _query_params(symbol, output_size)
         
-        if 'Error Message' in data:
-            raise Exception('Invalid stock symbol. Please enter a valid stock symbol.')
-        if 'Information' in data:
-            raise Exception('Alpha Vantage rate limit reached. Only previously queried stock symbols can be analyzed.')
+        for attempt in range(settings.ALPHA_VANTAGE_MAX_RETRIES + 1):
+            data = _get(query_params, priority, retry=attempt > 0)
+            if 'Information' not in data:
+                break
+            
+            get_scheduler().drain()
+            if attempt < settings.ALPHA_VANTAGE_MAX_RETRIES:
+                time.sleep(_backoff_seconds(attempt))
         
+        _raise_for_error(data)
         return data
 
+    except rate_limiter.RateLimitExceeded as e:
+        raise Exception(RATE_LIMIT_MESSAGE) from e
     except Exception as e:
         raise Exception(e.__str__()) from e
+
+
+async def aget_time_series_daily(symbol, output_size='compact', priority=rate_limiter.INTERACTIVE):
+    """The async variant of `get_time_series_daily`. Calls are made with a pooled httpx client
+    and share the rate limit scheduler of the synchronous calls.
+
+    Args:
+        symbol (str): The symbol of the stock to be queries
+        output_size (str): 'compact' or 'full' are accepted. Query param for the API call
+        priority (int): rate_limiter.INTERACTIVE or rate_limiter.BATCH
+
+    Returns:
+        JsonObject: The unedited JSON response data from the API call
+    """
+    try:
+        query_params = _query_params(symbol, output_size)
+        
+        for attempt in range(settings.ALPHA_VANTAGE_MAX_RETRIES + 1):
+            data = await _aget(query_params, priority, retry=attempt > 0)
+            if 'Information' not in data:
+                break
+            
+            get_scheduler().drain()
+            if attempt < settings.ALPHA_VANTAGE_MAX_RETRIES:
+                await asyncio.sleep(_backoff_seconds(attempt))
+        
+        _raise_for_error(data)
+        return data
+
+    except rate_limiter.RateLimitExceeded as e:
+        raise Exception(RATE_LIMIT_MESSAGE) from e
+    except Exception as e:
+        raise Exception(e.__str__()) from e
+
+
+def get_scheduler():
+    """Returns the scheduler shared by every call to the API in this process, created from the
+    settings. It counts the calls against the quota shared with the other processes.
+    """
+    global _scheduler
+    with _lock:
+        if _scheduler is None:
+            limits = [
+                (settings.ALPHA_VANTAGE_REQUESTS_PER_MINUTE, SECONDS_PER_MINUTE),
+                (settings.ALPHA_VANTAGE_REQUESTS_PER_DAY, SECONDS_PER_DAY)
+            ]
+            quota = rate_limiter.SharedQuota(caches[QUOTA_CACHE_ALIAS], 'alpha_vantage', limits)
+            _scheduler = rate_limiter.RateLimitScheduler(limits, quota=quota)
+        return _scheduler
+
+
+def get_session():
+    """Returns the HTTP session shared by every call to the API, which keeps connections alive
+    and retries connection errors, 429 and 5xx responses.
+    """
+    global _session
+    with _lock:
+        if _session is None:
+            retry = Retry(
+                total=settings.ALPHA_VANTAGE_MAX_RETRIES,
+                backoff_factor=settings.ALPHA_VANTAGE_BACKOFF_SECONDS,
+                status_forcelist=RETRY_STATUSES,
+                allowed_methods=('GET',)
+            )
+            adapter = HTTPAdapter(
+                pool_connections=1,
+                pool_maxsize=settings.ALPHA_VANTAGE_POOL_SIZE,
+                max_retries=retry
+            )
+            _session = requests.Session()
+            _session.mount('http://', adapter)
+            _session.mount('https://', adapter)
+        return _session
+
+
+def get_async_client():
+    """Returns the httpx client shared by the async calls made on the running event loop. Its
+    transport doesn't retry, failed calls are retried like the session's by `_aget`.
+    """
+    loop = asyncio.get_running_loop()
+    with _lock:
+        client = _async_clients.get(loop)
+        if client is None:
+            transport = httpx.AsyncHTTPTransport(
+                limits=httpx.Limits(
+                    max_connections=settings.ALPHA_VANTAGE_POOL_SIZE,
+                    max_keepalive_connections=settings.ALPHA_VANTAGE_POOL_SIZE
+                )
+            )
+            client = httpx.AsyncClient(
+                transport=transport,
+                timeout=httpx.Timeout(
+                    settings.ALPHA_VANTAGE_READ_TIMEOUT_SECONDS,
+                    connect=settings.ALPHA_VANTAGE_CONNECT_TIMEOUT_SECONDS
+                )
+            )
+            _async_clients[loop] = client
+        return client
+
+
+def _query_params(symbol, output_size):
+    return {
+        'function': 'TIME_SERIES_DAILY',
+        'symbol': symbol,
+        'outputsize': output_size,
+        'datatype': 'json',
+        'apikey':  os.getenv('ALPHA_VANTAGE_API_KEY')
+    }
+
+
+def _raise_for_error(data):
+    if 'Error Message' in data:
+        raise Exception('Invalid stock symbol. Please enter a valid stock symbol.')
+    if 'Information' in data:
+        raise Exception(RATE_LIMIT_MESSAGE)
+
+
+def _get(query_params, priority, retry=False):
+    get_scheduler().acquire(priority, timeout=settings.ALPHA_VANTAGE_QUEUE_TIMEOUT_SECONDS, retry=retry)
+    response = get_session().get(
+        settings.ALPHA_VANTAGE_BASE_URL,
+        params=query_params,
+        timeout=(settings.ALPHA_VANTAGE_CONNECT_TIMEOUT_SECONDS, settings.ALPHA_VANTAGE_READ_TIMEOUT_SECONDS)
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+async def _aget(query_params, priority, retry=False):
+    # The scheduler blocks while waiting for a token, so it waits in a worker thread
+    await asyncio.to_thread(
+        get_scheduler().acquire, priority, settings.ALPHA_VANTAGE_QUEUE_TIMEOUT_SECONDS, retry
+    )
+    
+    # Retries the connection errors and responses the session's Retry does
+    for attempt in range(settings.ALPHA_VANTAGE_MAX_RETRIES + 1):
+        last_attempt = attempt == settings.ALPHA_VANTAGE_MAX_RETRIES
+        try:
+            response = await get_async_client().get(settings.ALPHA_VANTAGE_BASE_URL, params=query_params)
+        except httpx.TransportError:
+            if last_attempt:
+                raise
+        else:
+            if response.status_code not in RETRY_STATUSES or last_attempt:
+                break
+        await asyncio.sleep(_backoff_seconds(attempt))
+    
+    response.raise_for_status()
+    return response.json()
+
+
+def _backoff_seconds(attempt):
+    # Full jitter keeps workers that were throttled together from retrying together
+    return random.uniform(0, settings.ALPHA_VANTAGE_BACKOFF_SECONDS * 2 ** attempt)
@@ -0,0 +1,178 @@
+import heapq
+import itertools
+import threading
+import time
+
+
+# Lower values are scheduled first
+INTERACTIVE = 0
+BATCH = 1
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a call can't be scheduled before its timeout."""
+
+
+class TokenBucket:
+    """Allows bursts of up to `capacity` calls and refills continuously at `capacity` calls
+    per `period` seconds.
+
+    Args:
+        capacity (int): The number of calls allowed per period
+        period (float): The length of the period in seconds
+        clock (callable, optional): Returns the current time in seconds. Defaults to time.monotonic.
+    """
+
+    def __init__(self, capacity, period, clock=time.monotonic):
+        self.capacity = capacity
+        self.period = period
+        self.rate = capacity / period
+        self.tokens = capacity
+        self._clock = clock
+        self._updated = clock()
+
+    def wait_time(self):
+        """Returns the seconds until a token is available, 0 if one is available now."""
+        self._refill()
+        return 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self._refill()
+        self.tokens -= 1
+
+    def drain(self):
+        """Empties the bucket, so the next call waits for a token to be refilled."""
+        self._refill()
+        self.tokens = min(self.tokens, 0)
+
+    def _refill(self):
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+class SharedQuota:
+    """Counts the calls made in the current window of every limit in a cache shared by all the
+    processes using an API key, so together they stay within its limits. Windows start at
+    multiples of their period since the epoch, so every process agrees on them.
+    
+    The file and database caches increment counts with a read and a write, so processes calling
+    at the same moment can rarely be counted once. Memcached and Redis count atomically.
+
+    Args:
+        cache (BaseCache): The Django cache shared by the processes
+        key_prefix (str): Prefix of the cache keys of the counts
+        limits (list[tuple]): A (calls, period in seconds) pair for every limit, shortest period first
+        clock (callable, optional): Returns the wall clock time in seconds. Defaults to time.time.
+    """
+
+    def __init__(self, cache, key_prefix, limits, clock=time.time):
+        self.cache = cache
+        self.key_prefix = key_prefix
+        self.limits = limits
+        self._clock = clock
+
+    def reserve(self, count=None):
+        """Counts a call against the first `count` limits, all of them by default.
+
+        Returns:
+            float: 0 if the call was counted, else the seconds until the full window ends.
+                The call is then not counted against any limit.
+        """
+        now = self._clock()
+        counted = []
+        for calls, period in self.limits[:count]:
+            key = self._key(period, now)
+            counted.append(key)
+            if self._increment(key, period) > calls:
+                for key in counted:
+                    self.cache.decr(key)
+                return (now // period + 1) * period - now
+        return 0
+
+    def _key(self, period, now):
+        return f'{self.key_prefix}:{period}:{int(now // period)}'
+
+    def _increment(self, key, period):
+        # The count expires with its window
+        self.cache.add(key, 0, timeout=period)
+        try:
+            return self.cache.incr(key)
+        except ValueError:
+            # The window ended between the add and the increment
+            self.cache.add(key, 1, timeout=period)
+            return 1
+
+
+class RateLimitScheduler:
+    """Schedules calls to a rate limited API so every limit is respected. Waiting calls are
+    served by priority, then in arrival order.
+
+    Args:
+        limits (list[tuple]): A (calls, period in seconds) pair for every limit, shortest period first
+        clock (callable, optional): Returns the current time in seconds. Defaults to time.monotonic.
+        quota (SharedQuota, optional): Counts the calls of every process against the same limits.
+            Defaults to None, which gives this scheduler the whole of every limit.
+    """
+
+    def __init__(self, limits, clock=time.monotonic, quota=None):
+        self.buckets = [TokenBucket(capacity, period, clock) for capacity, period in limits]
+        self.quota = quota
+        self._clock = clock
+        self._condition = threading.Condition()
+        self._waiting = []
+        self._sequence = itertools.count()
+
+    def acquire(self, priority=INTERACTIVE, timeout=None, retry=False):
+        """Blocks until the call may be made.
+
+        Args:
+            priority (int, optional): INTERACTIVE or BATCH. Defaults to INTERACTIVE.
+            timeout (float, optional): The maximum seconds to wait. Defaults to None (no limit).
+            retry (bool, optional): Whether the call retries one the API refused for hitting its
+                limit. Refused calls don't use up the longer period limits, so retries only count
+                against the shortest one. Defaults to False.
+
+        Raises:
+            RateLimitExceeded: If no call can be made before the timeout
+        """
+        ticket = (priority, next(self._sequence))
+        deadline = None if timeout is None else self._clock() + timeout
+        buckets = self.buckets[:1] if retry else self.buckets
+        
+        with self._condition:
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    wait = max(bucket.wait_time() for bucket in buckets)
+                    if wait == 0 and self._waiting[0] == ticket:
+                        if self.quota is not None:
+                            wait = self.quota.reserve(len(buckets))
+                        if wait == 0:
+                            for bucket in buckets:
+                                bucket.take()
+                            return
+                    
+                    remaining = None if deadline is None else deadline - self._clock()
+                    # Fail fast when the wait is longer than the timeout, e.g. the daily quota is spent
+                    if remaining is not None and (remaining <= 0 or wait > remaining):
+                        raise RateLimitExceeded(f'No call can be made in the next {timeout} seconds')
+                    
+                    # Calls behind a higher priority one are woken up when it is served
+                    self._condition.wait(wait or remaining)
+            finally:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._condition.notify_all()
+
+    def drain(self):
+        """Empties the shortest period bucket after the API reported its limit was hit anyway,
+        e.g. because the API key is also used elsewhere.
+        """
+        with self._condition:
+            self.buckets[0].drain()
+
+    def pending(self):
+        """Returns the number of waiting calls."""
+        with self._condition:
+            return len(self._waiting)
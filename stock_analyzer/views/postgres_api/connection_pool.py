@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.db import connections
+
+
+def stats(alias='default'):
+    """Returns the connection mode of a database and, when it uses a psycopg pool, the pool's
+    size, utilization, checkout and wait time counters since it was opened. Connections the
+    pool is opening while it grows count as in use.
+
+    Args:
+        alias (str, optional): The alias of the database. Defaults to 'default'.
+
+    Returns:
+        dict: The pool metrics
+    """
+    connection = connections[alias]
+    data = {
+        'mode': settings.POSTGRES_POOL_MODE,
+        'conn_max_age': connection.settings_dict.get('CONN_MAX_AGE', 0),
+        'health_checks': connection.settings_dict.get('CONN_HEALTH_CHECKS', False)
+    }
+    
+    pool = getattr(connection, 'pool', None)
+    if pool is None:
+        return data
+    
+    pool_stats = pool.get_stats()
+    in_use = pool_stats['pool_size'] - pool_stats['pool_available']
+    queued = pool_stats.get('requests_queued', 0)
+    data.update({
+        'min_size': pool_stats['pool_min'],
+        'max_size': pool_stats['pool_max'],
+        'size': pool_stats['pool_size'],
+        'available': pool_stats['pool_available'],
+        'in_use': in_use,
+        'utilization': in_use / pool_stats['pool_max'],
+        'waiting': pool_stats.get('requests_waiting', 0),
+        'checkouts': pool_stats.get('requests_num', 0),
+        'queued_checkouts': queued,
+        'wait_ms_total': pool_stats.get('requests_wait_ms', 0),
+        'wait_ms_mean': pool_stats.get('requests_wait_ms', 0) / queued if queued else 0.0,
+        'checkout_errors': pool_stats.get('requests_errors', 0),
+        'connections_opened': pool_stats.get('connections_num', 0),
+        'connection_errors': pool_stats.get('connections_errors', 0)
+    })
+    return data
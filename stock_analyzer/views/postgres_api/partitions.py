@@ -0,0 +1,132 @@
+from django.db import connection, transaction
+
+from datetime import date
+import re
+import threading
+
+
+# The stock data table is range partitioned by date on Postgres, one partition per year.
+# Rows outside every yearly partition land in the default partition.
+TABLE = 'stock_analyzer_stockdata'
+DEFAULT_PARTITION = f'{TABLE}_default'
+
+_PARTITION_PATTERN = re.compile(rf'^{TABLE}_y(\d{{4}})$')
+
+# Whether the table is partitioned and the years whose partition is known to exist,
+# loaded from the catalog on first use
+_partitioned = None
+_known_years = set()
+_lock = threading.Lock()
+
+
+def partition_name(year):
+    return f'{TABLE}_y{year}'
+
+
+def is_partitioned():
+    """Checks if the stock data table is a partitioned Postgres table."""
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass', [TABLE])
+        return cursor.fetchone() is not None
+
+
+def partition_years():
+    """Returns the years that have a partition, read from the catalog."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT child.relname FROM pg_inherits '
+            'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+            'WHERE pg_inherits.inhparent = %s::regclass',
+            [TABLE]
+        )
+        return {
+            int(match.group(1))
+            for (name,) in cursor.fetchall()
+            if (match := _PARTITION_PATTERN.match(name))
+        }
+
+
+def ensure_partitions(years):
+    """Creates the yearly partitions missing for the given years. Does nothing when the table
+    isn't partitioned. Must be called inside a transaction, before the rows are inserted.
+
+    Args:
+        years (Iterable[int]): The years of the rows about to be stored
+    """
+    global _partitioned
+
+    with _lock:
+        if _partitioned is None:
+            _partitioned = is_partitioned()
+            _known_years.update(partition_years() if _partitioned else ())
+        if not _partitioned:
+            return
+        missing = set(years) - _known_years
+    if not missing:
+        return
+
+    with connection.cursor() as cursor:
+        # Serializes partition creation between processes, released when the transaction ends
+        cursor.execute('SELECT pg_advisory_xact_lock(hashtext(%s))', [TABLE])
+        existing = partition_years()
+        for year in sorted(missing - existing):
+            create_partition(cursor, year)
+
+    # A rolled back transaction drops the partitions it created
+    transaction.on_commit(lambda: _remember(missing))
+
+
+def create_partition(cursor, year):
+    """Creates the partition of a year, moving the rows of that year out of the default partition.
+
+    Args:
+        cursor (CursorWrapper): A cursor inside a transaction
+        year (int): The year of the partition
+    """
+    name = partition_name(year)
+    start, end = date(year, 1, 1), date(year + 1, 1, 1)
+
+    # Attaching a partition fails while the default partition holds rows of its range
+    cursor.execute(f'CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS)')
+    cursor.execute(
+        f'WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE date >= %s AND date < %s RETURNING *) '
+        f'INSERT INTO {name} SELECT * FROM moved',
+        [start, end]
+    )
+    cursor.execute(f'ALTER TABLE {TABLE} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)', [start, end])
+
+
+def drop_partitions_before(cutoff_date):
+    """Drops the yearly partitions whose every day is before the cutoff date.
+
+    Args:
+        cutoff_date (date): The first day of stock data to keep
+
+    Returns:
+        list[int]: The years whose partition was dropped
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_xact_lock(hashtext(%s))', [TABLE])
+        expired = sorted(year for year in partition_years() if year < cutoff_date.year)
+        for year in expired:
+            cursor.execute(f'DROP TABLE {partition_name(year)}')
+        cursor.execute(f'DELETE FROM {DEFAULT_PARTITION} WHERE date < %s', [cutoff_date])
+
+    with _lock:
+        _known_years.difference_update(expired)
+    return expired
+
+
+def reset():
+    """Forgets the known partitions so they are read from the catalog again."""
+    global _partitioned
+    with _lock:
+        _partitioned = None
+        _known_years.clear()
+
+
+def _remember(years):
+    with _lock:
+        _known_years.update(years)
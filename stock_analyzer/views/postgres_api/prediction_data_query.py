@@ -1,5 +1,8 @@
 from stock_analyzer.models.prediction_data import PredictionData
-from stock_analyzer.serializers.prediction_data import PredictionDataSerializer
+from stock_analyzer.serializers.prediction_data import PredictionDataValuesSerializer
+from stock_analyzer.views.data_cache import response_cache
+
+from django.db import transaction
 
 from datetime import timedelta
 
@@ -11,43 +14,74 @@ def get_all_prediction_data(symbol, model_type, date_desc=False):
         symbol=symbol, model_type=model_type
     ).order_by(f'{date_order}date')
     
-    prediction_data_serializer = PredictionDataSerializer(prediction_data, many=True)
+    prediction_data_serializer = PredictionDataValuesSerializer(prediction_data)
     return prediction_data_serializer.data
 
 
-def save_predictions(symbol, model_type, predict_num_days, most_recent_date, predictions):
-    for i in range(predict_num_days):
-        prediction_date = most_recent_date + timedelta(days=i + 1)
+def save_predictions(symbol, model_type, predict_num_days, most_recent_date, predictions, stored_predictions=None):
+    """Stores the predictions of the `predict_num_days` days following `most_recent_date`.
+    Dates that already have a stored prediction for the model keep it, including ones stored
+    by a concurrent request. The stored predictions are looked up with one query, and the new
+    ones written with one bulk insert and read back with one query, in one transaction.
+
+    Args:
+        symbol (str): The symbol of the predicted stock
+        model_type (str): The name of the model that made the predictions
+        predict_num_days (int): The number of predicted days
+        most_recent_date (date): The date of the last actual stock data the model was fitted on
+        predictions (dict): Arrays of `predict_num_days` values keyed by 'open', 'high', 'low', 'close' and 'volume'
+        stored_predictions (list[dict], optional): The serialized stored predictions of the symbol
+            and model, already read by the caller. Defaults to None (looked up in the PostgresDB).
+
+    Returns:
+        dict[]: The stored predictions of the requested days, sorted by date
+    """
+    prediction_dates = [most_recent_date + timedelta(days=i + 1) for i in range(predict_num_days)]
+    if not prediction_dates:
+        return []
+    
+    with transaction.atomic():
+        if stored_predictions is None:
+            stored_predictions = PredictionDataValuesSerializer(PredictionData.objects.filter(
+                symbol=symbol,
+                model_type=model_type,
+                date__range=(prediction_dates[0], prediction_dates[-1])
+            )).data
         
-        existing_prediction = PredictionData.objects.filter(
-            symbol=symbol, 
-            model_type=model_type,
-            date=prediction_date
-        ).exists()
+        requested_dates = { prediction_date.isoformat() for prediction_date in prediction_dates }
+        stored_predictions = {
+            prediction['date']: prediction
+            for prediction in stored_predictions
+            if prediction['date'] in requested_dates
+        }
         
-        if existing_prediction:
-            continue
+        new_predictions = [
+            PredictionData(
+                symbol=symbol,
+                date=prediction_date,
+                open=float(predictions['open'][i]),
+                high=float(predictions['high'][i]),
+                low=float(predictions['low'][i]),
+                close=float(predictions['close'][i]),
+                volume=int(predictions['volume'][i]),
+                model_type=model_type
+            )
+            for i, prediction_date in enumerate(prediction_dates)
+            if prediction_date.isoformat() not in stored_predictions
+        ]
+        
+        if new_predictions:
+            # A concurrent request may store some of the same dates first, its predictions are
+            # kept. The new dates are read back, which also returns the primary keys of the rows.
+            PredictionData.objects.bulk_create(new_predictions, ignore_conflicts=True)
+            new_predictions = PredictionDataValuesSerializer(PredictionData.objects.filter(
+                symbol=symbol,
+                model_type=model_type,
+                date__in=[prediction.date for prediction in new_predictions]
+            )).data
             
-        prediction = PredictionData(
-            symbol=symbol,
-            date=prediction_date,
-            open=predictions['open'][i],
-            high=predictions['high'][i],
-            low=predictions['low'][i],
-            close=predictions['close'][i],
-            volume=predictions['volume'][i],
-            model_type=model_type
-        )
-        prediction.save()
-
-
-    start_date = most_recent_date + timedelta(days=1)
-    end_date = start_date + timedelta(days=predict_num_days)
-    
-    prediction_data = PredictionData.objects.filter(
-        symbol=symbol,
-        date__range=(start_date, end_date)
-    ).order_by('date')
+            # Cached prediction responses list the stored predictions of the symbol
+            transaction.on_commit(lambda: response_cache.invalidate(symbol, response_cache.PREDICTIONS))
     
-    prediction_data_serializer = PredictionDataSerializer(prediction_data, many=True)
-    return prediction_data_serializer.data
+    prediction_data = list(stored_predictions.values()) + new_predictions
+    return sorted(prediction_data, key=lambda prediction: prediction['date'])
@@ -1,13 +1,30 @@
 from stock_analyzer.models.stock_data import StockData
 from stock_analyzer.views.external_api import alpha_vantage_api
-from stock_analyzer.serializers.stock_data import StockDataSerializer
+from stock_analyzer.views.external_api import rate_limiter
+from stock_analyzer.views.postgres_api import partitions
+from stock_analyzer.views.storage import registry
+from stock_analyzer.views.data_cache import freshness
+from stock_analyzer.views.data_cache import price_cache
+from stock_analyzer.views.data_cache import indicator_store
+from stock_analyzer.views.data_cache import response_cache
+from stock_analyzer.serializers.stock_data import StockDataValuesSerializer
+
+from django.conf import settings
+from django.db import connection, transaction
+from asgiref.sync import sync_to_async
 
 from datetime import datetime, date
 from datetime import timedelta
+from operator import itemgetter
+import logging
+import time
+
+
+logger = logging.getLogger(__name__)
 
 
 def get_all_stock_data(symbol, date_desc=False):
-    """This function queries the PostgresDB to retrieve all entries of a given stock symbol
+    """This function reads all entries of a given stock symbol from the stock data backend
 
     Args:
         symbol (str): The symbol of the stock to be queried
@@ -18,12 +35,9 @@ def get_all_stock_data(symbol, date_desc=False):
     try:
         refresh_data(symbol=symbol)
         
-        date_order = '' if not date_desc else '-'
+        columns = registry.get_backend().read_columns(symbol, date_desc=date_desc)
         
-        stock_data = StockData.objects.filter(
-            symbol=symbol).order_by(f'{date_order}date')
-        
-        stock_data_serializer = StockDataSerializer(stock_data, many=True)
+        stock_data_serializer = StockDataValuesSerializer(_rows(columns))
         return stock_data_serializer.data
     
     except Exception as e:
@@ -31,7 +45,7 @@ def get_all_stock_data(symbol, date_desc=False):
 
 
 def get_stock_data_from_date_range(symbol, start_date, end_date=None, date_desc=False):
-    """This function queries the PostgresDB to retrieve all entries of a given stock symbol
+    """This function reads all entries of a given stock symbol from the stock data backend
     starting from a given date to the most recent.
 
     Args:
@@ -49,94 +63,422 @@ def get_stock_data_from_date_range(symbol, start_date, end_date=None, date_desc=
         if end_date is None:
             end_date = date.today()
         
-        date_order = '' if not date_desc else '-'
-        
-        stock_data_query_set = StockData.objects.filter(
-            symbol=symbol, 
-            date__range=(start_date, end_date)
-        ).order_by(f'{date_order}date').values()
+        columns = registry.get_backend().read_columns(
+            symbol, since=start_date, until=end_date + timedelta(days=1), date_desc=date_desc
+        )
         
-        stock_data_serializer = StockDataSerializer(stock_data_query_set, many=True)
+        stock_data_serializer = StockDataValuesSerializer(_rows(columns))
         return stock_data_serializer.data
     
     except Exception as e:
         raise Exception(e) from e
 
 
-def refresh_data(symbol):
+def get_stock_data_page(symbol, since=None, until=None, limit=None, date_desc=True):
+    """This function reads one page of entries of a given stock symbol from the stock data backend.
+    With descending dates, the next page starts at `until` = the date of the last returned entry.
+
+    Args:
+        symbol (str): The symbol of the stock to be queried
+        since (date, optional): Only entries on or after this date. Defaults to None (no lower bound).
+        until (date, optional): Only entries strictly before this date. Defaults to None (no upper bound).
+        limit (int, optional): The maximum number of entries. Defaults to None (no limit).
+        date_desc (bool, optional): Sort by descending date. Defaults to True.
+
+    Returns:
+        dict: A dictionary representation of the stock data
+    """
+    try:
+        refresh_data(symbol=symbol)
+        
+        columns = registry.get_backend().read_columns(symbol, since, until, limit, date_desc)
+        
+        stock_data_serializer = StockDataValuesSerializer(_rows(columns))
+        return stock_data_serializer.data
+    
+    except Exception as e:
+        raise Exception(e.__str__()) from e
+
+
+def get_stock_data_columns(symbol, since=None, until=None, limit=None, date_desc=True):
+    """This function reads one page of entries of a given stock symbol from the stock data backend
+    as columns. Arguments are the same as `get_stock_data_page`.
+
+    Returns:
+        dict: A list of values for every stock data field
+    """
+    try:
+        refresh_data(symbol=symbol)
+        
+        return registry.get_backend().read_columns(symbol, since, until, limit, date_desc)
+    
+    except Exception as e:
+        raise Exception(e.__str__()) from e
+
+
+def stream_stock_data(symbol, since=None, until=None, limit=None, date_desc=True, chunk_size=2000):
+    """This function refreshes the data of a given stock symbol and returns an iterator over its
+    entries that reads them from the PostgresDB `chunk_size` rows at a time, so the whole history
+    is never held in memory. Arguments are the same as `get_stock_data_page`.
+
+    Returns:
+        iterator: Lists of at most `chunk_size` entries, each a dict of the stock data fields
+    """
+    try:
+        refresh_data(symbol=symbol)
+    
+    except Exception as e:
+        raise Exception(e.__str__()) from e
+    
+    stock_data = _filter_stock_data(symbol, since, until, date_desc)[:limit].values_list(
+        *StockDataValuesSerializer.fields
+    )
+    chunks = _chunked(stock_data.iterator(chunk_size=chunk_size), chunk_size)
+    return (StockDataValuesSerializer(chunk).data for chunk in chunks)
+
+
+async def aget_stock_data_page(symbol, since=None, until=None, limit=None, date_desc=True):
+    """The async variant of `get_stock_data_page`, reading with the async ORM."""
+    try:
+        await arefresh_data(symbol=symbol)
+        
+        stock_data = _filter_stock_data(symbol, since, until, date_desc)[:limit].values_list(
+            *StockDataValuesSerializer.fields
+        )
+        
+        stock_data_serializer = StockDataValuesSerializer([row async for row in stock_data])
+        return stock_data_serializer.data
+    
+    except Exception as e:
+        raise Exception(e.__str__()) from e
+
+
+async def aget_stock_data_columns(symbol, since=None, until=None, limit=None, date_desc=True):
+    """The async variant of `get_stock_data_columns`, reading with the async ORM."""
+    try:
+        await arefresh_data(symbol=symbol)
+        
+        fields = StockDataValuesSerializer.fields
+        rows = _filter_stock_data(symbol, since, until, date_desc)[:limit].values_list(*fields)
+        
+        columns = list(zip(*[row async for row in rows])) or [()] * len(fields)
+        return dict(zip(fields, columns))
+    
+    except Exception as e:
+        raise Exception(e.__str__()) from e
+
+
+async def astream_stock_data(symbol, since=None, until=None, limit=None, date_desc=True, chunk_size=2000):
+    """The async variant of `stream_stock_data`, returning an async iterator."""
+    try:
+        await arefresh_data(symbol=symbol)
+    
+    except Exception as e:
+        raise Exception(e.__str__()) from e
+    
+    # values_list() runs its query as soon as an iterator is created, which aiterator() does on
+    # the event loop, so the rows are read as dicts and turned into tuples
+    fields = StockDataValuesSerializer.fields
+    stock_data = _filter_stock_data(symbol, since, until, date_desc)[:limit].values(*fields)
+    to_row = itemgetter(*fields)
+    
+    chunks = _achunked(stock_data.aiterator(chunk_size=chunk_size), chunk_size)
+    return (StockDataValuesSerializer(list(map(to_row, chunk))).data async for chunk in chunks)
+
+
+def _filter_stock_data(symbol, since, until, date_desc):
+    stock_data = StockData.objects.filter(symbol=symbol)
+    if since is not None:
+        stock_data = stock_data.filter(date__gte=since)
+    if until is not None:
+        stock_data = stock_data.filter(date__lt=until)
+    
+    date_order = '' if not date_desc else '-'
+    return stock_data.order_by(f'{date_order}date')
+
+
+def _rows(columns):
+    return list(zip(*columns.values()))
+
+
+def _chunked(rows, chunk_size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+async def _achunked(rows, chunk_size):
+    chunk = []
+    async for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def get_price_series(symbol):
+    """This function returns the full stored history of a given stock symbol as NumPy
+    arrays from the in-process price cache, refreshing the data first.
+
+    Args:
+        symbol (str): The symbol of the stock to be queried
+
+    Returns:
+        PriceSeries: The OHLCV columns of the stock sorted by ascending date
+    """
+    try:
+        refresh_data(symbol=symbol)
+        return price_cache.get(symbol)
+    
+    except Exception as e:
+        raise Exception(e.__str__()) from e
+
+
+def get_indicators(symbol, windows=()):
+    """This function returns the full stored price history of a given stock symbol with its
+    moving averages from the indicator store, refreshing the data first.
+
+    Args:
+        symbol (str): The symbol of the stock to be queried
+        windows (tuple[int], optional): The windows of the moving averages. Defaults to ().
+
+    Returns:
+        IndicatorSeries: The price and moving averages of the stock sorted by ascending date
+    """
+    try:
+        refresh_data(symbol=symbol)
+        return indicator_store.get(symbol, windows)
+    
+    except Exception as e:
+        raise Exception(e.__str__()) from e
+
+
+def refresh_data(symbol, priority=rate_limiter.INTERACTIVE):
     """This function queries the PostgresDB and checks if the most recent date for the
     given symbol is up to date. If it is not up to date or does not exist, fetch the
     stock data.
+    
+    Symbols confirmed up to date are skipped until the next market close, and concurrent
+    refreshes of the same symbol share a single fetch.
+
+    Args:
+        symbol (str): the symbol of the stock to be checked
+        priority (int): The priority of the fetch, rate_limiter.INTERACTIVE or rate_limiter.BATCH
+    """
+    try:
+        if freshness.is_fresh(symbol):
+            return
+        
+        with freshness.single_flight(symbol):
+            # Another request may have refreshed the symbol while this one was waiting
+            if freshness.is_fresh(symbol):
+                return
+            
+            most_recent_entry = StockData.objects.filter(symbol=symbol).order_by('-date').first()
+            today = datetime.now().date()
+            yesterday = today - timedelta(days=1)
+            
+            last_date = most_recent_entry.date if most_recent_entry else None
+            
+            # If stock has no entries
+            if not most_recent_entry:
+                stock_data_json = alpha_vantage_api.get_time_series_daily(
+                    symbol=symbol, output_size='full', priority=priority
+                )
+                last_date = save_daily_stock_data(stock_data_json)['last_date']
+                
+            # If stock has entries, but isn't up to date
+            elif (most_recent_entry.date != today and most_recent_entry.date != yesterday):
+                stock_data_json = alpha_vantage_api.get_time_series_daily(
+                    symbol=symbol, output_size='compact', priority=priority
+                )
+                last_date = _latest_date(last_date, save_daily_stock_data(stock_data_json)['last_date'])
+            
+            freshness.mark_fresh(symbol, last_date)
+            
+    except Exception as e:
+        raise Exception(e.__str__()) from e
+
+
+async def arefresh_data(symbol, priority=rate_limiter.INTERACTIVE):
+    """The async variant of `refresh_data`. The checks use the async ORM and the fetch the
+    async Alpha Vantage client. The ingestion runs in a worker thread since it needs a transaction.
 
     Args:
         symbol (str): the symbol of the stock to be checked
+        priority (int): The priority of the fetch, rate_limiter.INTERACTIVE or rate_limiter.BATCH
     """
     try:
-        most_recent_entry = StockData.objects.filter(symbol=symbol).order_by('-date').first()
-        today = datetime.now().date()
-        yesterday = today - timedelta(days=1)
-        
-        # If stock has no entries
-        if not most_recent_entry:
-            stock_data_json = alpha_vantage_api.get_time_series_daily(symbol=symbol, output_size='full')
-            save_daily_stock_data(stock_data_json)
+        if freshness.is_fresh(symbol):
+            return
+        
+        async with freshness.asingle_flight(symbol):
+            if freshness.is_fresh(symbol):
+                return
             
-        # If stock has entries, but isn't up to date
-        elif (most_recent_entry.date != today and most_recent_entry.date != yesterday):
-            # print('getting here')
-            # print(datetime.now())
-            # print(timezone.now())
-            # print(timezone.get_current_timezone())
-            # print(most_recent_entry.date)
-            # print(today)
-            # print(yesterday)
+            most_recent_entry = await StockData.objects.filter(symbol=symbol).order_by('-date').afirst()
+            today = datetime.now().date()
+            yesterday = today - timedelta(days=1)
             
-            stock_data_json = alpha_vantage_api.get_time_series_daily(symbol=symbol, output_size='compact')
-            save_daily_stock_data(stock_data_json)
+            output_size = None
+            if not most_recent_entry:
+                output_size = 'full'
+            elif (most_recent_entry.date != today and most_recent_entry.date != yesterday):
+                output_size = 'compact'
+            
+            last_date = most_recent_entry.date if most_recent_entry else None
+            if output_size is not None:
+                stock_data_json = await alpha_vantage_api.aget_time_series_daily(
+                    symbol=symbol, output_size=output_size, priority=priority
+                )
+                report = await sync_to_async(save_daily_stock_data)(stock_data_json)
+                last_date = _latest_date(last_date, report['last_date'])
+            
+            freshness.mark_fresh(symbol, last_date)
             
     except Exception as e:
         raise Exception(e.__str__()) from e
 
 
+def _latest_date(*dates):
+    return max((stock_date for stock_date in dates if stock_date is not None), default=None)
+
+
 def save_daily_stock_data(data):
     """This function takes the daily data of a certain stock symbol and parses it to create
     StockData objects to be written to the PostgresDB. Ignores duplicate `Symbol, Date` combinations.
     
+    The whole time series is parsed into column arrays in one pass, the dates already stored
+    are looked up with a single query and the missing rows are written with one bulk insert
+    inside a transaction. Ingestions of the same symbol take turns, so the rows reported as
+    inserted are the ones this call inserted.
+    
     Args:
         data (JsonObject): The JSON response data from querying the Alpha Vantage Time Series Daily API
+        
+    Returns:
+        dict: An ingestion report with the symbol, the number of rows inserted and skipped,
+              the most recent date of the response and the parse and write timings in seconds
     """
     try:
+        parse_start = time.perf_counter()
+        
         meta_data = data['Meta Data']
         time_series = data['Time Series (Daily)']
         
         symbol = meta_data['2. Symbol']
+        columns = parse_time_series(
+            time_series, start_date=date.today() - timedelta(days=settings.STOCK_DATA_RETENTION_DAYS)
+        )
         
-        for date_str, stock_data_json in time_series.items():
-            # Only add entries with unique Symbol, Date combination
-            # and entries that are within 2 years
-            date = datetime.strptime(date_str, '%Y-%m-%d').date()
-            two_years_ago = date.today() - timedelta(days=2*365)
+        parse_seconds = time.perf_counter() - parse_start
+        write_start = time.perf_counter()
+        
+        with transaction.atomic():
+            # A concurrent ingestion's uncommitted rows would be missed by the lookup below,
+            # and then silently skipped by the insert yet reported as inserted
+            _lock_symbol(symbol)
             
-            if (StockData.objects.filter(symbol=symbol, date=date).exists()
-                or date < two_years_ago):
-                break
+            # Only add entries with unique Symbol, Date combination
+            existing_dates = set()
+            if columns['date']:
+                existing_dates = set(StockData.objects.filter(
+                    symbol=symbol,
+                    date__range=(min(columns['date']), max(columns['date']))
+                ).values_list('date', flat=True))
             
-            open = float(stock_data_json['1. open'])
-            high = float(stock_data_json['2. high'])
-            low = float(stock_data_json['3. low'])
-            close = float(stock_data_json['4. close'])
-            volume = int(stock_data_json['5. volume'])
+            new_stock_data = [
+                StockData(
+                    symbol=symbol,
+                    date=stock_date,
+                    open=open,
+                    high=high,
+                    low=low,
+                    close=close,
+                    volume=volume
+                )
+                for stock_date, open, high, low, close, volume in zip(
+                    columns['date'], columns['open'], columns['high'],
+                    columns['low'], columns['close'], columns['volume']
+                )
+                if stock_date not in existing_dates
+            ]
+            partitions.ensure_partitions({ stock_data_obj.date.year for stock_data_obj in new_stock_data })
+            StockData.objects.bulk_create(new_stock_data, batch_size=1000, ignore_conflicts=True)
             
-            stock_data_obj = StockData(
-                symbol=symbol,
-                date=date,
-                open=open,
-                high=high,
-                low=low,
-                close=close,
-                volume=volume
-            )
-            stock_data_obj.save()
+            new_columns = {
+                field: [getattr(stock_data_obj, field) for stock_data_obj in new_stock_data]
+                for field in columns
+            }
+            transaction.on_commit(lambda: _on_rows_stored(symbol, new_columns))
+        
+        write_seconds = time.perf_counter() - write_start
+        
+        report = {
+            'symbol': symbol,
+            'inserted': len(new_stock_data),
+            'skipped': len(columns['date']) - len(new_stock_data),
+            'last_date': max(columns['date'], default=None),
+            'parse_seconds': parse_seconds,
+            'write_seconds': write_seconds
+        }
+        logger.info(
+            'Ingested %(symbol)s: %(inserted)d inserted, %(skipped)d skipped '
+            '(parse %(parse_seconds).4fs, write %(write_seconds).4fs)', report
+        )
+        return report
             
     except Exception as e:
         raise Exception('Error saving stock data to database.') from e
+
+
+def _lock_symbol(symbol):
+    # Held until the transaction ends
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(hashtext(%s))', [f'stock_data:{symbol}'])
+
+
+def _on_rows_stored(symbol, new_columns):
+    # Bring the other copies of the symbol's history up to date with the committed rows, the
+    # Parquet store before the data version changes as the caches then reload from it
+    if new_columns['date']:
+        registry.mirror_stored_rows(symbol, min(new_columns['date']))
+    version = response_cache.invalidate(symbol)
+    price_cache.patch(symbol, new_columns, version)
+    indicator_store.append(symbol, new_columns, version)
+
+
+def parse_time_series(time_series, start_date=None):
+    """Parses the `Time Series (Daily)` object of an Alpha Vantage response into typed
+    column lists in a single pass.
+
+    Args:
+        time_series (dict): Mapping of 'YYYY-MM-DD' strings to the daily OHLCV values
+        start_date (date, optional): Entries older than this date are dropped. Defaults to None (keep all).
+
+    Returns:
+        dict: Lists keyed by 'date', 'open', 'high', 'low', 'close' and 'volume'
+    """
+    columns = { 'date': [], 'open': [], 'high': [], 'low': [], 'close': [], 'volume': [] }
+    
+    for date_str, stock_data_json in time_series.items():
+        stock_date = date.fromisoformat(date_str)
+        if start_date is not None and stock_date < start_date:
+            continue
+        
+        columns['date'].append(stock_date)
+        columns['open'].append(float(stock_data_json['1. open']))
+        columns['high'].append(float(stock_data_json['2. high']))
+        columns['low'].append(float(stock_data_json['3. low']))
+        columns['close'].append(float(stock_data_json['4. close']))
+        columns['volume'].append(int(stock_data_json['5. volume']))
+    
+    return columns
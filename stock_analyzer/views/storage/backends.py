@@ -0,0 +1,89 @@
+from stock_analyzer.models.stock_data import StockData
+from stock_analyzer.serializers.stock_data import StockDataValuesSerializer
+
+
+FIELDS = StockDataValuesSerializer.fields
+SERIES_FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+
+class StockDataBackend:
+    """A store of the daily stock data that reads go through. Ingestion always writes the
+    PostgresDB first, the other backends are kept in sync from it after every commit.
+    """
+
+    def read_columns(self, symbol, since=None, until=None, limit=None, date_desc=False):
+        """Reads the entries of a stock symbol as columns.
+
+        Args:
+            symbol (str): The symbol of the stock
+            since (date, optional): Only entries on or after this date. Defaults to None (no lower bound).
+            until (date, optional): Only entries strictly before this date. Defaults to None (no upper bound).
+            limit (int, optional): The maximum number of entries. Defaults to None (no limit).
+            date_desc (bool, optional): Sort by descending date. Defaults to False.
+
+        Returns:
+            dict: A list of values for every field of `StockDataValuesSerializer`, dates as `datetime.date`
+        """
+        raise NotImplementedError
+
+    def read_series(self, symbols):
+        """Reads the full history of several stock symbols for the price cache.
+
+        Args:
+            symbols (list[str]): The symbols of the stocks
+
+        Returns:
+            dict: For every symbol, the 'dates' as proleptic Gregorian ordinals and the
+                  'open', 'high', 'low', 'close' and 'volume' columns, sorted by date
+        """
+        raise NotImplementedError
+
+    def write(self, symbol, columns):
+        """Replaces the stored history of a stock symbol. Backends that are read straight from
+        the PostgresDB don't need to store anything.
+
+        Args:
+            symbol (str): The symbol of the stock
+            columns (dict): The full history of the symbol, as returned by `read_columns`
+        """
+
+    def invalidate(self, symbol=None):
+        """Drops the stored history of a symbol, or of every symbol when none is given, so it
+        is rebuilt from the PostgresDB."""
+
+
+class PostgresBackend(StockDataBackend):
+    """Reads the stock data with the Django ORM."""
+
+    def read_columns(self, symbol, since=None, until=None, limit=None, date_desc=False):
+        stock_data = StockData.objects.filter(symbol=symbol)
+        if since is not None:
+            stock_data = stock_data.filter(date__gte=since)
+        if until is not None:
+            stock_data = stock_data.filter(date__lt=until)
+
+        date_order = '' if not date_desc else '-'
+        rows = stock_data.order_by(f'{date_order}date')[:limit].values_list(*FIELDS)
+
+        columns = [list(column) for column in zip(*rows)] or [[] for _ in FIELDS]
+        return dict(zip(FIELDS, columns))
+
+    def read_series(self, symbols):
+        rows = StockData.objects.filter(symbol__in=symbols).order_by('symbol', 'date').values_list(
+            'symbol', 'date', *SERIES_FIELDS
+        )
+        grouped = { symbol: [] for symbol in symbols }
+        for row in rows:
+            grouped[row[0]].append(row[1:])
+
+        loaded = {}
+        for symbol, symbol_rows in grouped.items():
+            if symbol_rows:
+                dates, open, high, low, close, volume = zip(*symbol_rows)
+                dates = [stock_date.toordinal() for stock_date in dates]
+            else:
+                dates = open = high = low = close = volume = ()
+            loaded[symbol] = {
+                'dates': dates, 'open': open, 'high': high, 'low': low, 'close': close, 'volume': volume
+            }
+        return loaded
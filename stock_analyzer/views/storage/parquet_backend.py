@@ -0,0 +1,199 @@
+from stock_analyzer.views.storage import backends
+from stock_analyzer.views.wire_format import arrow_ipc
+
+from collections import defaultdict
+from datetime import date
+from pathlib import Path
+from urllib.parse import quote, unquote
+import os
+import tempfile
+import threading
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+class ParquetBackend(backends.StockDataBackend):
+    """Keeps the history of every stock symbol in its own Parquet file, sorted by date and
+    written in row groups of about a year of bars. Files are memory-mapped when read and date
+    ranges are pushed down to the row group statistics, so a range only decodes the row
+    groups it overlaps. Symbols missing from the store are copied from `source` on their
+    first read.
+
+    Args:
+        directory (str): The directory of the files, created if missing
+        source (StockDataBackend, optional): The backend missing symbols are copied from. Defaults to None.
+    """
+    ROW_GROUP_SIZE = 256
+
+    def __init__(self, directory, source=None):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.source = source
+        self._symbol_locks = defaultdict(threading.Lock)
+        self._lock = threading.Lock()
+
+    def path(self, symbol):
+        # Symbols are quoted so they are always a single file name
+        return self.directory / f"{quote(symbol, safe='')}.parquet"
+
+    def read_columns(self, symbol, since=None, until=None, limit=None, date_desc=False):
+        table = self._read_table(symbol, since, until)
+        if date_desc:
+            if limit is not None:
+                table = table.slice(max(len(table) - limit, 0))
+            table = table.take(pa.array(range(len(table) - 1, -1, -1), type=pa.int64()))
+        elif limit is not None:
+            table = table.slice(0, limit)
+
+        # Going through NumPy is several times faster than `to_pylist`, datetime64[D] values
+        # convert to `datetime.date`
+        return { field: table.column(field).to_numpy().tolist() for field in backends.FIELDS }
+
+    def read_series(self, symbols):
+        loaded = {}
+        for symbol in symbols:
+            table = self._read_table(symbol)
+            loaded[symbol] = {
+                'dates': _ordinals(table.column('date')),
+                **{ field: table.column(field).to_numpy() for field in backends.SERIES_FIELDS }
+            }
+        return loaded
+
+    def write(self, symbol, columns):
+        table = arrow_ipc.columns_to_table(columns, arrow_ipc.STOCK_DATA_SCHEMA).sort_by('date')
+        with self._get_symbol_lock(symbol):
+            self._write_table(symbol, table)
+
+    def append(self, symbol, columns):
+        """Adds rows stored after the last one in the file of a symbol. A symbol not in the store
+        is copied from `source` first, rows already in the file are skipped and a symbol with new
+        rows dated before its last row is dropped so its next read rebuilds it. The rest of the
+        file is rewritten from its memory map, not read from `source` again.
+
+        Args:
+            symbol (str): The symbol the rows belong to
+            columns (dict): The values of every field of the rows
+        """
+        new_table = arrow_ipc.columns_to_table(columns, arrow_ipc.STOCK_DATA_SCHEMA).sort_by('date')
+        # Another process may copy the symbol from a snapshot without the rows meanwhile, so
+        # they are appended to whichever copy was created
+        if not self._copy_from_source(symbol):
+            return
+        with self._get_symbol_lock(symbol):
+            try:
+                modified = os.stat(self.path(symbol)).st_mtime_ns
+                table = pq.ParquetFile(self.path(symbol), memory_map=True).read()
+            except FileNotFoundError:
+                return
+
+            dates = _ordinals(table.column('date'))
+            new_dates = _ordinals(new_table.column('date'))
+            last = dates[-1] if len(dates) else -1
+            if not np.isin(new_dates[new_dates <= last], dates).all():
+                self.path(symbol).unlink(missing_ok=True)
+                return
+            new_table = new_table.filter(pa.array(new_dates > last))
+            if not len(new_table):
+                return
+            self._write_table(symbol, pa.concat_tables([table, new_table]), unless_modified_since=modified)
+
+    def invalidate(self, symbol=None):
+        if symbol is None:
+            for path in self.directory.glob('*.parquet'):
+                self.invalidate(unquote(path.name[:-len('.parquet')]))
+            return
+        with self._get_symbol_lock(symbol):
+            self.path(symbol).unlink(missing_ok=True)
+
+    def _read_table(self, symbol, since=None, until=None):
+        if not self.path(symbol).exists() and not self._copy_from_source(symbol):
+            return arrow_ipc.STOCK_DATA_SCHEMA.empty_table()
+
+        parquet_file = pq.ParquetFile(self.path(symbol), memory_map=True)
+        if since is None and until is None:
+            return parquet_file.read()
+
+        # Only decode the row groups whose date statistics overlap the range, then slice the
+        # sorted dates to the exact bounds
+        date_column = parquet_file.schema_arrow.get_field_index('date')
+        row_groups = []
+        for i in range(parquet_file.metadata.num_row_groups):
+            statistics = parquet_file.metadata.row_group(i).column(date_column).statistics
+            if statistics is None or (
+                (until is None or statistics.min < until) and (since is None or statistics.max >= since)
+            ):
+                row_groups.append(i)
+        table = parquet_file.read_row_groups(row_groups)
+
+        dates = _ordinals(table.column('date'))
+        start = np.searchsorted(dates, since.toordinal(), side='left') if since is not None else 0
+        end = np.searchsorted(dates, until.toordinal(), side='left') if until is not None else len(dates)
+        return table.slice(start, end - start)
+
+    def _copy_from_source(self, symbol):
+        with self._get_symbol_lock(symbol):
+            if self.path(symbol).exists():
+                return True
+            if self.source is None:
+                return False
+
+            columns = self.source.read_columns(symbol)
+            if not columns['date']:
+                return False
+            # Another process sharing the directory may have written a newer copy meanwhile
+            self._write_table(symbol, arrow_ipc.columns_to_table(columns, arrow_ipc.STOCK_DATA_SCHEMA), create=True)
+            return True
+
+    def _write_table(self, symbol, table, create=False, unless_modified_since=None):
+        """Writes the file of a symbol through a temporary file, so readers keep the old file
+        mapped until the new one atomically replaces it.
+
+        Args:
+            symbol (str): The symbol of the file
+            table (pyarrow.Table): The sorted rows of the symbol
+            create (bool, optional): Keep the file if one was created meanwhile. Defaults to False.
+            unless_modified_since (int, optional): The `st_mtime_ns` the file was read at. If it was
+                replaced since, both copies are dropped so the next read rebuilds the symbol.
+                Defaults to None.
+        """
+        path = self.path(symbol)
+        descriptor, temporary_path = tempfile.mkstemp(dir=self.directory, suffix='.parquet.tmp')
+        os.close(descriptor)
+        try:
+            pq.write_table(table, temporary_path, row_group_size=self.ROW_GROUP_SIZE)
+            if create:
+                # Linking fails instead of replacing an existing file
+                try:
+                    os.link(temporary_path, path)
+                except FileExistsError:
+                    pass
+                os.unlink(temporary_path)
+            elif unless_modified_since is not None and _modified_ns(path) != unless_modified_since:
+                os.unlink(temporary_path)
+                path.unlink(missing_ok=True)
+            else:
+                os.replace(temporary_path, path)
+        except BaseException:
+            if os.path.exists(temporary_path):
+                os.unlink(temporary_path)
+            raise
+
+    def _get_symbol_lock(self, symbol):
+        with self._lock:
+            return self._symbol_locks[symbol]
+
+
+def _modified_ns(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _ordinals(date_column):
+    # date32 values are days since the epoch
+    return date_column.cast(pa.int32()).to_numpy() + EPOCH_ORDINAL
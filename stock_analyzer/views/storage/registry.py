@@ -0,0 +1,59 @@
+from stock_analyzer.views.storage import backends
+from stock_analyzer.views.storage.parquet_backend import ParquetBackend
+
+from django.conf import settings
+
+import logging
+import threading
+
+
+logger = logging.getLogger(__name__)
+
+# One instance per backend and Parquet directory
+_backends = {}
+_lock = threading.Lock()
+
+
+def get_backend():
+    """Returns the backend of `STOCK_DATA_BACKEND` that stock data reads go through."""
+    if settings.STOCK_DATA_BACKEND == 'parquet':
+        return get_parquet_backend()
+    return _get_or_create('postgres', backends.PostgresBackend)
+
+
+def get_parquet_backend():
+    """Returns the Parquet store in `STOCK_DATA_PARQUET_DIR`, or None when it isn't set."""
+    directory = settings.STOCK_DATA_PARQUET_DIR
+    if not directory:
+        return None
+
+    return _get_or_create(
+        ('parquet', directory), lambda: ParquetBackend(directory, source=backends.PostgresBackend())
+    )
+
+
+def mirror_stored_rows(symbol, since):
+    """Appends the committed rows of a symbol from a date on to the Parquet store. Only those
+    rows are read from Postgres. A failed write drops the symbol from the store so its next
+    read rebuilds it.
+
+    Args:
+        symbol (str): The symbol whose rows were stored
+        since (date): The date of the oldest stored row
+    """
+    store = get_parquet_backend()
+    if store is None:
+        return
+
+    try:
+        store.append(symbol, backends.PostgresBackend().read_columns(symbol, since=since))
+    except Exception:
+        logger.exception('Failed to write %s to the Parquet store', symbol)
+        store.invalidate(symbol)
+
+
+def _get_or_create(key, factory):
+    with _lock:
+        if key not in _backends:
+            _backends[key] = factory()
+        return _backends[key]
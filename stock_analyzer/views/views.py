@@ -1,23 +1,58 @@
-from django.http import HttpResponse, JsonResponse
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.core.serializers.json import DjangoJSONEncoder
 
 from stock_analyzer.views.postgres_api import stock_data_query
-from stock_analyzer.views.postgres_api import prediction_data_query
+from stock_analyzer.views.postgres_api import connection_pool
 from stock_analyzer.views.backtest_strategies import moving_average
+from stock_analyzer.views.backtest_strategies import parameter_sweep
+from stock_analyzer.views.backtest_strategies import batch_backtest
 from stock_analyzer.views.data_prediction_models import linear_regression
+from stock_analyzer.views.data_prediction_models import report_jobs
+from stock_analyzer.views.data_cache import price_cache
+from stock_analyzer.views.data_cache import indicator_store
+from stock_analyzer.views.data_cache import model_registry
+from stock_analyzer.views.data_cache import response_cache
+from stock_analyzer.views.wire_format import arrow_ipc
+
+from datetime import date
+import asyncio
+import json
 
 
 def hello_world(request):
     return HttpResponse('Hello World')
 
 
+@response_cache.cached('stock_data', refresh=stock_data_query.refresh_data)
 def get_stock_data(request):
     try:
         symbol = request.GET.get('symbol').upper()
+        since = parse_date_param(request.GET.get('since'))
+        until = parse_date_param(request.GET.get('until'))
+        limit = int(request.GET['limit']) if 'limit' in request.GET else None
+        
+        if request.GET.get('stream', '').lower() in ('1', 'true'):
+            chunks = stock_data_query.stream_stock_data(
+                symbol=symbol, since=since, until=until, limit=limit, chunk_size=settings.STOCK_DATA_STREAM_CHUNK_SIZE
+            )
+            return StreamingHttpResponse(stream_json_array(chunks), content_type='application/json')
         
-        stock_data = stock_data_query.get_all_stock_data(symbol=symbol, date_desc=True)
+        if arrow_ipc.accepts_arrow(request):
+            stock_data = stock_data_query.get_stock_data_columns(symbol=symbol, since=since, until=until, limit=limit)
+            response = arrow_ipc.to_response(arrow_ipc.columns_to_table(stock_data, arrow_ipc.STOCK_DATA_SCHEMA))
+            if limit and len(stock_data['date']) == limit:
+                response['X-Next-Until'] = stock_data['date'][-1].isoformat()
+            return response
+        
+        stock_data = stock_data_query.get_stock_data_page(symbol=symbol, since=since, until=until, limit=limit)
 
         response = JsonResponse(data=stock_data, safe=False)
         response.status_code = 200
+        
+        # Pages are newest first, the next page ends before the oldest date of this one
+        if limit and len(stock_data) == limit:
+            response['X-Next-Until'] = stock_data[-1]['date']
 
     except Exception as e:
         response = JsonResponse(data={ 'Error Message': e.__str__ ()}, safe=False)
@@ -26,34 +61,171 @@ def get_stock_data(request):
     return response
     
     
+@response_cache.cached('stock_data', refresh=stock_data_query.arefresh_data)
+async def aget_stock_data(request):
+    """The async variant of `get_stock_data`. Reads use the async ORM and upstream fetches the
+    async Alpha Vantage client, so waiting on them doesn't hold a worker thread.
+    """
+    try:
+        symbol = request.GET.get('symbol').upper()
+        since = parse_date_param(request.GET.get('since'))
+        until = parse_date_param(request.GET.get('until'))
+        limit = int(request.GET['limit']) if 'limit' in request.GET else None
+        
+        if request.GET.get('stream', '').lower() in ('1', 'true'):
+            chunks = await stock_data_query.astream_stock_data(
+                symbol=symbol, since=since, until=until, limit=limit, chunk_size=settings.STOCK_DATA_STREAM_CHUNK_SIZE
+            )
+            return StreamingHttpResponse(astream_json_array(chunks), content_type='application/json')
+        
+        if arrow_ipc.accepts_arrow(request):
+            stock_data = await stock_data_query.aget_stock_data_columns(symbol=symbol, since=since, until=until, limit=limit)
+            response = arrow_ipc.to_response(arrow_ipc.columns_to_table(stock_data, arrow_ipc.STOCK_DATA_SCHEMA))
+            if limit and len(stock_data['date']) == limit:
+                response['X-Next-Until'] = stock_data['date'][-1].isoformat()
+            return response
+        
+        stock_data = await stock_data_query.aget_stock_data_page(symbol=symbol, since=since, until=until, limit=limit)
+
+        response = JsonResponse(data=stock_data, safe=False)
+        response.status_code = 200
+        
+        if limit and len(stock_data) == limit:
+            response['X-Next-Until'] = stock_data[-1]['date']
+
+    except Exception as e:
+        response = JsonResponse(data={ 'Error Message': e.__str__ ()}, safe=False)
+        response.status_code = 400
+        
+    return response
+
+
+@response_cache.cached('backtest_moving_average', refresh=stock_data_query.refresh_data)
 def backtest_moving_average(request):
     symbol = request.GET.get('symbol').upper()
     initial_investment = int(request.GET.get('initial_investment'))
     buy_day_range = int(request.GET.get('buy_day_range'))
     sell_day_range = int(request.GET.get('sell_day_range'))
+    include_log = request.GET.get('detail') != 'summary'
     
     investment_log_data = moving_average.simulate_moving_average_strategy(
-        symbol, initial_investment, buy_day_range, sell_day_range
+        symbol, initial_investment, buy_day_range, sell_day_range, include_log
     )
     
-    response = JsonResponse(investment_log_data, safe=False)
+    return backtest_response(request, investment_log_data)
+
+
+@response_cache.cached('backtest_moving_average', refresh=stock_data_query.arefresh_data)
+async def abacktest_moving_average(request):
+    """The async variant of `backtest_moving_average`. The symbol is refreshed on the event loop
+    by the response cache and the simulation runs in a worker thread, so concurrent backtests
+    don't wait for each other.
+    """
+    symbol = request.GET.get('symbol').upper()
+    initial_investment = int(request.GET.get('initial_investment'))
+    buy_day_range = int(request.GET.get('buy_day_range'))
+    sell_day_range = int(request.GET.get('sell_day_range'))
+    include_log = request.GET.get('detail') != 'summary'
+    
+    investment_log_data = await asyncio.to_thread(
+        moving_average.simulate_moving_average_strategy,
+        symbol, initial_investment, buy_day_range, sell_day_range, include_log
+    )
+    
+    return backtest_response(request, investment_log_data)
+
+
+def backtest_moving_average_sweep(request):
+    try:
+        symbol = request.GET.get('symbol').upper()
+        initial_investment = int(request.GET.get('initial_investment'))
+        day_step = int(request.GET.get('day_step', 1))
+        buy_day_ranges = range(
+            int(request.GET.get('buy_day_min', 1)), int(request.GET.get('buy_day_max', 200)) + 1, day_step
+        )
+        sell_day_ranges = range(
+            int(request.GET.get('sell_day_min', 1)), int(request.GET.get('sell_day_max', 200)) + 1, day_step
+        )
+        
+        sweep_data = parameter_sweep.sweep_moving_average_strategy(
+            symbol, initial_investment, buy_day_ranges, sell_day_ranges
+        )
+        
+        response = JsonResponse(sweep_data, safe=False)
+        response.status_code = 200
+        
+    except Exception as e:
+        response = JsonResponse(data={ 'Error Message': e.__str__ ()}, safe=False)
+        response.status_code = 400
+    
+    return response
+    
+    
+def backtest_moving_average_batch(request):
+    try:
+        symbols = [symbol.strip().upper() for symbol in request.GET.get('symbols').split(',') if symbol.strip()]
+        symbols = list(dict.fromkeys(symbols))
+        initial_investment = int(request.GET.get('initial_investment'))
+        buy_day_range = int(request.GET.get('buy_day_range'))
+        sell_day_range = int(request.GET.get('sell_day_range'))
+        include_log = request.GET.get('detail') == 'full'
+        
+    except Exception as e:
+        response = JsonResponse(data={ 'Error Message': e.__str__ ()}, safe=False)
+        response.status_code = 400
+        return response
+    
+    results = batch_backtest.stream_moving_average_batch(
+        symbols, initial_investment, buy_day_range, sell_day_range, include_log=include_log
+    )
+    
+    # One JSON document per line, written as each symbol finishes
+    response = StreamingHttpResponse(
+        (json.dumps(result, cls=DjangoJSONEncoder) + '\n' for result in results),
+        content_type='application/x-ndjson'
+    )
     return response
     
     
+@response_cache.cached('predict_future_prices', refresh=stock_data_query.refresh_data)
 def predict_future_prices(request):
     symbol = request.GET.get('symbol').upper()
     num_days = int(request.GET.get('num_days'))
     model_type = request.GET.get('model_type')
     
-    requested_predicted_data = linear_regression.predict_stock_data(symbol=symbol, predict_num_days=num_days)
-    all_predicted_data = prediction_data_query.get_all_prediction_data(symbol=symbol, model_type=model_type)
-    all_actual_data = stock_data_query.get_all_stock_data(symbol=symbol, date_desc=False)
+    data = linear_regression.get_prediction_sections(symbol=symbol, model_type=model_type, predict_num_days=num_days)
+    
+    if arrow_ipc.accepts_arrow(request):
+        rows = [
+            { 'section': section, **row }
+            for section, section_rows in data.items()
+            for row in section_rows
+        ]
+        return arrow_ipc.to_response(arrow_ipc.rows_to_table(rows, arrow_ipc.PREDICTION_SECTIONS_SCHEMA))
+    
+    response = JsonResponse(data, safe=False)
+    return response
+
+
+@response_cache.cached('predict_future_prices', refresh=stock_data_query.arefresh_data)
+async def apredict_future_prices(request):
+    """The async variant of `predict_future_prices`. The data is read with the async ORM and
+    the regression fit runs in a worker thread.
+    """
+    symbol = request.GET.get('symbol').upper()
+    num_days = int(request.GET.get('num_days'))
+    model_type = request.GET.get('model_type')
+    
+    data = await linear_regression.aget_prediction_sections(symbol=symbol, model_type=model_type, predict_num_days=num_days)
+    
+    if arrow_ipc.accepts_arrow(request):
+        rows = [
+            { 'section': section, **row }
+            for section, section_rows in data.items()
+            for row in section_rows
+        ]
+        return arrow_ipc.to_response(arrow_ipc.rows_to_table(rows, arrow_ipc.PREDICTION_SECTIONS_SCHEMA))
     
-    data = {
-        'requested_predicted_data': requested_predicted_data,
-        'all_predicted_data': all_predicted_data,
-        'all_actual_data': all_actual_data
-    }
     response = JsonResponse(data, safe=False)
     return response
     
@@ -63,13 +235,103 @@ def generate_prediction_report(request):
     num_days = int(request.GET.get('num_days'))
     model_type = request.GET.get('model_type')
 
-    requested_predicted_data = linear_regression.predict_stock_data(symbol=symbol, predict_num_days=num_days)
-    all_predicted_data = prediction_data_query.get_all_prediction_data(symbol=symbol, model_type=model_type)
-    all_actual_data = stock_data_query.get_all_stock_data(symbol=symbol, date_desc=False)
+    job = report_jobs.submit(symbol=symbol, model_type=model_type, num_days=num_days)
+    pdf_content = report_jobs.wait(job)
+    
+    response = HttpResponse(pdf_content, content_type='application/pdf')
+    response['Content-Disposition'] = 'attachment; filename="prediction_report.pdf"'
+    return response
+
+
+def submit_prediction_report(request):
+    try:
+        symbol = request.GET.get('symbol').upper()
+        num_days = int(request.GET.get('num_days'))
+        model_type = request.GET.get('model_type')
+        
+        job = report_jobs.submit(symbol=symbol, model_type=model_type, num_days=num_days)
+        
+        response = JsonResponse(data=job.to_dict(), safe=False)
+        response.status_code = 200 if job.status == report_jobs.DONE else 202
+    
+    except Exception as e:
+        response = JsonResponse(data={ 'Error Message': e.__str__ ()}, safe=False)
+        response.status_code = 400
+    
+    return response
+
+
+def prediction_report_status(request, job_id):
+    job = report_jobs.get(job_id)
+    if job is None:
+        response = JsonResponse(data={ 'Error Message': 'Unknown report job.' }, safe=False)
+        response.status_code = 404
+        return response
     
-    pdf_buffer = linear_regression.generate_report(requested_predicted_data, all_predicted_data, all_actual_data)
+    response = JsonResponse(data=job.to_dict(), safe=False)
+    return response
+
+
+def download_prediction_report(request, job_id):
+    pdf_content = report_jobs.get_report(job_id)
+    if pdf_content is None:
+        response = JsonResponse(data={ 'Error Message': 'The report is not ready.' }, safe=False)
+        response.status_code = 404
+        return response
     
-    response = HttpResponse(pdf_buffer, content_type='application/pdf')
+    response = HttpResponse(pdf_content, content_type='application/pdf')
     response['Content-Disposition'] = 'attachment; filename="prediction_report.pdf"'
     return response
 
+
+def metrics(request):
+    data = {
+        'price_cache': price_cache.stats(),
+        'indicator_store': indicator_store.stats(),
+        'model_registry': model_registry.stats(),
+        'response_cache': response_cache.stats(),
+        'database': connection_pool.stats()
+    }
+    response = JsonResponse(data, safe=False)
+    return response
+
+
+def backtest_response(request, investment_log_data):
+    """Sends a backtest as an Arrow IPC stream of its log, with the symbol and metrics in the
+    schema metadata, or as JSON. Summaries without a log are always sent as JSON.
+    """
+    if 'log' in investment_log_data and arrow_ipc.accepts_arrow(request):
+        metadata = {
+            'symbol': investment_log_data['symbol'],
+            'metrics': json.dumps(investment_log_data['metrics'])
+        }
+        table = arrow_ipc.columns_to_table(investment_log_data['log'], arrow_ipc.BACKTEST_LOG_SCHEMA, metadata=metadata)
+        return arrow_ipc.to_response(table)
+    
+    response = JsonResponse(investment_log_data, safe=False)
+    return response
+
+
+def parse_date_param(value):
+    return date.fromisoformat(value) if value else None
+
+
+def stream_json_array(chunks):
+    """Writes lists of rows as one JSON array, a chunk at a time."""
+    yield '['
+    separator = ''
+    for chunk in chunks:
+        # Serialize the chunk as an array and drop its brackets to splice it into the stream
+        yield separator + json.dumps(chunk, cls=DjangoJSONEncoder)[1:-1]
+        separator = ','
+    yield ']'
+
+
+async def astream_json_array(chunks):
+    """Writes the lists of rows of an async iterator as one JSON array, a chunk at a time."""
+    yield '['
+    separator = ''
+    async for chunk in chunks:
+        yield separator + json.dumps(chunk, cls=DjangoJSONEncoder)[1:-1]
+        separator = ','
+    yield ']'
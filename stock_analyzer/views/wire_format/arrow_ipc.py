@@ -0,0 +1,75 @@
+from django.http import HttpResponse
+
+import pyarrow as pa
+
+
+CONTENT_TYPE = 'application/vnd.apache.arrow.stream'
+
+STOCK_DATA_SCHEMA = pa.schema([
+    ('id', pa.int64()),
+    ('symbol', pa.string()),
+    ('date', pa.date32()),
+    ('open', pa.float64()),
+    ('high', pa.float64()),
+    ('low', pa.float64()),
+    ('close', pa.float64()),
+    ('volume', pa.int64())
+])
+
+PREDICTION_DATA_SCHEMA = STOCK_DATA_SCHEMA.append(pa.field('model_type', pa.string()))
+
+# The three sections of a prediction response are sent as one table, `section` tells them apart
+PREDICTION_SECTIONS_SCHEMA = PREDICTION_DATA_SCHEMA.insert(0, pa.field('section', pa.dictionary(pa.int8(), pa.string())))
+
+BACKTEST_LOG_SCHEMA = pa.schema([
+    ('date', pa.date32()),
+    ('action', pa.dictionary(pa.int8(), pa.string())),
+    ('price', pa.float64()),
+    ('cash', pa.float64()),
+    ('stock_holdings', pa.float64()),
+    ('total_value', pa.float64()),
+    ('return', pa.float64())
+])
+
+
+def accepts_arrow(request):
+    """Checks if the client asked for an Arrow IPC stream in its Accept header."""
+    return CONTENT_TYPE in request.headers.get('Accept', '')
+
+
+def columns_to_table(columns, schema, metadata=None):
+    """Builds an Arrow table with the given schema from a dict of equal length sequences.
+
+    Args:
+        columns (dict): The values of every column of the schema
+        schema (pyarrow.Schema): The column names and types
+        metadata (dict, optional): Key/value strings attached to the schema. Defaults to None.
+
+    Returns:
+        pyarrow.Table: The typed table
+    """
+    arrays = []
+    for field in schema:
+        values = columns[field.name]
+        if pa.types.is_dictionary(field.type):
+            arrays.append(pa.array(values, type=field.type.value_type).dictionary_encode().cast(field.type))
+        else:
+            # Dates may arrive as ISO strings and amounts as ints, casting normalizes both
+            arrays.append(pa.array(values).cast(field.type))
+    return pa.Table.from_arrays(arrays, schema=schema.with_metadata(metadata))
+
+
+def rows_to_table(rows, schema, metadata=None):
+    """Builds an Arrow table from a list of dicts such as a serializer's output.
+    Fields missing from the rows are filled with nulls.
+    """
+    columns = { field.name: [row.get(field.name) for row in rows] for field in schema }
+    return columns_to_table(columns, schema, metadata)
+
+
+def to_response(table):
+    """Writes the table as an Arrow IPC stream response."""
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return HttpResponse(sink.getvalue().to_pybytes(), content_type=CONTENT_TYPE)